@@ -7,7 +7,8 @@ from webargs.flaskparser import parser as webargs_parser, use_kwargs
 
 from dataactbroker.handlers.fileHandler import (
     FileHandler, get_error_metrics, get_status, list_submissions as list_submissions_handler,
-    narratives_for_submission, submission_report_url, update_narratives, list_certifications, file_history_url)
+    narratives_for_submission, submission_report_url, update_narratives, list_certifications, file_history_url,
+    get_fabs_publish_status)
 from dataactbroker.handlers.submission_handler import delete_all_submission_data, get_submission_stats
 
 from dataactbroker.permissions import requires_login, requires_submission_perms
@@ -337,6 +338,13 @@ def add_file_routes(app, create_credentials, is_local, server_path):
         file_manager = FileHandler(request, is_local=is_local, server_path=server_path)
         return file_manager.submit_detached_file(submission)
 
+    @app.route("/v1/check_fabs_publish_status/", methods=["POST"])
+    @convert_to_submission_id
+    @requires_submission_perms('reader')
+    def check_fabs_publish_status(submission):
+        """ Return the progress of publishing a FABS submission """
+        return get_fabs_publish_status(submission)
+
     @app.route("/v1/get_obligations/", methods=["POST"])
     @convert_to_submission_id
     @requires_submission_perms('reader')
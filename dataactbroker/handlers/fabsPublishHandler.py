@@ -0,0 +1,815 @@
+import logging
+import re
+from datetime import datetime
+from functools import partial
+
+import sqlalchemy as sa
+from sqlalchemy import and_, func, text
+
+from dataactcore.aws.s3Handler import S3Handler
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.function_bag import mark_job_status
+from dataactcore.interfaces.referenceCache import ReferenceData, get_reference_data
+from dataactcore.models.jobModels import CertifiedFilesHistory, CertifyHistory, FileRequest, Job, Submission
+from dataactcore.models.lookups import JOB_TYPE_DICT, PUBLISH_STATUS_DICT
+from dataactcore.models.stagingModels import DetachedAwardFinancialAssistance, PublishedAwardFinancialAssistance
+from dataactcore.utils import fileD2
+from dataactcore.utils.responseException import ResponseException
+from dataactcore.utils.statusCode import StatusCode
+
+from dataactvalidator.filestreaming.csv_selection import write_query_to_file
+
+logger = logging.getLogger(__name__)
+
+COLLIDING_ROWS_MESSAGE = "1 or more rows in this submission were already published (in a separate submission). This " \
+                         "occurred in the time since your validations were completed. To prevent duplicate records, " \
+                         "this submission must be revalidated in order to publish."
+
+# Values of a published row that are derived rather than copied from the submitted one
+DERIVED_COLUMNS = ['total_funding_amount', 'cfda_title', 'awarding_agency_code', 'awarding_agency_name',
+                   'awarding_sub_tier_agency_n', 'funding_agency_code', 'funding_agency_name',
+                   'funding_sub_tier_agency_na', 'place_of_perfor_state_code', 'place_of_perform_state_nam',
+                   'place_of_performance_congr', 'place_of_perform_county_co', 'place_of_perform_county_na',
+                   'place_of_performance_city', 'legal_entity_city_name', 'legal_entity_congressional',
+                   'legal_entity_county_code', 'legal_entity_county_name', 'legal_entity_state_code',
+                   'legal_entity_state_name', 'awarding_office_name', 'funding_office_name',
+                   'legal_entity_city_code', 'place_of_perform_country_n', 'legal_entity_country_name',
+                   'place_of_performance_zip5', 'place_of_perform_zip_last4', 'is_active', 'modified_at',
+                   'created_at', 'updated_at']
+
+# Values of a published row copied from the submitted one as they are
+COPIED_COLUMNS = [column.name for column in PublishedAwardFinancialAssistance.__table__.columns
+                  if column.name in DetachedAwardFinancialAssistance.__table__.columns and
+                  column.name not in DERIVED_COLUMNS]
+
+# Whitespace stripped by Python's str.strip
+WHITESPACE = " \t\n\r\x0b\x0c"
+
+# The derivations of fabs_derivations, for every valid row of a submission at once. Lookup tables that might have
+# more than one row for a code take the first one by ID, like ReferenceData does. A submitted row that is followed in
+# its submission by a correction or deletion of the same award is published inactive, as publishing the rows one at a
+# time deactivated it when it got to the later row
+DERIVED_ROWS_SQL = """
+WITH submitted AS (
+    SELECT dafa.*,
+        UPPER(dafa.place_of_performance_code) AS ppop_code,
+        CASE WHEN UPPER(dafa.place_of_performance_code) IN ('00*****', '00FORGN') THEN NULL
+            ELSE LEFT(UPPER(dafa.place_of_performance_code), 2) END AS ppop_state_code,
+        COALESCE(dafa.place_of_performance_zip4a, '') NOT IN ('', 'city-wide') AS has_ppop_zip,
+        LEFT(dafa.place_of_performance_zip4a, 5) AS ppop_zip5,
+        CASE WHEN LENGTH(dafa.place_of_performance_zip4a) > 5 THEN RIGHT(dafa.place_of_performance_zip4a, 4)
+            END AS ppop_zip_last4,
+        UPPER(dafa.place_of_performance_code) ~ '^[A-Z]{{2}}\\*\\*[0-9]{{3}}$' AS ppop_is_county,
+        UPPER(dafa.place_of_performance_code) ~ '^[A-Z]{{2}}[0-9]{{5}}$'
+            AND UPPER(dafa.place_of_performance_code) !~ '^[A-Z]{{2}}0{{5}}$' AS ppop_is_city,
+        COALESCE(dafa.legal_entity_zip5, '') <> '' AS has_le_zip,
+        CASE WHEN dafa.cfda_number ~ '^\\s*[-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+)([eE][-+]?[0-9]+)?\\s*$'
+            THEN CAST(dafa.cfda_number AS DOUBLE PRECISION) END AS cfda_program_number,
+        COALESCE(BOOL_OR(COALESCE(UPPER(dafa.correction_late_delete_ind), '') IN ('C', 'D'))
+            OVER (PARTITION BY dafa.afa_generated_unique ORDER BY dafa.row_number
+                  ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING), FALSE) AS is_superseded
+    FROM detached_award_financial_assistance AS dafa
+    WHERE dafa.submission_id = :submission_id
+        AND dafa.is_valid IS TRUE
+),
+cfda AS (
+    SELECT DISTINCT ON (program_number) program_number, program_title
+    FROM cfda_program
+    ORDER BY program_number, cfda_program_id
+),
+sub_tier AS (
+    SELECT sta.sub_tier_agency_code,
+        sta.sub_tier_agency_name,
+        CASE WHEN sta.is_frec THEN frec.frec_code ELSE cgac.cgac_code END AS agency_code,
+        CASE WHEN sta.is_frec THEN frec.agency_name ELSE cgac.agency_name END AS agency_name
+    FROM sub_tier_agency AS sta
+        LEFT OUTER JOIN cgac ON cgac.cgac_id = sta.cgac_id
+        LEFT OUTER JOIN frec ON frec.frec_id = sta.frec_id
+),
+state AS (
+    SELECT DISTINCT ON (state_code) state_code, state_name
+    FROM states
+    ORDER BY state_code, states_id
+),
+county AS (
+    SELECT DISTINCT ON (state_code, county_number) state_code, county_number, county_name
+    FROM county_code
+    ORDER BY state_code, county_number, county_code_id
+),
+zip_city_name AS (
+    SELECT DISTINCT ON (zip_code) zip_code, city_name
+    FROM zip_city
+    ORDER BY zip_code, zip_city_id
+),
+city AS (
+    SELECT DISTINCT ON (city_code, state_code) city_code, state_code, feature_name, county_number, county_name
+    FROM city_code
+    ORDER BY city_code, state_code, city_code_id
+),
+city_by_name AS (
+    SELECT DISTINCT ON (LOWER(feature_name), LOWER(state_code)) LOWER(feature_name) AS feature_name,
+        LOWER(state_code) AS state_code, city_code
+    FROM city_code
+    ORDER BY LOWER(feature_name), LOWER(state_code), city_code_id
+),
+office AS (
+    SELECT DISTINCT ON (contracting_office_code) contracting_office_code, contracting_office_name
+    FROM fpds_contracting_offices
+    ORDER BY contracting_office_code, "FPDS_contracting_office_id"
+),
+located AS (
+    SELECT submitted.*,
+        ppop_zip.state_abbreviation AS ppop_zip_state,
+        ppop_zip.county_number AS ppop_zip_county,
+        CASE WHEN COALESCE(submitted.place_of_performance_congr, '') <> '' THEN submitted.place_of_performance_congr
+            WHEN ppop_zip.congressional_district_no <> '' AND (ppop_zip.is_zip9 OR ppop_zip_cds.cd_count = 1)
+                THEN ppop_zip.congressional_district_no
+            ELSE '90' END AS ppop_zip_congr,
+        le_zip.state_abbreviation AS le_zip_state,
+        le_zip.county_number AS le_zip_county,
+        le_zip.congressional_district_no AS le_zip_congr
+    FROM submitted
+        -- the zip+4 when it exists, otherwise the first of the zip code's
+        LEFT OUTER JOIN LATERAL (
+            SELECT zips.state_abbreviation, zips.county_number, zips.congressional_district_no,
+                COALESCE(zips.zip_last4 = submitted.ppop_zip_last4, FALSE) AS is_zip9
+            FROM zips
+            WHERE submitted.has_ppop_zip
+                AND zips.zip5 = submitted.ppop_zip5
+            ORDER BY COALESCE(zips.zip_last4 = submitted.ppop_zip_last4, FALSE) DESC, zips.zips_id
+            LIMIT 1
+        ) AS ppop_zip ON TRUE
+        LEFT OUTER JOIN LATERAL (
+            SELECT COUNT(*) AS cd_count
+            FROM (
+                SELECT DISTINCT zips.congressional_district_no
+                FROM zips
+                WHERE submitted.has_ppop_zip
+                    AND zips.zip5 = submitted.ppop_zip5
+            ) AS districts
+        ) AS ppop_zip_cds ON TRUE
+        LEFT OUTER JOIN LATERAL (
+            SELECT zips.state_abbreviation, zips.county_number, zips.congressional_district_no
+            FROM zips
+            WHERE submitted.has_le_zip
+                AND zips.zip5 = submitted.legal_entity_zip5
+            ORDER BY COALESCE(zips.zip_last4 = submitted.legal_entity_zip_last4
+                              AND submitted.legal_entity_zip_last4 <> '', FALSE) DESC, zips.zips_id
+            LIMIT 1
+        ) AS le_zip ON TRUE
+),
+derived AS (
+    SELECT located.*,
+        COALESCE(located.federal_action_obligation, 0) + COALESCE(located.non_federal_funding_amount, 0)
+            AS derived_total_funding_amount,
+        cfda.program_title AS derived_cfda_title,
+        cfda.program_number IS NULL AS is_missing_cfda,
+        CASE WHEN located.awarding_sub_tier_agency_c <> '' THEN awarding.agency_code END
+            AS derived_awarding_agency_code,
+        CASE WHEN located.awarding_sub_tier_agency_c <> '' THEN awarding.agency_name END
+            AS derived_awarding_agency_name,
+        CASE WHEN located.awarding_sub_tier_agency_c <> '' THEN awarding.sub_tier_agency_name END
+            AS derived_awarding_sub_tier_agency_n,
+        CASE WHEN located.funding_sub_tier_agency_co <> '' THEN funding.agency_code END
+            AS derived_funding_agency_code,
+        CASE WHEN located.funding_sub_tier_agency_co <> '' THEN funding.agency_name END
+            AS derived_funding_agency_name,
+        CASE WHEN located.funding_sub_tier_agency_co <> '' THEN funding.sub_tier_agency_name END
+            AS derived_funding_sub_tier_agency_na,
+        CASE WHEN located.ppop_code = '00*****' THEN 'Multi-state' ELSE ppop_state.state_name END
+            AS derived_place_of_perform_state_nam,
+        CASE WHEN located.has_ppop_zip THEN located.ppop_zip_congr ELSE located.place_of_performance_congr END
+            AS derived_place_of_performance_congr,
+        CASE WHEN located.has_ppop_zip THEN located.ppop_zip_county
+            WHEN located.ppop_is_county THEN RIGHT(located.ppop_code, 3)
+            WHEN located.ppop_is_city THEN ppop_city.county_number END AS derived_place_of_perform_county_co,
+        CASE WHEN located.has_ppop_zip THEN ppop_zip_county.county_name
+            WHEN located.ppop_is_county THEN ppop_county.county_name
+            WHEN located.ppop_is_city THEN ppop_city.county_name END AS derived_place_of_perform_county_na,
+        CASE WHEN located.has_ppop_zip THEN ppop_zip_city.city_name
+            WHEN located.ppop_is_city THEN ppop_city.feature_name END AS derived_place_of_performance_city,
+        CASE WHEN located.has_le_zip THEN le_zip_city.city_name END AS derived_legal_entity_city_name,
+        CASE WHEN located.record_type = 1 THEN ppop_county.county_name
+            WHEN located.has_le_zip THEN le_zip_county.county_name END AS derived_legal_entity_county_name,
+        CASE WHEN located.record_type = 1 THEN RIGHT(located.ppop_code, 3)
+            WHEN located.has_le_zip THEN le_zip_county.county_number END AS derived_legal_entity_county_code,
+        CASE WHEN located.record_type = 1 THEN located.ppop_state_code
+            WHEN located.has_le_zip THEN located.le_zip_state END AS derived_legal_entity_state_code,
+        CASE WHEN located.record_type = 1 AND located.ppop_code = '00*****' THEN 'Multi-state'
+            WHEN located.record_type = 1 THEN ppop_state.state_name
+            WHEN located.has_le_zip THEN le_state.state_name END AS derived_legal_entity_state_name,
+        CASE WHEN located.awarding_office_code <> '' THEN awarding_office.contracting_office_name END
+            AS derived_awarding_office_name,
+        CASE WHEN located.funding_office_code <> '' THEN funding_office.contracting_office_name END
+            AS derived_funding_office_name,
+        CASE WHEN located.place_of_perform_country_c <> '' THEN ppop_country.country_name END
+            AS derived_place_of_perform_country_n,
+        CASE WHEN located.legal_entity_country_code <> '' THEN le_country.country_name END
+            AS derived_legal_entity_country_name
+    FROM located
+        LEFT OUTER JOIN cfda ON cfda.program_number = located.cfda_program_number
+        LEFT OUTER JOIN sub_tier AS awarding ON awarding.sub_tier_agency_code = located.awarding_sub_tier_agency_c
+        LEFT OUTER JOIN sub_tier AS funding ON funding.sub_tier_agency_code = located.funding_sub_tier_agency_co
+        LEFT OUTER JOIN state AS ppop_state ON ppop_state.state_code = located.ppop_state_code
+        LEFT OUTER JOIN county AS ppop_zip_county ON ppop_zip_county.state_code = located.ppop_zip_state
+            AND ppop_zip_county.county_number = located.ppop_zip_county
+        LEFT OUTER JOIN county AS ppop_county ON ppop_county.state_code = located.ppop_state_code
+            AND ppop_county.county_number = RIGHT(located.ppop_code, 3)
+        LEFT OUTER JOIN zip_city_name AS ppop_zip_city ON ppop_zip_city.zip_code = located.ppop_zip5
+        LEFT OUTER JOIN city AS ppop_city ON ppop_city.city_code = RIGHT(located.ppop_code, 5)
+            AND ppop_city.state_code = located.ppop_state_code
+        LEFT OUTER JOIN zip_city_name AS le_zip_city ON le_zip_city.zip_code = located.legal_entity_zip5
+        LEFT OUTER JOIN county AS le_zip_county ON le_zip_county.state_code = located.le_zip_state
+            AND le_zip_county.county_number = located.le_zip_county
+        LEFT OUTER JOIN state AS le_state ON le_state.state_code = located.le_zip_state
+        LEFT OUTER JOIN office AS awarding_office
+            ON awarding_office.contracting_office_code = located.awarding_office_code
+        LEFT OUTER JOIN office AS funding_office
+            ON funding_office.contracting_office_code = UPPER(located.funding_office_code)
+        LEFT OUTER JOIN country_code AS ppop_country
+            ON ppop_country.country_code = UPPER(located.place_of_perform_country_c)
+        LEFT OUTER JOIN country_code AS le_country
+            ON le_country.country_code = UPPER(located.legal_entity_country_code)
+)
+SELECT {copied_columns},
+    derived.derived_total_funding_amount AS total_funding_amount,
+    derived.derived_cfda_title AS cfda_title,
+    derived.derived_awarding_agency_code AS awarding_agency_code,
+    derived.derived_awarding_agency_name AS awarding_agency_name,
+    derived.derived_awarding_sub_tier_agency_n AS awarding_sub_tier_agency_n,
+    derived.derived_funding_agency_code AS funding_agency_code,
+    derived.derived_funding_agency_name AS funding_agency_name,
+    derived.derived_funding_sub_tier_agency_na AS funding_sub_tier_agency_na,
+    derived.ppop_state_code AS place_of_perfor_state_code,
+    derived.derived_place_of_perform_state_nam AS place_of_perform_state_nam,
+    derived.derived_place_of_performance_congr AS place_of_performance_congr,
+    derived.derived_place_of_perform_county_co AS place_of_perform_county_co,
+    derived.derived_place_of_perform_county_na AS place_of_perform_county_na,
+    derived.derived_place_of_performance_city AS place_of_performance_city,
+    derived.derived_legal_entity_city_name AS legal_entity_city_name,
+    CASE WHEN derived.record_type = 1 THEN derived.derived_place_of_performance_congr
+        WHEN derived.has_le_zip THEN derived.le_zip_congr END AS legal_entity_congressional,
+    derived.derived_legal_entity_county_code AS legal_entity_county_code,
+    derived.derived_legal_entity_county_name AS legal_entity_county_name,
+    derived.derived_legal_entity_state_code AS legal_entity_state_code,
+    derived.derived_legal_entity_state_name AS legal_entity_state_name,
+    derived.derived_awarding_office_name AS awarding_office_name,
+    derived.derived_funding_office_name AS funding_office_name,
+    CASE WHEN derived.derived_legal_entity_city_name <> '' AND derived.derived_legal_entity_state_code <> ''
+        THEN city_by_name.city_code END AS legal_entity_city_code,
+    derived.derived_place_of_perform_country_n AS place_of_perform_country_n,
+    derived.derived_legal_entity_country_name AS legal_entity_country_name,
+    CASE WHEN derived.place_of_performance_zip4a <> '' THEN LEFT(derived.place_of_performance_zip4a, 5) END
+        AS place_of_performance_zip5,
+    CASE WHEN derived.place_of_performance_zip4a <> '' AND LENGTH(derived.place_of_performance_zip4a) <> 5
+        THEN RIGHT(derived.place_of_performance_zip4a, 4) END AS place_of_perform_zip_last4,
+    COALESCE(UPPER(derived.correction_late_delete_ind), '') <> 'D' AND NOT derived.is_superseded AS is_active,
+    CAST(:now AS TIMESTAMP) AS modified_at,
+    CAST(:now AS TIMESTAMP) AS created_at,
+    CAST(:now AS TIMESTAMP) AS updated_at
+FROM derived
+    LEFT OUTER JOIN city_by_name
+        ON city_by_name.feature_name = LOWER(BTRIM(derived.derived_legal_entity_city_name, :whitespace))
+        AND city_by_name.state_code = LOWER(BTRIM(derived.derived_legal_entity_state_code, :whitespace))
+"""
+
+PUBLISHED_COLUMNS = COPIED_COLUMNS + DERIVED_COLUMNS
+
+# The derived rows are kept in a temporary table until they're inserted, so they can be counted first
+DERIVE_ROWS_SQL = 'CREATE TEMPORARY TABLE derived_fabs_rows ON COMMIT DROP AS {}'.format(
+    DERIVED_ROWS_SQL.format(copied_columns=', '.join('derived.' + column for column in COPIED_COLUMNS)))
+
+INSERT_DERIVED_ROWS_SQL = 'INSERT INTO published_award_financial_assistance ({columns}) ' \
+                          'SELECT {columns} FROM derived_fabs_rows'.format(columns=', '.join(PUBLISHED_COLUMNS))
+
+MISSING_CFDA_SQL = """
+SELECT dafa.row_number, dafa.cfda_number
+FROM detached_award_financial_assistance AS dafa
+WHERE dafa.submission_id = :submission_id
+    AND dafa.is_valid IS TRUE
+    AND NOT EXISTS (
+        SELECT 1
+        FROM cfda_program
+        WHERE cfda_program.program_number = CASE
+            WHEN dafa.cfda_number ~ '^\\s*[-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+)([eE][-+]?[0-9]+)?\\s*$'
+            THEN CAST(dafa.cfda_number AS DOUBLE PRECISION) END
+    )
+ORDER BY dafa.row_number
+"""
+
+# Published rows that are corrected or deleted by a submission are no longer active
+DEACTIVATE_SUPERSEDED_SQL = """
+UPDATE published_award_financial_assistance AS pafa
+SET is_active = FALSE,
+    updated_at = :now
+FROM detached_award_financial_assistance AS dafa
+WHERE dafa.submission_id = :submission_id
+    AND dafa.is_valid IS TRUE
+    AND COALESCE(UPPER(dafa.correction_late_delete_ind), '') IN ('C', 'D')
+    AND pafa.afa_generated_unique = dafa.afa_generated_unique
+    AND pafa.is_active IS TRUE
+"""
+
+
+def publish_fabs_rows(sess, submission_id, progress=None):
+    """ Publish the valid rows of a FABS submission, deriving their values in the database like fabs_derivations does
+        for one row at a time, and deactivate the published rows they correct or delete. Changes aren't committed
+
+    Args:
+        sess: database session
+        submission_id: ID of the FABS submission
+        progress: function called with the number of rows derived and the number inserted once each is known
+
+    Returns:
+        list of the awarding agency codes of the published rows
+    """
+    params = {'submission_id': submission_id, 'now': datetime.utcnow(), 'whitespace': WHITESPACE}
+    log_data = {
+        'message_type': 'BrokerDebug',
+        'submission_id': submission_id
+    }
+
+    for row_number, cfda_number in sess.execute(text(MISSING_CFDA_SQL), params):
+        logger.error({
+            'message': 'CFDA title not found for CFDA number {}'.format(cfda_number),
+            'message_type': 'BrokerError',
+            'submission_id': submission_id,
+            'row_number': row_number
+        })
+
+    derived = sess.execute(text(DERIVE_ROWS_SQL), params).rowcount
+    if progress:
+        progress(derived, 0)
+
+    deactivated = sess.execute(text(DEACTIVATE_SUPERSEDED_SQL), params).rowcount
+    inserted = sess.execute(text(INSERT_DERIVED_ROWS_SQL)).rowcount
+    sess.execute(text('DROP TABLE derived_fabs_rows'))
+    if progress:
+        progress(derived, inserted)
+    log_data['message'] = 'Published {} FABS rows, deactivating {} previously published'.format(inserted, deactivated)
+    logger.info(log_data)
+
+    agency_codes = sess.query(PublishedAwardFinancialAssistance.awarding_agency_code).\
+        filter_by(submission_id=submission_id).distinct()
+    return [agency_code for agency_code, in agency_codes]
+
+
+def record_publish_progress(job_id, rows_derived, rows_inserted):
+    """ Record how many rows a FABS publish job has derived and inserted so far. They're written on a connection of
+        their own, so they can be seen while the publish's transaction is still open
+
+    Args:
+        job_id: ID of the publish job
+        rows_derived: number of rows derived
+        rows_inserted: number of rows inserted
+    """
+    with GlobalDB.db().engine.connect() as connection:
+        connection.execute(Job.__table__.update().where(Job.__table__.c.job_id == job_id).
+                           values(number_of_rows_derived=rows_derived, number_of_rows_inserted=rows_inserted))
+
+
+def count_colliding_fabs_rows(sess, submission_id):
+    """ Count the valid rows of a FABS submission that would publish an award already published by another submission,
+        rather than correct or delete it
+
+    Args:
+        sess: database session
+        submission_id: ID of the FABS submission
+
+    Returns:
+        number of colliding rows
+    """
+    # need to set the models to something because the names are too long and flake gets mad
+    dafa = DetachedAwardFinancialAssistance
+    pafa = PublishedAwardFinancialAssistance
+    return sess.query(dafa.afa_generated_unique). \
+        filter(dafa.is_valid.is_(True),
+               dafa.submission_id == submission_id,
+               func.coalesce(func.upper(dafa.correction_late_delete_ind), '').notin_(['C', 'D'])).\
+        join(pafa, and_(dafa.afa_generated_unique == pafa.afa_generated_unique, pafa.is_active.is_(True))).\
+        count()
+
+
+def publish_fabs_submission(job, is_local):
+    """ Run a FABS publish job: derive and publish the valid rows of its submission, mark the submission published and
+        certify it. The rows and the submission's status are committed together, so if anything goes wrong the
+        submission is left unpublished and can be published again
+
+    Args:
+        job: the fabs_publish job
+        is_local: True if the broker is running locally, in which case the certified files aren't moved
+    """
+    sess = GlobalDB.db().session
+    submission = job.submission
+    submission_id = submission.submission_id
+    log_data = {
+        'message': 'Starting FABS publish job',
+        'message_type': 'BrokerDebug',
+        'submission_id': submission_id,
+        'job_id': job.job_id
+    }
+    logger.info(log_data)
+
+    # the job's message can be received again after it's done, if it wasn't deleted in time
+    if submission.publish_status_id != PUBLISH_STATUS_DICT['publishing']:
+        log_data['message'] = 'FABS submission is not being published, nothing to do'
+        logger.warning(log_data)
+        published = submission.publish_status_id != PUBLISH_STATUS_DICT['unpublished']
+        mark_job_status(job.job_id, 'finished' if published else 'invalid')
+        return
+
+    progress = partial(record_publish_progress, job.job_id)
+    try:
+        if count_colliding_fabs_rows(sess, submission_id) > 0:
+            raise ResponseException(COLLIDING_ROWS_MESSAGE, StatusCode.CLIENT_ERROR)
+
+        log_data['message'] = 'Starting derivations for FABS submission'
+        logger.info(log_data)
+        if CONFIG_SERVICES.get('fabs_publish_engine') == 'python':
+            agency_codes_list = publish_derived_fabs_rows(sess, submission_id, progress)
+        else:
+            agency_codes_list = publish_fabs_rows(sess, submission_id, progress)
+
+        # update all cached D2 FileRequest objects that could have been affected by the publish
+        for agency_code in agency_codes_list:
+            sess.query(FileRequest).\
+                filter(FileRequest.agency_code == agency_code,
+                       FileRequest.is_cached_file.is_(True),
+                       FileRequest.file_type == 'D2',
+                       sa.or_(FileRequest.start_date <= submission.reporting_end_date,
+                              FileRequest.end_date >= submission.reporting_start_date)).\
+                update({"is_cached_file": False}, synchronize_session=False)
+
+        sess.query(Submission).filter_by(submission_id=submission_id).\
+            update({"publish_status_id": PUBLISH_STATUS_DICT['published'], "certifying_user_id": job.user_id,
+                    "updated_at": datetime.utcnow()}, synchronize_session=False)
+
+        # create the certify_history entry
+        certify_history = CertifyHistory(created_at=datetime.utcnow(), user_id=job.user_id,
+                                         submission_id=submission_id)
+        sess.add(certify_history)
+        sess.commit()
+    except Exception as e:
+        log_data['message'] = 'An error occurred while publishing a FABS submission'
+        log_data['message_type'] = 'BrokerError'
+        log_data['error_message'] = str(e)
+        logger.error(log_data)
+
+        # rollback the changes if there are any errors. We want to submit everything together
+        sess.rollback()
+
+        sess.query(Submission).filter_by(submission_id=submission_id). \
+            update({"publish_status_id": PUBLISH_STATUS_DICT['unpublished'], "updated_at": datetime.utcnow()},
+                   synchronize_session=False)
+        job.error_message = str(e)
+        sess.commit()
+        mark_job_status(job.job_id, 'failed')
+        return
+    log_data['message'] = 'Completed derivations for FABS submission'
+    logger.info(log_data)
+
+    # generate the published rows file and move all files
+    # (locally we don't move but we still need to populate the certified_files_history table)
+    move_certified_fabs_files(sess, submission, certify_history, is_local)
+    mark_job_status(job.job_id, 'finished')
+
+
+def move_certified_fabs_files(sess, submission, certify_history, is_local):
+    """ Create the file of a published FABS submission's rows in the certified files bucket/directory, in place of
+        each of its uploaded files, and record it in certified_files_history
+
+    Args:
+        sess: database session
+        submission: the published FABS submission
+        certify_history: the CertifyHistory of the publish
+        is_local: True if the broker is running locally
+    """
+    submission_id = submission.submission_id
+    log_data = {
+        'message': 'Generating published FABS file from publishable rows',
+        'message_type': 'BrokerDebug',
+        'submission_id': submission_id
+    }
+
+    jobs = sess.query(Job).filter(Job.submission_id == submission_id,
+                                  Job.job_type_id == JOB_TYPE_DICT['file_upload'],
+                                  Job.filename.isnot(None)).all()
+    agency_code = submission.cgac_code if submission.cgac_code else submission.frec_code
+    created_at_date = certify_history.created_at
+    route_vars = ["FABS", agency_code, created_at_date.year, '{:02d}'.format(created_at_date.month)]
+    new_route = '/'.join([str(var) for var in route_vars]) + '/'
+
+    for job in jobs:
+        log_data['job_id'] = job.job_id
+        logger.info(log_data)
+        new_path = create_fabs_published_file(sess, submission_id, new_route, is_local)
+        sess.add(CertifiedFilesHistory(certify_history_id=certify_history.certify_history_id,
+                                       submission_id=submission_id, file_type_id=job.file_type_id,
+                                       filename=new_path, narrative=None, warning_filename=None))
+    sess.commit()
+
+
+def create_fabs_published_file(sess, submission_id, new_route, is_local):
+    """ Create a file containing all the published rows from this submission_id
+
+    Args:
+        sess: database session
+        submission_id: ID of the FABS submission
+        new_route: route within the certified bucket to write the file to
+        is_local: True if the broker is running locally, in which case the file is written to the broker_files
+            directory
+
+    Returns:
+        the path of the file
+    """
+    # create timestamped name and paths
+    timestamped_name = S3Handler.get_timestamped_filename('submission_{}_published_fabs.csv'.format(submission_id))
+    local_filename = "".join([CONFIG_BROKER['broker_files'], timestamped_name])
+    upload_name = "".join([new_route, timestamped_name])
+
+    # write file and stream to S3
+    write_query_to_file(local_filename, upload_name, [key for key in fileD2.mapping], "published FABS", is_local,
+                        fileD2.query_published_fabs_data(sess, submission_id), is_certified=True)
+    return local_filename if is_local else upload_name
+
+
+def publish_derived_fabs_rows(sess, submission_id, progress=None):
+    """ Publish the valid rows of a FABS submission one at a time, running each through fabs_derivations, and deactivate
+        the published rows they correct or delete. Changes aren't committed
+
+    Args:
+        sess: database session
+        submission_id: ID of the FABS submission
+        progress: function called with the number of rows derived and the number inserted, every 1000 rows
+
+    Returns:
+        list of the awarding agency codes of the published rows
+    """
+    log_data = {
+        'message_type': 'BrokerDebug',
+        'submission_id': submission_id
+    }
+
+    # get all valid lines for this submission
+    query = sess.query(DetachedAwardFinancialAssistance).\
+        filter_by(is_valid=True, submission_id=submission_id).\
+        order_by(DetachedAwardFinancialAssistance.row_number).all()
+
+    # the domain tables the derivations look values up in, held in memory between publishes
+    reference_data = get_reference_data(sess)
+
+    agency_codes_list = []
+    row_count = 1
+    for row in query:
+        # remove all keys in the row that are not in the intermediate table
+        temp_obj = row.__dict__
+        temp_obj.pop('row_number', None)
+        temp_obj.pop('is_valid', None)
+        temp_obj.pop('created_at', None)
+        temp_obj.pop('updated_at', None)
+        temp_obj.pop('_sa_instance_state', None)
+
+        temp_obj = fabs_derivations(temp_obj, sess, reference_data)
+
+        # if it's a correction or deletion row and an old row is active, update the old row to be inactive
+        if row.correction_late_delete_ind is not None and row.correction_late_delete_ind.upper() in ['C', 'D']:
+            check_row = sess.query(PublishedAwardFinancialAssistance).\
+                filter_by(afa_generated_unique=row.afa_generated_unique, is_active=True).one_or_none()
+            if check_row:
+                # just creating this as a variable because flake thinks the row is too long
+                row_id = check_row.published_award_financial_assistance_id
+                sess.query(PublishedAwardFinancialAssistance).\
+                    filter_by(published_award_financial_assistance_id=row_id).\
+                    update({"is_active": False, "updated_at": row.modified_at}, synchronize_session=False)
+
+        # for all rows, insert the new row (active/inactive should be handled by fabs_derivations)
+        new_row = PublishedAwardFinancialAssistance(**temp_obj)
+        sess.add(new_row)
+
+        # update the list of affected agency_codes
+        if temp_obj['awarding_agency_code'] not in agency_codes_list:
+            agency_codes_list.append(temp_obj['awarding_agency_code'])
+
+        if row_count % 1000 == 0:
+            log_data['message'] = 'Completed derivations for {} rows'.format(row_count)
+            logger.info(log_data)
+            if progress:
+                sess.flush()
+                progress(row_count, row_count)
+        row_count += 1
+
+    if progress:
+        sess.flush()
+        progress(len(query), len(query))
+    return agency_codes_list
+
+
+def fabs_derivations(obj, sess, reference_data=None):
+    """ Derive the values of a FABS row that's being published
+
+    Args:
+        obj: dict of the row's values, updated with the derived values
+        sess: database session
+        reference_data: ReferenceData to look the values up in, loaded from the database when not given
+
+    Returns:
+        the updated row
+    """
+    if reference_data is None:
+        reference_data = ReferenceData(sess)
+
+    # copy log data and remove keys in the row left for logging
+    job_id = obj['job_id']
+    detached_award_financial_assistance_id = obj['detached_award_financial_assistance_id']
+    obj.pop('detached_award_financial_assistance_id', None)
+    obj.pop('job_id', None)
+
+    # initializing a few of the derivations so the keys exist
+    obj['legal_entity_state_code'] = None
+    obj['legal_entity_city_name'] = None
+
+    # deriving total_funding_amount
+    federal_action_obligation = obj['federal_action_obligation'] or 0
+    non_federal_funding_amount = obj['non_federal_funding_amount'] or 0
+    obj['total_funding_amount'] = federal_action_obligation + non_federal_funding_amount
+
+    # deriving cfda_title from program_title in cfda_program table
+    try:
+        obj['cfda_title'] = reference_data.cfda_title(obj['cfda_number'])
+    except KeyError:
+        logger.error({
+            'message': 'CFDA title not found for CFDA number {}'.format(obj['cfda_number']),
+            'message_type': 'BrokerError',
+            'job_id': job_id,
+            'detached_award_financial_assistance_id': detached_award_financial_assistance_id
+        })
+        obj['cfda_title'] = None
+
+    if obj['awarding_sub_tier_agency_c']:
+        # deriving awarding agency name and code
+        awarding_sub_tier = reference_data.sub_tiers[obj['awarding_sub_tier_agency_c']]
+        obj['awarding_agency_code'] = awarding_sub_tier.agency_code
+        obj['awarding_agency_name'] = awarding_sub_tier.agency_name
+        obj['awarding_sub_tier_agency_n'] = awarding_sub_tier.sub_tier_agency_name
+    else:
+        obj['awarding_agency_code'] = None
+        obj['awarding_agency_name'] = None
+        obj['awarding_sub_tier_agency_n'] = None
+
+    # deriving funding sub tier agency name
+    if obj['funding_sub_tier_agency_co']:
+        funding_sub_tier_agency = reference_data.sub_tiers[obj['funding_sub_tier_agency_co']]
+        obj['funding_agency_code'] = funding_sub_tier_agency.agency_code
+        obj['funding_agency_name'] = funding_sub_tier_agency.agency_name
+        obj['funding_sub_tier_agency_na'] = funding_sub_tier_agency.sub_tier_agency_name
+    else:
+        obj['funding_sub_tier_agency_na'] = None
+        obj['funding_agency_name'] = None
+        obj['funding_agency_code'] = None
+
+    # deriving ppop state name (ppop code is required so we don't have to check that it exists, just upper it)
+    ppop_code = obj['place_of_performance_code'].upper()
+    if ppop_code == '00*****':
+        ppop_state_code, ppop_state_name = None, 'Multi-state'
+    elif ppop_code == '00FORGN':
+        ppop_state_code, ppop_state_name = None, None
+    else:
+        ppop_state_code = ppop_code[:2]
+        ppop_state_name = reference_data.states[ppop_state_code]
+    obj['place_of_perfor_state_code'] = ppop_state_code
+    obj['place_of_perform_state_nam'] = ppop_state_name
+
+    # deriving place of performance values from zip4
+    if obj['place_of_performance_zip4a'] and obj['place_of_performance_zip4a'] != 'city-wide':
+        zip_five = obj['place_of_performance_zip4a'][:5]
+        zip_four = None
+
+        # if zip4 is 9 digits, set the zip_four value to the last 4 digits
+        if len(obj['place_of_performance_zip4a']) > 5:
+            zip_four = obj['place_of_performance_zip4a'][-4:]
+
+        zip_info = None
+        cd_count = 1
+        # if there's a 9-digit zip code, use both parts to get data, otherwise (or if that's invalid) just grab
+        # the first instance of the zip5 we find
+        if zip_four:
+            zip_info = reference_data.zip9_info(sess, zip_five, zip_four)
+        if not zip_info:
+            # if this is a 5-digit zip, there may be more than one congressional district associated with it
+            zip_info, cd_count = reference_data.zip5_info(sess, zip_five)
+
+        # deriving ppop congressional district
+        if not obj['place_of_performance_congr']:
+            if zip_info.congressional_district_no and cd_count == 1:
+                obj['place_of_performance_congr'] = zip_info.congressional_district_no
+            else:
+                obj['place_of_performance_congr'] = '90'
+
+        # deriving PrimaryPlaceOfPerformanceCountyName/Code
+        obj['place_of_perform_county_co'] = zip_info.county_number
+        obj['place_of_perform_county_na'] = reference_data.counties.get((zip_info.state_abbreviation,
+                                                                         zip_info.county_number))
+
+        # deriving PrimaryPlaceOfPerformanceCityName
+        obj['place_of_performance_city'] = reference_data.zip_cities[zip_five]
+    # if there is no ppop zip4, we need to try to derive county/city info from the ppop code
+    else:
+        # if ppop_code is in county format,
+        if re.match('^[A-Z]{2}\*\*\d{3}$', ppop_code):
+            # getting county name
+            county_code = ppop_code[-3:]
+            obj['place_of_perform_county_co'] = county_code
+            obj['place_of_perform_county_na'] = reference_data.counties[(ppop_state_code, county_code)]
+            obj['place_of_performance_city'] = None
+        # if ppop_code is in city format
+        elif re.match('^[A-Z]{2}\d{5}$', ppop_code) and not re.match('^[A-Z]{2}0{5}$', ppop_code):
+            # getting city and county name
+            city_code = ppop_code[-5:]
+            city_info = reference_data.cities[(city_code, ppop_state_code)]
+            obj['place_of_performance_city'] = city_info.feature_name
+            obj['place_of_perform_county_co'] = city_info.county_number
+            obj['place_of_perform_county_na'] = city_info.county_name
+
+    # deriving legal entity stuff where applicable (record type is 2 in this case)
+    if obj['legal_entity_zip5']:
+        # legal entity city data
+        obj['legal_entity_city_name'] = reference_data.zip_cities[obj['legal_entity_zip5']]
+
+        zip_data = None
+        # if we have a legal entity zip+4 provided
+        if obj['legal_entity_zip_last4']:
+            zip_data = reference_data.zip9_info(sess, obj['legal_entity_zip5'], obj['legal_entity_zip_last4'])
+
+        # if legal_entity_zip_last4 returned no results (invalid combination), grab the first entry for this zip5
+        # for derivation purposes. This will exist because we wouldn't have gotten this far if it didn't,
+        # invalid legal_entity_zip5 when present is an error
+        if not zip_data:
+            zip_data, _ = reference_data.zip5_info(sess, obj['legal_entity_zip5'])
+
+        obj['legal_entity_congressional'] = zip_data.congressional_district_no
+
+        # legal entity city data
+        county_key = (zip_data.state_abbreviation, zip_data.county_number)
+        if county_key in reference_data.counties:
+            obj['legal_entity_county_code'] = zip_data.county_number
+            obj['legal_entity_county_name'] = reference_data.counties[county_key]
+        else:
+            obj['legal_entity_county_code'] = None
+            obj['legal_entity_county_name'] = None
+
+        # legal entity state data
+        obj['legal_entity_state_name'] = reference_data.states[zip_data.state_abbreviation]
+        obj['legal_entity_state_code'] = zip_data.state_abbreviation
+
+    # deriving legal entity stuff that's based on record type of 1 (ppop code must be in the format XX**### for these)
+    if obj['record_type'] == 1:
+        # legal entity county data
+        county_code = ppop_code[-3:]
+        obj['legal_entity_county_code'] = county_code
+        obj['legal_entity_county_name'] = reference_data.counties[(ppop_state_code, county_code)]
+
+        # legal entity state data
+        obj['legal_entity_state_code'] = ppop_state_code
+        obj['legal_entity_state_name'] = ppop_state_name
+
+        # legal entity cd data
+        obj['legal_entity_congressional'] = obj['place_of_performance_congr']
+
+    # deriving awarding_office_name based off awarding_office_code
+    if obj['awarding_office_code']:
+        obj['awarding_office_name'] = reference_data.offices.get(obj['awarding_office_code'])
+
+    # deriving funding_office_name based off funding_office_code
+    if obj['funding_office_code']:
+        obj['funding_office_name'] = reference_data.offices.get(obj['funding_office_code'].upper())
+
+    if obj['legal_entity_city_name'] and obj['legal_entity_state_code']:
+        obj['legal_entity_city_code'] = reference_data.city_code(obj['legal_entity_city_name'],
+                                                                 obj['legal_entity_state_code'])
+
+    # deriving place_of_perform_country_n from place_of_perform_country_c
+    if obj['place_of_perform_country_c']:
+        obj['place_of_perform_country_n'] = reference_data.countries.get(obj['place_of_perform_country_c'].upper())
+
+    # deriving legal_entity_country_name from legal_entity_country_code
+    if obj['legal_entity_country_code']:
+        obj['legal_entity_country_name'] = reference_data.countries.get(obj['legal_entity_country_code'].upper())
+
+    # splitting ppop zip code into 5 and 4 digit codes for ease of website access
+    if obj['place_of_performance_zip4a']:
+        if len(obj['place_of_performance_zip4a']) == 5:
+            obj['place_of_performance_zip5'] = obj['place_of_performance_zip4a'][:5]
+            obj['place_of_perform_zip_last4'] = None
+        else:
+            obj['place_of_performance_zip5'] = obj['place_of_performance_zip4a'][:5]
+            obj['place_of_perform_zip_last4'] = obj['place_of_performance_zip4a'][-4:]
+
+    if obj['correction_late_delete_ind'] and obj['correction_late_delete_ind'].upper() == 'D':
+        obj['is_active'] = False
+    else:
+        obj['is_active'] = True
+
+    obj['modified_at'] = datetime.utcnow()
+
+    return obj
@@ -142,9 +142,8 @@ def generate_d_file(file_type, agency_code, start, end, job_id, upload_name, is_
             headers = [key for key in file_utils.mapping]
 
             # actually generate the file
-            query_utils = {"file_utils": file_utils, "agency_code": agency_code, "start": start, "end": end,
-                           "sess": sess}
-            write_query_to_file(local_filename, upload_name, headers, file_type, is_local, d_file_query, query_utils)
+            query = file_utils.query_data(sess, agency_code, start, end)
+            write_query_to_file(local_filename, upload_name, headers, file_type, is_local, query)
 
             log_data['message'] = 'Finished writing to file: {}'.format(file_name)
             logger.info(log_data)
@@ -233,27 +232,6 @@ def generate_e_file(submission_id, job_id, timestamped_name, upload_file_name, i
     logger.info(log_data)
 
 
-def d_file_query(query_utils, page_start, page_end):
-    """Retrieve D1 or D2 data.
-
-        Args:
-            query_utils - object containing:
-                file_utils - fileD1 or fileD2 utils
-                sess - DB session
-                agency_code - FREC or CGAC code for generation
-                start - Beginning of period for D file
-                end - End of period for D file
-            page_start - Beginning of pagination
-            page_stop - End of pagination
-
-        Return:
-            paginated D1 or D2 query results
-    """
-    rows = query_utils["file_utils"].query_data(query_utils["sess"], query_utils["agency_code"], query_utils["start"],
-                                                query_utils["end"], page_start, page_end)
-    return rows.all()
-
-
 def copy_parent_file_request_data(sess, child_job, parent_job, file_type, is_local):
     """Parent FileRequest job data to the child FileRequest job data.
 
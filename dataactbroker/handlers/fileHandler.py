@@ -1,7 +1,6 @@
 import calendar
 import logging
 import os
-import re
 import requests
 import smart_open
 import sqlalchemy as sa
@@ -12,17 +11,20 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from flask import g, request
 from shutil import copyfile
-from sqlalchemy import func, and_
+from sqlalchemy import func
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.sql.expression import case
 from werkzeug.utils import secure_filename
 
+from dataactbroker.handlers.fabsPublishHandler import (COLLIDING_ROWS_MESSAGE, count_colliding_fabs_rows,
+                                                       move_certified_fabs_files)
 from dataactbroker.handlers.fileGenerationHandler import generate_d_file, generate_e_file, generate_f_file
 from dataactbroker.handlers.submission_handler import create_submission, get_submission_status, get_submission_files
 from dataactbroker.permissions import current_user_can, current_user_can_on_submission
 
 from dataactcore.aws.s3Handler import S3Handler
+from dataactcore.aws.sqsHandler import sqs_queue
 from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 
 from dataactcore.interfaces.db import GlobalDB
@@ -30,8 +32,7 @@ from dataactcore.interfaces.function_bag import (
     create_jobs, get_error_metrics_by_job_jd, get_error_type, get_fabs_meta, mark_job_status, run_job_checks,
     get_last_validated_date, get_lastest_certified_date)
 
-from dataactcore.models.domainModels import (
-    CGAC, FREC, CFDAProgram, SubTierAgency, Zips, States, CountyCode, CityCode, ZipCity, CountryCode)
+from dataactcore.models.domainModels import CGAC, FREC, SubTierAgency
 from dataactcore.models.errorModels import File
 from dataactcore.models.jobModels import (Job, Submission, SubmissionNarrative, SubmissionSubTierAffiliation,
                                           RevalidationThreshold, CertifyHistory, CertifiedFilesHistory, FileRequest)
@@ -39,12 +40,10 @@ from dataactcore.models.lookups import (
     FILE_TYPE_DICT, FILE_TYPE_DICT_LETTER, FILE_TYPE_DICT_LETTER_ID, PUBLISH_STATUS_DICT, JOB_STATUS_DICT,
     JOB_TYPE_DICT, RULE_SEVERITY_DICT, FILE_TYPE_DICT_ID, JOB_STATUS_DICT_ID, PUBLISH_STATUS_DICT_ID,
     FILE_TYPE_DICT_LETTER_NAME)
-from dataactcore.models.stagingModels import (DetachedAwardFinancialAssistance, PublishedAwardFinancialAssistance,
-                                              FPDSContractingOffice)
+from dataactcore.models.stagingModels import DetachedAwardFinancialAssistance
 from dataactcore.models.userModel import User
 from dataactcore.models.views import SubmissionUpdatedView
 
-from dataactcore.utils import fileD2
 from dataactcore.utils.jsonResponse import JsonResponse
 from dataactcore.utils.report import get_cross_file_pairs, report_file_name
 from dataactcore.utils.requestDictionary import RequestDictionary
@@ -52,8 +51,6 @@ from dataactcore.utils.responseException import ResponseException
 from dataactcore.utils.statusCode import StatusCode
 from dataactcore.utils.stringCleaner import StringCleaner
 
-from dataactvalidator.filestreaming.csv_selection import write_query_to_file
-
 logger = logging.getLogger(__name__)
 
 
@@ -775,7 +772,8 @@ class FileHandler:
 
     @staticmethod
     def submit_detached_file(submission):
-        """ Submits the FABS upload file associated with the submission ID """
+        """ Starts publishing the FABS upload file associated with the submission ID. Its rows are derived and
+            published by a job the validator runs, which check_fabs_publish_status reports the progress of """
         # Check to make sure it's a valid d2 submission who hasn't already started a publish process
         if not submission.d2_submission:
             raise ResponseException("Submission is not a FABS submission", StatusCode.CLIENT_ERROR)
@@ -794,126 +792,60 @@ class FileHandler:
         }
         logger.info(log_data)
 
-        # set publish_status to "publishing"
-        sess.query(Submission).filter_by(submission_id=submission_id).\
+        # set publish_status to "publishing", unless another request got there first
+        publishing = sess.query(Submission).\
+            filter_by(submission_id=submission_id, publish_status_id=PUBLISH_STATUS_DICT['unpublished']).\
             update({"publish_status_id": PUBLISH_STATUS_DICT['publishing'], "updated_at": datetime.utcnow()},
                    synchronize_session=False)
         sess.commit()
+        if not publishing:
+            raise ResponseException("Submission is already publishing", StatusCode.CLIENT_ERROR)
 
         try:
-            # check to make sure no new entries have been published that collide with the new rows
-            # (correction_late_delete_ind is not C or D)
-            # need to set the models to something because the names are too long and flake gets mad
-            dafa = DetachedAwardFinancialAssistance
-            pafa = PublishedAwardFinancialAssistance
-            colliding_rows = sess.query(dafa.afa_generated_unique). \
-                filter(dafa.is_valid.is_(True),
-                       dafa.submission_id == submission_id,
-                       func.coalesce(func.upper(dafa.correction_late_delete_ind), '').notin_(['C', 'D'])).\
-                join(pafa, and_(dafa.afa_generated_unique == pafa.afa_generated_unique, pafa.is_active.is_(True))).\
-                count()
-            if colliding_rows > 0:
-                raise ResponseException("1 or more rows in this submission were already published (in a separate "
-                                        "submission). This occurred in the time since your validations were completed. "
-                                        "To prevent duplicate records, this submission must be revalidated in order to "
-                                        "publish.",
-                                        StatusCode.CLIENT_ERROR)
-
-            # get all valid lines for this submission
-            query = sess.query(DetachedAwardFinancialAssistance).\
-                filter_by(is_valid=True, submission_id=submission_id).all()
+            # check to make sure no new entries have been published that collide with the new rows, so the user hears
+            # about it straight away. The publish job checks again before publishing
+            if count_colliding_fabs_rows(sess, submission_id) > 0:
+                raise ResponseException(COLLIDING_ROWS_MESSAGE, StatusCode.CLIENT_ERROR)
+
+            # one publish job per submission, reset each time the submission is published
+            publish_job = sess.query(Job).filter_by(submission_id=submission_id,
+                                                    job_type_id=JOB_TYPE_DICT['fabs_publish']).one_or_none()
+            if publish_job is None:
+                publish_job = Job(submission_id=submission_id, job_type_id=JOB_TYPE_DICT['fabs_publish'],
+                                  file_type_id=FILE_TYPE_DICT['detached_award'])
+                sess.add(publish_job)
+            publish_job.user_id = g.user.user_id
+            publish_job.job_status_id = JOB_STATUS_DICT['ready']
+            publish_job.number_of_rows = sess.query(DetachedAwardFinancialAssistance).\
+                filter_by(submission_id=submission_id, is_valid=True).count()
+            publish_job.number_of_rows_derived = 0
+            publish_job.number_of_rows_inserted = 0
+            publish_job.error_message = None
+            sess.commit()
 
-            agency_codes_list = []
-            row_count = 1
-            log_data['message'] = 'Starting derivations for FABS submission'
+            log_data['job_id'] = publish_job.job_id
+            log_data['message'] = 'Sending FABS publish job to job manager in sqs'
             logger.info(log_data)
-            for row in query:
-                # remove all keys in the row that are not in the intermediate table
-                temp_obj = row.__dict__
-                temp_obj.pop('row_number', None)
-                temp_obj.pop('is_valid', None)
-                temp_obj.pop('created_at', None)
-                temp_obj.pop('updated_at', None)
-                temp_obj.pop('_sa_instance_state', None)
-
-                temp_obj = fabs_derivations(temp_obj, sess)
-
-                # if it's a correction or deletion row and an old row is active, update the old row to be inactive
-                if row.correction_late_delete_ind is not None and row.correction_late_delete_ind.upper() in ['C', 'D']:
-                    check_row = sess.query(PublishedAwardFinancialAssistance).\
-                        filter_by(afa_generated_unique=row.afa_generated_unique, is_active=True).one_or_none()
-                    if check_row:
-                        # just creating this as a variable because flake thinks the row is too long
-                        row_id = check_row.published_award_financial_assistance_id
-                        sess.query(PublishedAwardFinancialAssistance).\
-                            filter_by(published_award_financial_assistance_id=row_id).\
-                            update({"is_active": False, "updated_at": row.modified_at}, synchronize_session=False)
-
-                # for all rows, insert the new row (active/inactive should be handled by fabs_derivations)
-                new_row = PublishedAwardFinancialAssistance(**temp_obj)
-                sess.add(new_row)
-
-                # update the list of affected agency_codes
-                if temp_obj['awarding_agency_code'] not in agency_codes_list:
-                    agency_codes_list.append(temp_obj['awarding_agency_code'])
-
-                if row_count % 1000 == 0:
-                    log_data['message'] = 'Completed derivations for {} rows'.format(row_count)
-                    logger.info(log_data)
-                row_count += 1
-
-            # update all cached D2 FileRequest objects that could have been affected by the publish
-            for agency_code in agency_codes_list:
-                sess.query(FileRequest).\
-                    filter(FileRequest.agency_code == agency_code,
-                           FileRequest.is_cached_file.is_(True),
-                           FileRequest.file_type == 'D2',
-                           sa.or_(FileRequest.start_date <= submission.reporting_end_date,
-                                  FileRequest.end_date >= submission.reporting_start_date)).\
-                    update({"is_cached_file": False}, synchronize_session=False)
-            sess.commit()
+            sqs_queue().send_message(MessageBody=str(publish_job.job_id))
         except Exception as e:
-            log_data['message'] = 'An error occurred while publishing a FABS submission'
+            log_data['message'] = 'An error occurred while starting to publish a FABS submission'
             log_data['message_type'] = 'BrokerError'
             log_data['error_message'] = str(e)
             logger.error(log_data)
 
-            # rollback the changes if there are any errors. We want to submit everything together
             sess.rollback()
-
             sess.query(Submission).filter_by(submission_id=submission_id). \
                 update({"publish_status_id": PUBLISH_STATUS_DICT['unpublished'], "updated_at": datetime.utcnow()},
                        synchronize_session=False)
             sess.commit()
 
-            # we want to return response exceptions in such a way that we can see the message, not catching it
-            # separately because we still want to rollback the changes and set the status to unpublished
+            # we want to return response exceptions in such a way that we can see the message
             if type(e) == ResponseException:
                 return JsonResponse.error(e, e.status)
 
             return JsonResponse.error(e, StatusCode.INTERNAL_ERROR)
-        log_data['message'] = 'Completed derivations for FABS submission'
-        logger.info(log_data)
-
-        sess.query(Submission).filter_by(submission_id=submission_id).\
-            update({"publish_status_id": PUBLISH_STATUS_DICT['published'], "certifying_user_id": g.user.user_id,
-                    "updated_at": datetime.utcnow()}, synchronize_session=False)
 
-        # create the certify_history entry
-        certify_history = CertifyHistory(created_at=datetime.utcnow(), user_id=g.user.user_id,
-                                         submission_id=submission_id)
-        sess.add(certify_history)
-        sess.commit()
-
-        # get the certify_history entry including the PK
-        certify_history = sess.query(CertifyHistory).filter_by(submission_id=submission_id).\
-            order_by(CertifyHistory.created_at.desc()).first()
-
-        # generate the published rows file and move all files
-        # (locally we don't move but we still need to populate the certified_files_history table)
-        FileHandler.move_certified_files(FileHandler, submission, certify_history, g.is_local)
-
-        response_dict = {"submission_id": submission_id}
+        response_dict = {"submission_id": submission_id, "job_id": publish_job.job_id}
         return JsonResponse.create(StatusCode.OK, response_dict)
 
     def get_protected_files(self):
@@ -1033,7 +965,7 @@ class FileHandler:
 
     def move_certified_files(self, submission, certify_history, is_local):
         """Copy all files within the ceritified submission to the correct certified files bucket/directory. FABS
-        submissions also create a file containing all the published rows"""
+        submissions instead create a file containing all the published rows, see move_certified_fabs_files"""
         try:
             self.s3manager
         except AttributeError:
@@ -1049,6 +981,13 @@ class FileHandler:
         }
         logger.debug(log_data)
 
+        # FABS submissions are certified with a file of their published rows in place of the uploaded file
+        if submission.d2_submission:
+            move_certified_fabs_files(sess, submission, certify_history, is_local)
+            log_data['message'] = 'Completed move_certified_files'
+            logger.debug(log_data)
+            return
+
         # get the list of upload jobs
         jobs = sess.query(Job).filter(Job.submission_id == submission_id,
                                       Job.job_type_id == JOB_TYPE_DICT['file_upload'],
@@ -1057,17 +996,12 @@ class FileHandler:
         new_bucket = CONFIG_BROKER['certified_bucket']
         agency_code = submission.cgac_code if submission.cgac_code else submission.frec_code
 
-        # warning file doesn't apply to FABS submissions
         possible_warning_files = [FILE_TYPE_DICT["appropriations"], FILE_TYPE_DICT["program_activity"],
                                   FILE_TYPE_DICT["award_financial"]]
 
         # set the route within the bucket
-        if submission.d2_submission:
-            created_at_date = certify_history.created_at
-            route_vars = ["FABS", agency_code, created_at_date.year, '{:02d}'.format(created_at_date.month)]
-        else:
-            route_vars = [agency_code, submission.reporting_fiscal_year, submission.reporting_fiscal_period // 3,
-                          certify_history.certify_history_id]
+        route_vars = [agency_code, submission.reporting_fiscal_year, submission.reporting_fiscal_period // 3,
+                      certify_history.certify_history_id]
         new_route = '/'.join([str(var) for var in route_vars]) + '/'
 
         for job in jobs:
@@ -1094,24 +1028,16 @@ class FileHandler:
                     warning_file = CONFIG_SERVICES['error_report_path'] + report_file_name(submission_id, True,
                                                                                            job.file_type.name)
 
-            narrative = None
-            if submission.d2_submission:
-                # FABS published submission, create the FABS published rows file
-                log_data['message'] = 'Generating published FABS file from publishable rows'
-                logger.info(log_data)
-                new_path = create_fabs_published_file(sess, submission_id, new_route)
-            else:
-                # DABS certified submission
-                # get the narrative relating to the file
-                narrative = sess.query(SubmissionNarrative).\
-                    filter_by(submission_id=submission_id, file_type_id=job.file_type_id).one_or_none()
-                if narrative:
-                    narrative = narrative.narrative
-
-                # only actually move the files if it's not a local submission
-                if not is_local:
-                    self.s3manager.copy_file(original_bucket=original_bucket, new_bucket=new_bucket,
-                                             original_path=job.filename, new_path=new_path)
+            # get the narrative relating to the file
+            narrative = sess.query(SubmissionNarrative).\
+                filter_by(submission_id=submission_id, file_type_id=job.file_type_id).one_or_none()
+            if narrative:
+                narrative = narrative.narrative
+
+            # only actually move the files if it's not a local submission
+            if not is_local:
+                self.s3manager.copy_file(original_bucket=original_bucket, new_bucket=new_bucket,
+                                         original_path=job.filename, new_path=new_path)
 
             # create the certified_files_history for this file
             file_history = CertifiedFilesHistory(certify_history_id=certify_history.certify_history_id,
@@ -1120,30 +1046,28 @@ class FileHandler:
                                                  warning_filename=warning_file)
             sess.add(file_history)
 
-        # FABS submissions don't have cross-file validations
-        if not submission.d2_submission:
-            cross_list = {"B": "A", "C": "B", "D1": "C", "D2": "C"}
-            for key, value in cross_list.items():
-                first_file = FILE_TYPE_DICT_LETTER_NAME[value]
-                second_file = FILE_TYPE_DICT_LETTER_NAME[key]
+        cross_list = {"B": "A", "C": "B", "D1": "C", "D2": "C"}
+        for key, value in cross_list.items():
+            first_file = FILE_TYPE_DICT_LETTER_NAME[value]
+            second_file = FILE_TYPE_DICT_LETTER_NAME[key]
 
-                # create warning file path
-                if not is_local:
-                    warning_file_name = report_file_name(submission_id, True, first_file, second_file)
-                    warning_file = new_route + warning_file_name
+            # create warning file path
+            if not is_local:
+                warning_file_name = report_file_name(submission_id, True, first_file, second_file)
+                warning_file = new_route + warning_file_name
 
-                    # move the file if we aren't local
-                    self.s3manager.copy_file(original_bucket=original_bucket, new_bucket=new_bucket,
-                                             original_path="errors/" + warning_file_name, new_path=warning_file)
-                else:
-                    warning_file = CONFIG_SERVICES['error_report_path'] + report_file_name(submission_id, True,
-                                                                                           first_file, second_file)
+                # move the file if we aren't local
+                self.s3manager.copy_file(original_bucket=original_bucket, new_bucket=new_bucket,
+                                         original_path="errors/" + warning_file_name, new_path=warning_file)
+            else:
+                warning_file = CONFIG_SERVICES['error_report_path'] + report_file_name(submission_id, True,
+                                                                                       first_file, second_file)
 
-                # add certified history
-                file_history = CertifiedFilesHistory(certify_history_id=certify_history.certify_history_id,
-                                                     submission_id=submission_id, filename=None, file_type_id=None,
-                                                     narrative=None, warning_filename=warning_file)
-                sess.add(file_history)
+            # add certified history
+            file_history = CertifiedFilesHistory(certify_history_id=certify_history.certify_history_id,
+                                                 submission_id=submission_id, filename=None, file_type_id=None,
+                                                 narrative=None, warning_filename=warning_file)
+            sess.add(file_history)
         sess.commit()
 
         log_data['message'] = 'Completed move_certified_files'
@@ -1183,23 +1107,6 @@ def update_narratives(submission, narratives_json):
     return JsonResponse.create(StatusCode.OK, {})
 
 
-def create_fabs_published_file(sess, submission_id, new_route):
-    """Create a file containing all the published rows from this submission_id"""
-    # create timestamped name and paths
-    timestamped_name = S3Handler.get_timestamped_filename('submission_{}_published_fabs.csv'.format(submission_id))
-    local_filename = "".join([CONFIG_BROKER['broker_files'], timestamped_name])
-    upload_name = "".join([new_route, timestamped_name])
-
-    # write file and stream to S3
-    write_query_to_file(local_filename, upload_name, [key for key in fileD2.mapping], "published FABS", g.is_local,
-                        published_fabs_query, {"sess": sess, "submission_id": submission_id}, is_certified=True)
-    return local_filename if g.is_local else upload_name
-
-
-def published_fabs_query(data_utils, page_start, page_end):
-    return fileD2.query_published_fabs_data(data_utils["sess"], data_utils["submission_id"], page_start, page_end).all()
-
-
 def _split_csv(string):
     """Split string into a list, excluding empty strings"""
     if string is None:
@@ -1270,8 +1177,10 @@ def submission_to_dict_for_status(submission):
     JSON for the get_status function"""
     sess = GlobalDB.db().session
 
+    # a publish job counts the rows it publishes, which were already counted by the file's validation
     number_of_rows = sess.query(func.sum(Job.number_of_rows)).\
-        filter_by(submission_id=submission.submission_id).\
+        filter(Job.submission_id == submission.submission_id,
+               Job.job_type_id != JOB_TYPE_DICT['fabs_publish']).\
         scalar() or 0
 
     # @todo replace with a relationship
@@ -1665,248 +1574,37 @@ def map_generate_status(upload_job, validation_job=None):
     return response_status
 
 
-def fabs_derivations(obj, sess):
-    # copy log data and remove keys in the row left for logging
-    job_id = obj['job_id']
-    detached_award_financial_assistance_id = obj['detached_award_financial_assistance_id']
-    obj.pop('detached_award_financial_assistance_id', None)
-    obj.pop('job_id', None)
-
-    # initializing a few of the derivations so the keys exist
-    obj['legal_entity_state_code'] = None
-    obj['legal_entity_city_name'] = None
+def get_fabs_publish_status(submission):
+    """ Report how far publishing a FABS submission has got
 
-    # deriving total_funding_amount
-    federal_action_obligation = obj['federal_action_obligation'] or 0
-    non_federal_funding_amount = obj['non_federal_funding_amount'] or 0
-    obj['total_funding_amount'] = federal_action_obligation + non_federal_funding_amount
-
-    # deriving cfda_title from program_title in cfda_program table
-    cfda_title = sess.query(CFDAProgram).filter_by(program_number=obj['cfda_number']).one_or_none()
-    if cfda_title:
-        obj['cfda_title'] = cfda_title.program_title
-    else:
-        logger.error({
-            'message': 'CFDA title not found for CFDA number {}'.format(obj['cfda_number']),
-            'message_type': 'BrokerError',
-            'job_id': job_id,
-            'detached_award_financial_assistance_id': detached_award_financial_assistance_id
-        })
-        obj['cfda_title'] = None
-
-    if obj['awarding_sub_tier_agency_c']:
-        # deriving awarding agency name and code
-        awarding_sub_tier = sess.query(SubTierAgency).\
-            filter_by(sub_tier_agency_code=obj['awarding_sub_tier_agency_c']).one()
-        use_frec = awarding_sub_tier.is_frec
-        awarding_agency = awarding_sub_tier.frec if use_frec else awarding_sub_tier.cgac
-        obj['awarding_agency_code'] = awarding_agency.frec_code if use_frec else awarding_agency.cgac_code
-        obj['awarding_agency_name'] = awarding_agency.agency_name
-        obj['awarding_sub_tier_agency_n'] = awarding_sub_tier.sub_tier_agency_name
-    else:
-        obj['awarding_agency_code'] = None
-        obj['awarding_agency_name'] = None
-        obj['awarding_sub_tier_agency_n'] = None
-
-    # deriving funding sub tier agency name
-    if obj['funding_sub_tier_agency_co']:
-        funding_sub_tier_agency = sess.query(SubTierAgency).\
-            filter_by(sub_tier_agency_code=obj['funding_sub_tier_agency_co']).one()
-        obj['funding_sub_tier_agency_na'] = funding_sub_tier_agency.sub_tier_agency_name
-        use_frec = funding_sub_tier_agency.is_frec
-        funding_agency = funding_sub_tier_agency.frec if use_frec else funding_sub_tier_agency.cgac
-        obj['funding_agency_code'] = funding_agency.frec_code if use_frec else funding_agency.cgac_code
-        obj['funding_agency_name'] = funding_agency.agency_name
-        obj['funding_sub_tier_agency_na'] = funding_sub_tier_agency.sub_tier_agency_name
-    else:
-        obj['funding_sub_tier_agency_na'] = None
-        obj['funding_agency_name'] = None
-        obj['funding_agency_code'] = None
-
-    # deriving ppop state name (ppop code is required so we don't have to check that it exists, just upper it)
-    ppop_code = obj['place_of_performance_code'].upper()
-    if ppop_code == '00*****':
-        ppop_state = States(state_code=None, state_name='Multi-state')
-    elif ppop_code == '00FORGN':
-        ppop_state = States(state_code=None, state_name=None)
-    else:
-        ppop_state = sess.query(States).filter_by(state_code=ppop_code[:2]).one()
-    obj['place_of_perfor_state_code'] = ppop_state.state_code
-    obj['place_of_perform_state_nam'] = ppop_state.state_name
-
-    # deriving place of performance values from zip4
-    if obj['place_of_performance_zip4a'] and obj['place_of_performance_zip4a'] != 'city-wide':
-        zip_five = obj['place_of_performance_zip4a'][:5]
-        zip_four = None
-
-        # if zip4 is 9 digits, set the zip_four value to the last 4 digits
-        if len(obj['place_of_performance_zip4a']) > 5:
-            zip_four = obj['place_of_performance_zip4a'][-4:]
-
-        zip_info = None
-        cd_count = 1
-        # if there's a 9-digit zip code, use both parts to get data, otherwise (or if that's invalid) just grab
-        # the first instance of the zip5 we find
-        if zip_four:
-            zip_info = sess.query(Zips).\
-                filter_by(zip5=zip_five, zip_last4=zip_four).first()
-        if not zip_info:
-            zip_info = sess.query(Zips).\
-                filter_by(zip5=zip_five).first()
-            # if this is a 5-digit zip, there may be more than one congressional district associated with it
-            cd_count = sess.query(Zips.congressional_district_no.label('cd_count')).\
-                filter_by(zip5=zip_five).distinct().count()
-
-        # deriving ppop congressional district
-        if not obj['place_of_performance_congr']:
-            if zip_info.congressional_district_no and cd_count == 1:
-                obj['place_of_performance_congr'] = zip_info.congressional_district_no
-            else:
-                obj['place_of_performance_congr'] = '90'
-
-        # deriving PrimaryPlaceOfPerformanceCountyName/Code
-        obj['place_of_perform_county_co'] = zip_info.county_number
-        county_info = sess.query(CountyCode).\
-            filter_by(county_number=zip_info.county_number, state_code=zip_info.state_abbreviation).first()
-        if county_info:
-            obj['place_of_perform_county_na'] = county_info.county_name
-        else:
-            obj['place_of_perform_county_na'] = None
-
-        # deriving PrimaryPlaceOfPerformanceCityName
-        city_info = sess.query(ZipCity).filter_by(zip_code=zip_five).one()
-        obj['place_of_performance_city'] = city_info.city_name
-    # if there is no ppop zip4, we need to try to derive county/city info from the ppop code
-    else:
-        # if ppop_code is in county format,
-        if re.match('^[A-Z]{2}\*\*\d{3}$', ppop_code):
-            # getting county name
-            county_code = ppop_code[-3:]
-            county_info = sess.query(CountyCode).\
-                filter_by(county_number=county_code, state_code=ppop_state.state_code).first()
-            obj['place_of_perform_county_co'] = county_code
-            obj['place_of_perform_county_na'] = county_info.county_name
-            obj['place_of_performance_city'] = None
-        # if ppop_code is in city format
-        elif re.match('^[A-Z]{2}\d{5}$', ppop_code) and not re.match('^[A-Z]{2}0{5}$', ppop_code):
-            # getting city and county name
-            city_code = ppop_code[-5:]
-            city_info = sess.query(CityCode).filter_by(city_code=city_code, state_code=ppop_state.state_code).first()
-            obj['place_of_performance_city'] = city_info.feature_name
-            obj['place_of_perform_county_co'] = city_info.county_number
-            obj['place_of_perform_county_na'] = city_info.county_name
-
-    # deriving legal entity stuff where applicable (record type is 2 in this case)
-    if obj['legal_entity_zip5']:
-        # legal entity city data
-        city_info = sess.query(ZipCity).filter_by(zip_code=obj['legal_entity_zip5']).one()
-        obj['legal_entity_city_name'] = city_info.city_name
-
-        zip_data = None
-        # if we have a legal entity zip+4 provided
-        if obj['legal_entity_zip_last4']:
-            zip_data = sess.query(Zips).\
-                filter_by(zip5=obj['legal_entity_zip5'], zip_last4=obj['legal_entity_zip_last4']).first()
-
-        # if legal_entity_zip_last4 returned no results (invalid combination), grab the first entry for this zip5
-        # for derivation purposes. This will exist because we wouldn't have gotten this far if it didn't,
-        # invalid legal_entity_zip5 when present is an error
-        if not zip_data:
-            zip_data = sess.query(Zips).filter_by(zip5=obj['legal_entity_zip5']).first()
-
-        obj['legal_entity_congressional'] = zip_data.congressional_district_no
-
-        # legal entity city data
-        county_info = sess.query(CountyCode).\
-            filter_by(county_number=zip_data.county_number, state_code=zip_data.state_abbreviation).first()
-        if county_info:
-            obj['legal_entity_county_code'] = county_info.county_number
-            obj['legal_entity_county_name'] = county_info.county_name
-        else:
-            obj['legal_entity_county_code'] = None
-            obj['legal_entity_county_name'] = None
-
-        # legal entity state data
-        state_info = sess.query(States).filter_by(state_code=zip_data.state_abbreviation).one()
-        obj['legal_entity_state_code'] = state_info.state_code
-        obj['legal_entity_state_name'] = state_info.state_name
-
-    # deriving legal entity stuff that's based on record type of 1 (ppop code must be in the format XX**### for these)
-    if obj['record_type'] == 1:
-        # legal entity county data
-        county_code = ppop_code[-3:]
-        county_info = sess.query(CountyCode).\
-            filter_by(county_number=county_code, state_code=ppop_state.state_code).first()
-        obj['legal_entity_county_code'] = county_code
-        obj['legal_entity_county_name'] = county_info.county_name
-
-        # legal entity state data
-        obj['legal_entity_state_code'] = ppop_state.state_code
-        obj['legal_entity_state_name'] = ppop_state.state_name
-
-        # legal entity cd data
-        obj['legal_entity_congressional'] = obj['place_of_performance_congr']
-
-    # deriving awarding_office_name based off awarding_office_code
-    if obj['awarding_office_code']:
-        award_office = sess.query(FPDSContractingOffice).\
-            filter_by(contracting_office_code=obj['awarding_office_code']).one_or_none()
-        if award_office:
-            obj['awarding_office_name'] = award_office.contracting_office_name
-        else:
-            obj['awarding_office_name'] = None
-
-    # deriving funding_office_name based off funding_office_code
-    if obj['funding_office_code']:
-        funding_office = sess.query(FPDSContractingOffice).\
-            filter_by(contracting_office_code=func.upper(obj['funding_office_code'])).one_or_none()
-        if funding_office:
-            obj['funding_office_name'] = funding_office.contracting_office_name
-        else:
-            obj['funding_office_name'] = None
-
-    if obj['legal_entity_city_name'] and obj['legal_entity_state_code']:
-        city_code = sess.query(CityCode).\
-            filter(func.lower(CityCode.feature_name) == func.lower(obj['legal_entity_city_name'].strip()),
-                   func.lower(CityCode.state_code) == func.lower(obj['legal_entity_state_code'].strip())).first()
-        if city_code:
-            obj['legal_entity_city_code'] = city_code.city_code
-        else:
-            obj['legal_entity_city_code'] = None
-
-    # TODO consider making the CountryCode query before starting the for-loop and just having an object to look up from
-    # deriving place_of_perform_country_n from place_of_perform_country_c
-    if obj['place_of_perform_country_c']:
-        country_data = sess.query(CountryCode). \
-            filter_by(country_code=obj['place_of_perform_country_c'].upper()).one_or_none()
-        if country_data:
-            obj['place_of_perform_country_n'] = country_data.country_name
-        else:
-            obj['place_of_perform_country_n'] = None
-
-    # deriving legal_entity_country_name from legal_entity_country_code
-    if obj['legal_entity_country_code']:
-        country_data = sess.query(CountryCode).\
-            filter_by(country_code=obj['legal_entity_country_code'].upper()).one_or_none()
-        if country_data:
-            obj['legal_entity_country_name'] = country_data.country_name
-        else:
-            obj['legal_entity_country_name'] = None
-
-    # splitting ppop zip code into 5 and 4 digit codes for ease of website access
-    if obj['place_of_performance_zip4a']:
-        if len(obj['place_of_performance_zip4a']) == 5:
-            obj['place_of_performance_zip5'] = obj['place_of_performance_zip4a'][:5]
-            obj['place_of_perform_zip_last4'] = None
-        else:
-            obj['place_of_performance_zip5'] = obj['place_of_performance_zip4a'][:5]
-            obj['place_of_perform_zip_last4'] = obj['place_of_performance_zip4a'][-4:]
-
-    if obj['correction_late_delete_ind'] and obj['correction_late_delete_ind'].upper() == 'D':
-        obj['is_active'] = False
-    else:
-        obj['is_active'] = True
+    Args:
+        submission: the FABS submission
 
-    obj['modified_at'] = datetime.utcnow()
+    Returns:
+        Response object with keys submission_id, publish_status, job_id, job_status, total_rows, rows_derived,
+        rows_inserted and message
+    """
+    if not submission.d2_submission:
+        raise ResponseException("Submission is not a FABS submission", StatusCode.CLIENT_ERROR)
 
-    return obj
+    sess = GlobalDB.db().session
+    publish_job = sess.query(Job).filter_by(submission_id=submission.submission_id,
+                                            job_type_id=JOB_TYPE_DICT['fabs_publish']).one_or_none()
+    response_dict = {
+        'submission_id': submission.submission_id,
+        'publish_status': PUBLISH_STATUS_DICT_ID[submission.publish_status_id],
+        'job_id': None,
+        'job_status': '',
+        'total_rows': 0,
+        'rows_derived': 0,
+        'rows_inserted': 0,
+        'message': ''
+    }
+    if publish_job is not None:
+        response_dict['job_id'] = publish_job.job_id
+        response_dict['job_status'] = publish_job.job_status_name
+        response_dict['total_rows'] = publish_job.number_of_rows or 0
+        response_dict['rows_derived'] = publish_job.number_of_rows_derived or 0
+        response_dict['rows_inserted'] = publish_job.number_of_rows_inserted or 0
+        response_dict['message'] = publish_job.error_message or ''
+    return JsonResponse.create(StatusCode.OK, response_dict)
@@ -5,6 +5,7 @@ from sqlalchemy import func, or_
 
 from dataactcore.interfaces.db import GlobalDB
 from dataactcore.interfaces.function_bag import sum_number_of_errors_for_job_list
+from dataactcore.interfaces.stagingPartitions import drop_submission_partitions
 
 from dataactcore.models.lookups import JOB_STATUS_DICT, PUBLISH_STATUS_DICT
 from dataactcore.models.jobModels import FileRequest, Job, Submission, SubmissionSubTierAffiliation
@@ -96,7 +97,7 @@ def get_submission_status(submission, jobs):
     skip_count = 0
 
     for job in jobs:
-        if job.job_type.name not in ["external_validation", None]:
+        if job.job_type.name not in ["external_validation", "fabs_publish", None]:
             job_status = job.job_status.name
             statuses[job_status] += 1
         else:
@@ -183,6 +184,8 @@ def delete_all_submission_data(submission):
     sess.query(SubmissionSubTierAffiliation).\
         filter(SubmissionSubTierAffiliation.submission_id == submission.submission_id).\
         delete(synchronize_session=False)
+    # staging rows in the submission's own partitions go with them, the rest are deleted along with the submission
+    drop_submission_partitions(sess, submission.submission_id)
     sess.query(Submission).filter(Submission.submission_id == submission.submission_id).\
         delete(synchronize_session=False)
 
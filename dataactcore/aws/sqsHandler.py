@@ -1,3 +1,5 @@
+import time
+
 import boto3
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.models.jobModels import SQS
@@ -5,6 +7,16 @@ from dataactcore.interfaces.db import GlobalDB
 
 
 class SQSMockQueue:
+    """ Local stand-in for the validator's SQS queue, backed by the sqs table. Receiving messages hides them from
+        later receives for the visibility timeout, like SQS does, so a consumer behaves the same against either queue.
+        Visibility is tracked in the process receiving the messages.
+    """
+    # Visibility timeout of messages received without one, the SQS default
+    DEFAULT_VISIBILITY_TIMEOUT = 30
+
+    # sqs_id of each message received, to the time it's visible again
+    hidden_until = {}
+
     @staticmethod
     def send_message(MessageBody):    # noqa
         sess = GlobalDB.db().session
@@ -13,33 +25,52 @@ class SQSMockQueue:
         return {"ResponseMetadata": {"HTTPStatusCode": 200}}
 
     @staticmethod
-    def receive_messages(WaitTimeSeconds):  # noqa
-        sess = GlobalDB.db().session
-        messages = []
-        for sqs in sess.query(SQS):
-            messages.append(SQSMockMessage(sqs))
-        return messages
+    def receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=1, VisibilityTimeout=None):  # noqa
+        if not 1 <= MaxNumberOfMessages <= 10:
+            raise ValueError("MaxNumberOfMessages must be between 1 and 10")
+        visibility_timeout = SQSMockQueue.DEFAULT_VISIBILITY_TIMEOUT if VisibilityTimeout is None \
+            else VisibilityTimeout
+        give_up = time.time() + WaitTimeSeconds
+        while True:
+            sess = GlobalDB.db().session
+            now = time.time()
+            messages = []
+            for sqs_id, job_id in sess.query(SQS.sqs_id, SQS.job_id).order_by(SQS.sqs_id):
+                if SQSMockQueue.hidden_until.get(sqs_id, 0) > now:
+                    continue
+                SQSMockQueue.hidden_until[sqs_id] = now + visibility_timeout
+                messages.append(SQSMockMessage(sqs_id, job_id))
+                if len(messages) == MaxNumberOfMessages:
+                    break
+            # end the transaction so the next poll sees messages sent since
+            sess.commit()
+            if messages or now >= give_up:
+                return messages
+            # long polling, wait for a message to be sent or become visible
+            time.sleep(min(1, give_up - now))
 
     @staticmethod
     def purge():
         sess = GlobalDB.db().session
         sess.query(SQS).delete()
         sess.commit()
+        SQSMockQueue.hidden_until.clear()
 
 
 class SQSMockMessage:
-    def __init__(self, sqs):
-        self.sqs = sqs
-        self.body = sqs.job_id
+    def __init__(self, sqs_id, job_id):
+        self.sqs_id = sqs_id
+        self.body = job_id
 
     def delete(self):
         sess = GlobalDB.db().session
-        sess.delete(self.sqs)
+        sess.query(SQS).filter_by(sqs_id=self.sqs_id).delete()
         sess.commit()
+        SQSMockQueue.hidden_until.pop(self.sqs_id, None)
 
     def change_visibility(self, VisibilityTimeout): # noqa
-        # Do nothing
-        pass
+        # Only changes when this process sees the message next, so it's safe to call from other threads
+        SQSMockQueue.hidden_until[self.sqs_id] = time.time() + VisibilityTimeout
 
 
 def sqs_queue():
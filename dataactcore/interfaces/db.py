@@ -1,4 +1,5 @@
 from collections import namedtuple
+from contextlib import contextmanager
 import logging
 import sqlalchemy
 import flask
@@ -17,6 +18,13 @@ class _DB(namedtuple('_DB', ['engine', 'connection', 'scoped_session_maker', 'se
         self.connection.close()
         self.engine.dispose()
 
+    def release(self):
+        """Return the session's and connection's database connections to the engine's pool, leaving the pool open.
+        Returns the _DB to use next, with a new connection"""
+        self.session.close()
+        self.connection.close()
+        return self._replace(connection=self.engine.connect())
+
 
 class GlobalDB:
     @classmethod
@@ -46,6 +54,45 @@ class GlobalDB:
             holder._db.close()
             del holder._db
 
+    @classmethod
+    def release(cls):
+        """Finish with the database after a unit of work, such as a validation job, but keep the engine and its
+        pooled connections open for the next one. Falls back to closing the database if a new connection can't be
+        made"""
+        holder = cls._holder()
+        db = getattr(holder, '_db', None)
+        if db:
+            try:
+                holder._db = db.release()
+            except sqlalchemy.exc.SQLAlchemyError:
+                logger.exception("Could not release database connection, closing it instead")
+                db.close()
+                del holder._db
+
+
+@contextmanager
+def thread_db(app, engine):
+    """Give a worker thread a database connection and session of its own from a shared engine, for GlobalDB to hand
+    out while it runs within a context of the app
+
+    Args:
+        app: Flask app to push a context of, flask.g being per context
+        engine: engine to take the thread's connection from
+
+    Yields:
+        the thread's _DB
+    """
+    with app.app_context():
+        scoped_session_maker = scoped_session(sessionmaker(bind=engine))
+        db = flask.g._db = _DB(engine, engine.connect(), scoped_session_maker, scoped_session_maker())
+        try:
+            yield db
+        finally:
+            db.session.close()
+            scoped_session_maker.remove()
+            db.connection.close()
+            del flask.g._db
+
 
 def db_connection():
     """Use the config to set up a database engine and connection."""
@@ -8,7 +8,7 @@ from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 
 from dataactcore.aws.s3Handler import S3Handler
-from dataactcore.config import CONFIG_BROKER
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 from dataactcore.models.errorModels import ErrorMetadata, File
 from dataactcore.models.jobModels import Job, Submission, JobDependency, CertifyHistory, CertifiedFilesHistory
 from dataactcore.models.stagingModels import DetachedAwardFinancialAssistance
@@ -18,6 +18,7 @@ from dataactcore.models.lookups import (FILE_TYPE_DICT, FILE_STATUS_DICT, JOB_TY
                                         JOB_STATUS_DICT, FILE_TYPE_DICT_ID, PUBLISH_STATUS_DICT)
 from dataactcore.interfaces.db import GlobalDB
 from dataactvalidator.validation_handlers.validationError import ValidationError
+from dataactvalidator.validation_handlers.validationFingerprint import hash_file
 from dataactcore.aws.sqsHandler import sqs_queue
 
 
@@ -418,6 +419,26 @@ def create_jobs(upload_files, submission, existing_submission=False):
     return upload_dict
 
 
+def uploaded_file_unchanged(val_job, upload_name):
+    """ Whether a file uploaded again for a validation job is known to be the same as the one it last validated. Only
+        files already on disk can be checked, files uploaded to S3 arrive after their jobs are set up
+
+    Args:
+        val_job: the file's validation job
+        upload_name: path of the uploaded file
+
+    Returns:
+        True if the file's validation can be reused, False otherwise
+    """
+    if not CONFIG_SERVICES.get('reuse_unchanged_validations', False) or CONFIG_BROKER['use_aws'] or \
+            not val_job.file_hash or not val_job.validation_hash:
+        return False
+    try:
+        return hash_file(upload_name) == val_job.file_hash
+    except OSError:
+        return False
+
+
 def add_jobs_for_uploaded_file(upload_file, submission_id, existing_submission):
     """ Add upload and validation jobs for a single filetype
 
@@ -483,13 +504,17 @@ def add_jobs_for_uploaded_file(upload_file, submission_id, existing_submission):
         val_job.job_status_id = JOB_STATUS_DICT['waiting']
         val_job.original_filename = upload_file.file_name
         val_job.filename = upload_file.upload_name
-        # reset file size and number of rows to be set during validation of new file
+        # reset file size to be set during validation of new file
         val_job.file_size = None
-        val_job.number_of_rows = None
-        # delete error metadata this might exist from a previous run of this validation job
-        sess.query(ErrorMetadata).\
-            filter(ErrorMetadata.job_id == val_job.job_id).\
-            delete(synchronize_session='fetch')
+        # the number of rows and error metadata of a file known to be unchanged are kept for its validation to be
+        # reused, otherwise they're reset and the file is validated again
+        if not uploaded_file_unchanged(val_job, upload_file.upload_name):
+            val_job.number_of_rows = None
+            val_job.validation_hash = None
+            # delete error metadata this might exist from a previous run of this validation job
+            sess.query(ErrorMetadata).\
+                filter(ErrorMetadata.job_id == val_job.job_id).\
+                delete(synchronize_session='fetch')
         # delete file error information that might exist from a previous run of this validation job
         sess.query(File).filter(File.job_id == val_job.job_id).delete(synchronize_session='fetch')
 
@@ -0,0 +1,207 @@
+from collections import namedtuple
+import logging
+import threading
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+
+from dataactcore.config import CONFIG_SERVICES
+from dataactcore.models.domainModels import (CFDAProgram, CityCode, CountryCode, CountyCode, ReferenceDataVersion,
+                                             States, SubTierAgency, ZipCity, Zips)
+from dataactcore.models.stagingModels import FPDSContractingOffice
+
+logger = logging.getLogger(__name__)
+
+ZipInfo = namedtuple('ZipInfo', ['state_abbreviation', 'county_number', 'congressional_district_no'])
+SubTierInfo = namedtuple('SubTierInfo', ['sub_tier_agency_name', 'agency_code', 'agency_name'])
+CityInfo = namedtuple('CityInfo', ['feature_name', 'county_number', 'county_name'])
+
+_cache_lock = threading.Lock()
+_reference_data = None
+
+# zip codes that don't exist are cached as None
+_NOT_CACHED = object()
+
+
+def bump_reference_version(sess, *models):
+    """ Mark domain tables as changed, so processes holding them in memory load them again. Call it in the same
+        transaction as the changes
+
+    Args:
+        sess: database session
+        models: models of the tables that changed
+    """
+    for model in models:
+        sess.execute(insert(ReferenceDataVersion).
+                     values(table_name=model.__table__.name, version=1).
+                     on_conflict_do_update(index_elements=[ReferenceDataVersion.table_name],
+                                           set_={'version': ReferenceDataVersion.version + 1}))
+
+
+def reference_versions(sess):
+    """ The current version of each domain table that has been loaded since versions were kept """
+    return dict(sess.query(ReferenceDataVersion.table_name, ReferenceDataVersion.version))
+
+
+def get_reference_data(sess):
+    """ The reference data held by this process, loaded again first if any of its tables has changed since
+
+    Args:
+        sess: database session
+
+    Returns:
+        ReferenceData object
+    """
+    global _reference_data
+    versions = reference_versions(sess)
+    with _cache_lock:
+        if _reference_data is None or _reference_data.versions != versions:
+            _reference_data = ReferenceData(sess, versions)
+        return _reference_data
+
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReferenceData:
+    """ In-memory indexes of the domain tables FABS derivations look values up in. Zip codes are too many to load at
+        once, so each zip code is looked up the first time it's needed and kept, up to zip_cache_size of them
+
+    Attributes:
+        versions: versions of the domain tables when they were loaded
+        cfda_titles: program title by CFDA number
+        sub_tiers: SubTierInfo by sub tier agency code, with the code and name of its CGAC or FREC
+        states: state name by state code
+        counties: county name by state code and county number
+        zip_cities: city name by zip code
+        cities: CityInfo by city code and state code
+        city_codes: city code by lowercase city name and state code
+        offices: contracting office name by office code
+        countries: country name by country code
+    """
+
+    def __init__(self, sess, versions=None):
+        self.versions = reference_versions(sess) if versions is None else versions
+        self.zip_cache_size = CONFIG_SERVICES.get('reference_zip_cache_size') or 100000
+
+        self.cfda_titles = {}
+        for program_number, program_title in sess.query(CFDAProgram.program_number, CFDAProgram.program_title).\
+                order_by(CFDAProgram.cfda_program_id):
+            self.cfda_titles.setdefault(program_number, program_title)
+
+        self.sub_tiers = {}
+        for sub_tier in sess.query(SubTierAgency).options(joinedload(SubTierAgency.cgac),
+                                                          joinedload(SubTierAgency.frec)):
+            agency = sub_tier.frec if sub_tier.is_frec else sub_tier.cgac
+            # frec_id is nullable, so a FREC sub tier may not have an agency to take a code and name from
+            if agency is None:
+                agency_code = agency_name = None
+            else:
+                agency_code = agency.frec_code if sub_tier.is_frec else agency.cgac_code
+                agency_name = agency.agency_name
+            self.sub_tiers[sub_tier.sub_tier_agency_code] = SubTierInfo(sub_tier.sub_tier_agency_name, agency_code,
+                                                                        agency_name)
+
+        self.states = {}
+        for state_code, state_name in sess.query(States.state_code, States.state_name).order_by(States.states_id):
+            self.states.setdefault(state_code, state_name)
+
+        self.counties = {}
+        for state_code, county_number, county_name in sess.query(
+                CountyCode.state_code, CountyCode.county_number, CountyCode.county_name).\
+                order_by(CountyCode.county_code_id):
+            self.counties.setdefault((state_code, county_number), county_name)
+
+        self.zip_cities = {}
+        for zip_code, city_name in sess.query(ZipCity.zip_code, ZipCity.city_name).order_by(ZipCity.zip_city_id):
+            self.zip_cities.setdefault(zip_code, city_name)
+
+        self.cities = {}
+        self.city_codes = {}
+        for city in sess.query(CityCode.city_code, CityCode.state_code, CityCode.feature_name, CityCode.county_number,
+                               CityCode.county_name).order_by(CityCode.city_code_id):
+            self.cities.setdefault((city.city_code, city.state_code),
+                                   CityInfo(city.feature_name, city.county_number, city.county_name))
+            if city.feature_name is not None and city.state_code is not None:
+                self.city_codes.setdefault((city.feature_name.lower(), city.state_code.lower()), city.city_code)
+
+        self.offices = {}
+        for office_code, office_name in sess.query(FPDSContractingOffice.contracting_office_code,
+                                                   FPDSContractingOffice.contracting_office_name).\
+                order_by(FPDSContractingOffice.FPDS_contracting_office_id):
+            self.offices.setdefault(office_code, office_name)
+        self.countries = dict(sess.query(CountryCode.country_code, CountryCode.country_name))
+
+        self._zip5s = {}
+        self._zip9s = {}
+        self._zip_lock = threading.Lock()
+
+        logger.info({
+            'message': 'Loaded reference data',
+            'message_type': 'BrokerInfo',
+            'versions': self.versions
+        })
+
+    def cfda_title(self, cfda_number):
+        """ Program title of a CFDA number, raising a KeyError if there's no such program """
+        return self.cfda_titles[_float_or_none(cfda_number)]
+
+    def city_code(self, city_name, state_code):
+        """ Code of a city, matching its name and state regardless of case """
+        return self.city_codes.get((city_name.strip().lower(), state_code.strip().lower()))
+
+    def zip5_info(self, sess, zip5):
+        """ Location of a 5 digit zip code, taken from the first of its zip+4 codes, and the number of congressional
+            districts it covers
+
+        Args:
+            sess: database session, used when the zip code isn't in memory yet
+            zip5: 5 digit zip code
+
+        Returns:
+            tuple of a ZipInfo, None if the zip code doesn't exist, and the number of congressional districts
+        """
+        cached = self._zip5s.get(zip5, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return cached
+        first_zip = sess.query(Zips.state_abbreviation, Zips.county_number, Zips.congressional_district_no).\
+            filter_by(zip5=zip5).order_by(Zips.zips_id).first()
+        cd_count = sess.query(Zips.congressional_district_no).filter_by(zip5=zip5).distinct().count()
+        return self._remember(self._zip5s, zip5, (ZipInfo(*first_zip) if first_zip else None, cd_count))
+
+    def zip9_info(self, sess, zip5, zip_last4):
+        """ Location of a zip+4 code
+
+        Args:
+            sess: database session, used when the zip code isn't in memory yet
+            zip5: 5 digit zip code
+            zip_last4: last 4 digits of the zip code
+
+        Returns:
+            ZipInfo, None if the zip code doesn't exist
+        """
+        key = (zip5, zip_last4)
+        cached = self._zip9s.get(key, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return cached
+        zip_info = sess.query(Zips.state_abbreviation, Zips.county_number, Zips.congressional_district_no).\
+            filter_by(zip5=zip5, zip_last4=zip_last4).first()
+        return self._remember(self._zip9s, key, ZipInfo(*zip_info) if zip_info else None)
+
+    def _remember(self, cache, key, value):
+        with self._zip_lock:
+            if len(cache) >= self.zip_cache_size:
+                cache.clear()
+            cache[key] = value
+        return value
+
+
+def clear_reference_data():
+    """ Drop the reference data held by this process, so it's loaded again the next time it's needed """
+    global _reference_data
+    with _cache_lock:
+        _reference_data = None
@@ -0,0 +1,130 @@
+import re
+
+from sqlalchemy import text
+
+from dataactcore.models.stagingModels import (Appropriation, AwardFinancial, AwardFinancialAssistance, AwardProcurement,
+                                              DetachedAwardFinancialAssistance, FlexField, ObjectClassProgramActivity)
+
+# Staging tables that can be partitioned by submission. On servers that support it, each submission validated since
+# they were partitioned gets a partition of its own, named after the table and the submission's ID. Rows of older
+# submissions are in the table's legacy partition, and rows of submissions without a partition in its default
+# partition
+STAGING_MODELS = (Appropriation, ObjectClassProgramActivity, AwardFinancial, AwardFinancialAssistance, AwardProcurement,
+                  DetachedAwardFinancialAssistance, FlexField)
+STAGING_TABLES = tuple(model.__table__.name for model in STAGING_MODELS)
+
+PARTITION_NAME = re.compile(r'^({})_(legacy|default|\d+)$'.format('|'.join(STAGING_TABLES)))
+PARTITION_BOUND = re.compile(r'TO \((\d+)\)')
+
+
+def is_staging_partition(table_name):
+    """ Whether a table is a partition of a staging table
+
+    Args:
+        table_name: name of the table
+
+    Returns:
+        True if the table is a partition of a staging table
+    """
+    return PARTITION_NAME.match(table_name) is not None
+
+
+def partition_name(table_name, submission_id):
+    """ Name of a submission's partition of a staging table """
+    return '{}_{}'.format(table_name, submission_id)
+
+
+def is_partitioned(sess, table_name):
+    """ Whether a table is partitioned
+
+    Args:
+        sess: database session
+        table_name: name of the table
+
+    Returns:
+        True if the table is partitioned
+    """
+    return bool(sess.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+                             {'table': table_name}).scalar())
+
+
+def table_exists(sess, table_name):
+    """ Whether a table exists """
+    return sess.execute(text('SELECT to_regclass(:table) IS NOT NULL'), {'table': table_name}).scalar()
+
+
+def legacy_bound(sess, table_name):
+    """ The lowest submission ID the legacy partition of a staging table doesn't hold rows for
+
+    Args:
+        sess: database session
+        table_name: name of the partitioned staging table
+
+    Returns:
+        submission ID, 0 if the table has no legacy partition
+    """
+    bound = sess.execute(text('SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = to_regclass(:table)'),
+                         {'table': table_name + '_legacy'}).scalar()
+    match = PARTITION_BOUND.search(bound or '')
+    return int(match.group(1)) if match else 0
+
+
+def prepare_submission_partition(sess, model, submission_id):
+    """ Create a submission's partition of a staging table, if the table is partitioned and the submission doesn't have
+        one yet. Submissions whose rows are kept in the legacy partition, or that still have rows in the default
+        partition, don't get one. Creating a partition briefly locks the whole table, so it waits for queries running
+        on other partitions to finish
+
+    Args:
+        sess: database session
+        model: model of the staging table
+        submission_id: ID of the submission
+
+    Returns:
+        True if the submission has a partition of its own
+    """
+    table_name = model.__table__.name
+    partition = partition_name(table_name, submission_id)
+    if not is_partitioned(sess, table_name) or submission_id < legacy_bound(sess, table_name):
+        return False
+    # jobs of the same submission share its flex field partition, so only one creates it
+    sess.execute(text('SELECT pg_advisory_xact_lock(hashtext(:partition))'), {'partition': partition})
+    if table_exists(sess, partition):
+        return True
+    in_default = sess.execute(text('SELECT EXISTS (SELECT 1 FROM {}_default WHERE submission_id = :submission_id)'.
+                                   format(table_name)), {'submission_id': submission_id}).scalar()
+    if in_default:
+        return False
+    sess.execute('CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})'.
+                 format(partition, table_name, int(submission_id), int(submission_id) + 1))
+    return True
+
+
+def clear_submission_rows(sess, model, submission_id):
+    """ Remove a submission's rows from a staging table. A submission with a partition of its own has it truncated, so
+        the rows don't leave dead tuples behind for vacuum. Rows in the legacy or default partitions, or a table that
+        isn't partitioned, are deleted, and the submission is then given its own partition if it can have one
+
+    Args:
+        sess: database session
+        model: model of the staging table
+        submission_id: ID of the submission
+    """
+    table_name = model.__table__.name
+    partition = partition_name(table_name, submission_id)
+    if is_partitioned(sess, table_name) and table_exists(sess, partition):
+        sess.execute('TRUNCATE {}'.format(partition))
+        return
+    sess.query(model).filter_by(submission_id=submission_id).delete(synchronize_session=False)
+    prepare_submission_partition(sess, model, submission_id)
+
+
+def drop_submission_partitions(sess, submission_id):
+    """ Drop a submission's partitions of the staging tables, along with their rows
+
+    Args:
+        sess: database session
+        submission_id: ID of the submission
+    """
+    for table_name in STAGING_TABLES:
+        sess.execute('DROP TABLE IF EXISTS {}'.format(partition_name(table_name, int(submission_id))))
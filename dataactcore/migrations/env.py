@@ -13,6 +13,7 @@ from dataactcore.models import (baseModel, domainModels, fsrs, errorModels, jobM
                                 userModel, validationModels)
 from dataactcore.config import CONFIG_DB
 from dataactcore.interfaces.db import db_uri
+from dataactcore.interfaces.stagingPartitions import is_staging_partition
 from dataactcore.logging import configure_logging
 
 USE_TWOPHASE = False
@@ -65,6 +66,11 @@ for (key, value) in db_dict.items():
 # ... etc.
 
 
+def include_object(object_, name, type_, reflected, compare_to):
+    """Leave the partitions of the staging tables, which have no models, out of autogenerated migrations"""
+    return not (type_ == 'table' and reflected and is_staging_partition(name))
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -133,7 +139,8 @@ def run_migrations_online():
                 upgrade_token="%s_upgrades" % db_name,
                 downgrade_token="%s_downgrades" % db_name,
                 target_metadata=target_metadata.get(db_name),
-                compare_type=True  # instruct autogen to detect col type changes
+                compare_type=True,  # instruct autogen to detect col type changes
+                include_object=include_object
             )
             context.run_migrations(engine_name=db_name)
 
@@ -0,0 +1,112 @@
+"""partition staging tables by submission
+
+Revision ID: 77bd9a27655d
+Revises: e81bcdb327a3
+Create Date: 2018-01-30 14:27:09.118402
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '77bd9a27655d'
+down_revision = 'e81bcdb327a3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(engine_name):
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_%s" % engine_name]()
+
+
+# staging tables and their ID columns
+STAGING_TABLES = [('appropriation', 'appropriation_id'),
+                  ('object_class_program_activity', 'object_class_program_activity_id'),
+                  ('award_financial', 'award_financial_id'),
+                  ('award_financial_assistance', 'award_financial_assistance_id'),
+                  ('award_procurement', 'award_procurement_id'),
+                  ('detached_award_financial_assistance', 'detached_award_financial_assistance_id'),
+                  ('flex_field', 'flex_field_id')]
+
+# Declarative partitioning with default partitions, and primary keys, indexes and foreign keys on partitioned tables,
+# came in Postgres 11. Older servers keep plain staging tables
+MIN_SERVER_VERSION = 110000
+
+
+def upgrade_data_broker():
+    conn = op.get_bind()
+    if int(conn.execute('SHOW server_version_num').scalar()) < MIN_SERVER_VERSION:
+        return
+
+    # The rows of every existing submission stay where they are, in the legacy partition. Later submissions get a
+    # partition of their own when their files are validated
+    legacy_bound = conn.execute('SELECT COALESCE(MAX(submission_id), 0) + 1 FROM submission').scalar()
+    for table, id_column in STAGING_TABLES:
+        indexes = conn.execute(sa.text("SELECT indexname, indexdef FROM pg_indexes "
+                                       "WHERE schemaname = current_schema() AND tablename = :table "
+                                       "AND indexname != :table || '_pkey' ORDER BY indexname"),
+                               table=table).fetchall()
+        foreign_keys = conn.execute(sa.text("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                                            "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"),
+                                    table=table).fetchall()
+
+        # index names are unique across the schema, so the legacy table's make way for the partitioned table's. Its
+        # primary key is replaced by one including the partition key when it's attached
+        op.execute('ALTER TABLE {0} RENAME TO {0}_legacy'.format(table))
+        op.execute('ALTER TABLE {0}_legacy DROP CONSTRAINT {0}_pkey'.format(table))
+        for number, (index_name, _) in enumerate(indexes):
+            op.execute('ALTER INDEX {} RENAME TO {}_legacy_{}'.format(index_name, table, number))
+
+        op.execute('CREATE TABLE {0} (LIKE {0}_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                   'PARTITION BY RANGE (submission_id)'.format(table))
+        sequence = conn.execute(sa.text('SELECT pg_get_serial_sequence(:table, :column)'),
+                                table=table + '_legacy', column=id_column).scalar()
+        op.execute('ALTER SEQUENCE {} OWNED BY {}.{}'.format(sequence, table, id_column))
+        # the primary key of a partitioned table has to include the partition key
+        op.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_pkey PRIMARY KEY ({1}, submission_id)'.format(table, id_column))
+        for constraint_name, definition in foreign_keys:
+            op.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(table, constraint_name, definition))
+        for _, definition in indexes:
+            op.execute(definition)
+
+        # the legacy table's indexes are attached to the partitioned table's rather than built again
+        op.execute('ALTER TABLE {0} ATTACH PARTITION {0}_legacy FOR VALUES FROM (MINVALUE) TO ({1})'.
+                   format(table, legacy_bound))
+        op.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(table))
+
+
+def downgrade_data_broker():
+    conn = op.get_bind()
+    for table, id_column in STAGING_TABLES:
+        partitioned = conn.execute(sa.text("SELECT relkind = 'p' FROM pg_class "
+                                           "WHERE oid = to_regclass(:table)"), table=table).scalar()
+        if not partitioned:
+            continue
+
+        # the names of the partitioned table's indexes, by the legacy table's index attached to each
+        indexes = conn.execute(sa.text("SELECT child.relname, parent.relname FROM pg_inherits "
+                                       "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                                       "JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent "
+                                       "JOIN pg_index ON pg_index.indexrelid = child.oid "
+                                       "WHERE pg_index.indrelid = CAST(:legacy AS regclass)"),
+                               legacy=table + '_legacy').fetchall()
+
+        op.execute('ALTER TABLE {0} DETACH PARTITION {0}_legacy'.format(table))
+        op.execute('INSERT INTO {0}_legacy SELECT * FROM {0}'.format(table))
+        sequence = conn.execute(sa.text('SELECT pg_get_serial_sequence(:table, :column)'),
+                                table=table, column=id_column).scalar()
+        op.execute('ALTER SEQUENCE {} OWNED BY {}_legacy.{}'.format(sequence, table, id_column))
+        op.execute('DROP TABLE {}'.format(table))
+
+        op.execute('ALTER TABLE {0}_legacy RENAME TO {0}'.format(table))
+        for legacy_index, index_name in indexes:
+            if index_name == table + '_pkey':
+                op.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(table, legacy_index))
+            else:
+                op.execute('ALTER INDEX {} RENAME TO {}'.format(legacy_index, index_name))
+        op.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_pkey PRIMARY KEY ({1})'.format(table, id_column))
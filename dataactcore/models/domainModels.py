@@ -1,4 +1,5 @@
 from datetime import timedelta
+from functools import reduce
 
 import sqlalchemy as sa
 
@@ -33,6 +34,37 @@ TAS_COMPONENTS = (
 )
 
 
+def tas_key(components):
+    """The key a TAS is looked up by: its components joined together, NULLs as empty strings. Components that only
+    differ in being NULL or empty share a key, so lookups by key still compare the components themselves
+
+    Args:
+        components: mapping of TAS component names to their values
+
+    Returns:
+        the key, as built by tas_key_expression in SQL
+    """
+    return '|'.join(components.get(field_name) or '' for field_name in TAS_COMPONENTS)
+
+
+def default_tas_key(context):
+    """Create the TAS lookup key for insert into database."""
+    return tas_key(context.current_parameters)
+
+
+def tas_key_expression(columns):
+    """SQL expression of the TAS lookup key, as built by tas_key
+
+    Args:
+        columns: mapping of TAS component names to the columns holding them
+
+    Returns:
+        SQL expression
+    """
+    return reduce(lambda key, component: key + '|' + component,
+                  (sa.func.coalesce(columns[field_name], '') for field_name in TAS_COMPONENTS))
+
+
 class TASLookup(Base):
     """An entry of CARS history -- this TAS was present in the CARS file
     between internal_start_date and internal_end_date (potentially null)
@@ -52,6 +84,7 @@ class TASLookup(Base):
     financial_indicator2 = Column(Text, nullable=True)
     fr_entity_description = Column(Text, nullable=True)
     fr_entity_type = Column(Text, nullable=True)
+    tas_key = Column(Text, nullable=True, index=True, default=default_tas_key)
 
     def component_dict(self):
         """We'll often want to copy TAS component fields; this method returns
@@ -77,28 +110,47 @@ def is_not_distinct_from(left, right):
     return sa.or_(left == right, sa.and_(left.is_(None), right.is_(None)))
 
 
-def matching_cars_subquery(sess, model_class, start_date, end_date):
+def update_matching_tas_ids(sess, model_class, start_date, end_date, *criteria):
     """We frequently need to mass-update records to look up their CARS history
-    entry. This function creates a subquery to be used in that update call. We
-    pass in the database session to avoid circular dependencies"""
+    entry. Rather than look the history up for every record, this resolves
+    each distinct TAS among the records once, joining them to the history by
+    its lookup key, then updates the records from the results. We pass in the
+    database session to avoid circular dependencies
+
+    Args:
+        sess: database session
+        model_class: model of the records, with TAS components and a tas_id
+        start_date: start of the period the TAS must have been valid in
+        end_date: end of the period the TAS must have been valid in
+        criteria: SQLAlchemy filters picking the records to update
+    """
+    records = {field_name: getattr(model_class, field_name) for field_name in TAS_COMPONENTS}
+    distinct_tas = sess.query(*records.values()).filter(*criteria).distinct().subquery()
+    tas_columns = {field_name: distinct_tas.c[field_name] for field_name in TAS_COMPONENTS}
+    distinct_key = tas_key_expression(tas_columns)
+
     # Why min()?
     # Our data schema doesn't prevent two TAS history entries with the same
     # TAS components (ATA, AI, etc.) from being valid at the same time. When
     # that happens (unlikely), we select the minimum (i.e. older) of the
     # potential TAS history entries.
-    subquery = sess.query(sa.func.min(TASLookup.account_num))
-
-    # Filter to matching TAS components, accounting for NULLs
-    for field_name in TAS_COMPONENTS:
-        tas_col = getattr(TASLookup, field_name)
-        model_col = getattr(model_class, field_name)
-        subquery = subquery.filter(is_not_distinct_from(tas_col, model_col))
-
     day_after_end = end_date + timedelta(days=1)
     model_dates = sa.tuple_(start_date, end_date)
     tas_dates = sa.tuple_(TASLookup.internal_start_date, sa.func.coalesce(TASLookup.internal_end_date, day_after_end))
-    subquery = subquery.filter(model_dates.op('OVERLAPS')(tas_dates))
-    return subquery.as_scalar()
+    matches = [TASLookup.tas_key == distinct_key, model_dates.op('OVERLAPS')(tas_dates)]
+    matches.extend(is_not_distinct_from(getattr(TASLookup, field_name), column)
+                   for field_name, column in tas_columns.items())
+    # TAS without a history entry are resolved too, so their records' tas_id is cleared
+    resolved = sess.query(distinct_key.label('tas_key'), sa.func.min(TASLookup.account_num).label('account_num'),
+                          *tas_columns.values()).\
+        select_from(distinct_tas).outerjoin(TASLookup, sa.and_(*matches)).\
+        group_by(*tas_columns.values()).subquery()
+
+    sess.query(model_class).\
+        filter(*criteria).\
+        filter(tas_key_expression(records) == resolved.c.tas_key).\
+        filter(*[is_not_distinct_from(column, resolved.c[field_name]) for field_name, column in records.items()]).\
+        update({model_class.tas_id: resolved.c.account_num}, synchronize_session=False)
 
 
 class CGAC(Base):
@@ -343,3 +395,11 @@ Index("ix_sc_state_cd",
       StateCongressional.state_code,
       StateCongressional.congressional_district_no,
       unique=True)
+
+
+class ReferenceDataVersion(Base):
+    """ version of a domain table, bumped each time it's loaded so cached copies of it can be refreshed """
+    __tablename__ = "reference_data_version"
+
+    table_name = Column(Text, primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default='0')
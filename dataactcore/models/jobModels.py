@@ -103,12 +103,19 @@ class Job(Base):
     number_of_rows_valid = Column(Integer)
     number_of_errors = Column(Integer, nullable=False, default=0, server_default='0')
     number_of_warnings = Column(Integer, nullable=False, default=0, server_default='0')
+    # progress of FABS publish jobs, whose number_of_rows is the number of rows being published
+    number_of_rows_derived = Column(Integer)
+    number_of_rows_inserted = Column(Integer)
     error_message = Column(Text)
     start_date = Column(Date)
     end_date = Column(Date)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL", name="fk_job_user"), nullable=True)
     last_validated = Column(DateTime, default=datetime.utcnow)
     from_cached = Column(Boolean, nullable=False, default=False)
+    # SHA-256 of the file last validated, and the fingerprint of that file, its schema and rules, recorded once the
+    # validation finished
+    file_hash = Column(Text)
+    validation_hash = Column(Text)
 
     @property
     def job_type_name(self):
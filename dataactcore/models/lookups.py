@@ -55,7 +55,8 @@ JOB_TYPE = [
     LookupType(2, 'csv_record_validation', 'do record level validation and add to staging table'),
     LookupType(3, 'db_transfer', 'information must be moved from production DB to staging table'),
     LookupType(4, 'validation', 'new information must be validated'),
-    LookupType(5, 'external_validation', 'new information must be validated against external sources')
+    LookupType(5, 'external_validation', 'new information must be validated against external sources'),
+    LookupType(6, 'fabs_publish', 'valid FABS rows must be derived and published')
 ]
 JOB_TYPE_DICT = {item.name: item.id for item in JOB_TYPE}
 JOB_TYPE_DICT_ID = {item.id: item.name for item in JOB_TYPE}
@@ -13,6 +13,7 @@ from sqlalchemy.exc import IntegrityError
 
 from dataactcore.models.domainModels import DUNS
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
 from dataactvalidator.health_check import create_app
 from dataactvalidator.scripts.loaderUtils import clean_data, insert_dataframe
@@ -185,6 +186,7 @@ def parse_sam_file(file_path, sess, monthly=False, benchmarks=False):
                             models, activated_models = get_relevant_models(update_delete_data, benchmarks=benchmarks)
                             logger.info("Loading update_delete data ({} rows)".format(len(update_delete_data.index)))
                             load_duns_by_row(update_delete_data, sess, models, activated_models, benchmarks=benchmarks)
+                    bump_reference_version(sess, DUNS)
                     sess.commit()
 
             added_rows += nrows
@@ -215,16 +215,14 @@ mapping = OrderedDict([
 db_columns = [val for key, val in mapping.items()]
 
 
-def query_data(session, agency_code, start, end, page_start, page_stop):
-    """ Request D1 file data
+def query_data(session, agency_code, start, end):
+    """ Request D1 file data, in the order the rows were loaded
 
         Args:
             session - DB session
             agency_code - FREC or CGAC code for generation
             start - Beginning of period for D file
             end - End of period for D file
-            page_start - Beginning of pagination
-            page_stop - End of pagination
     """
     rows = session.query(
         file_model.piid,
@@ -434,5 +432,5 @@ def query_data(session, agency_code, start, end, page_start, page_stop):
         filter(file_model.awarding_agency_code == agency_code).\
         filter(cast(file_model.action_date, Date) >= start).\
         filter(cast(file_model.action_date, Date) <= end).\
-        slice(page_start, page_stop)
+        order_by(file_model.detached_award_procurement_id)
     return rows
@@ -75,36 +75,33 @@ mapping = OrderedDict([
 db_columns = [val for key, val in mapping.items()]
 
 
-def query_data(session, agency_code, start, end, page_start, page_stop):
-    """ Request D2 file data
+def query_data(session, agency_code, start, end):
+    """ Request D2 file data, in the order the rows were published
 
         Args:
             session - DB session
             agency_code - FREC or CGAC code for generation
             start - Beginning of period for D file
             end - End of period for D file
-            page_start - Beginning of pagination
-            page_stop - End of pagination
     """
     rows = initial_query(session).\
         filter(file_model.is_active.is_(True)).\
         filter(file_model.awarding_agency_code == agency_code).\
         filter(cast(file_model.action_date, Date) >= start).\
         filter(cast(file_model.action_date, Date) <= end).\
-        slice(page_start, page_stop)
+        order_by(file_model.published_award_financial_assistance_id)
     return rows
 
 
-def query_published_fabs_data(session, submission_id, page_start, page_stop):
-    """ Request published FABS file data
+def query_published_fabs_data(session, submission_id):
+    """ Request published FABS file data, in the order the rows were published
 
         Args:
             session - DB session
             submission_id - Submission ID for generation
-            page_start - Beginning of pagination
-            page_stop - End of pagination
     """
-    return initial_query(session).filter(file_model.submission_id == submission_id).slice(page_start, page_stop)
+    return initial_query(session).filter(file_model.submission_id == submission_id).\
+        order_by(file_model.published_award_financial_assistance_id)
 
 
 def initial_query(session):
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 import logging
 import csv
 
@@ -6,6 +7,8 @@ from flask import Flask, g, current_app
 from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 from dataactcore.interfaces.db import GlobalDB
 from dataactcore.logging import configure_logging
+from dataactvalidator.jobScheduler import estimate_job
+from dataactvalidator.supervisor import JobConsumer, ValidatorSupervisor
 from dataactvalidator.validation_handlers.validationManager import ValidationManager
 from dataactcore.aws.sqsHandler import sqs_queue
 from dataactcore.interfaces.function_bag import mark_job_status, write_file_error
@@ -21,82 +24,91 @@ def create_app():
     return Flask(__name__)
 
 
-def run_app():
-    """Run the application."""
+@contextmanager
+def validator_context():
+    """App context the validator runs jobs in"""
     app = Flask(__name__)
 
     with app.app_context():
         current_app.debug = CONFIG_SERVICES['debug']
-        local = CONFIG_BROKER['local']
-        g.is_local = local
-        error_report_path = CONFIG_SERVICES['error_report_path']
+        g.is_local = CONFIG_BROKER['local']
         current_app.config.from_object(__name__)
 
         # Future: Override config w/ environment variable, if set
         current_app.config.from_envvar('VALIDATOR_SETTINGS', silent=True)
+        yield
 
-        queue = sqs_queue()
 
-        logger.info("Starting SQS polling")
-        current_message = None
-        while True:
-            try:
-                # Grabs one (or more) messages from the queue
-                messages = queue.receive_messages(WaitTimeSeconds=10)
-                for message in messages:
-                    logger.info("Message received: %s", message.body)
-                    current_message = message
-                    GlobalDB.db()
-                    g.job_id = message.body
-                    mark_job_status(g.job_id, "ready")
-                    validation_manager = ValidationManager(local, error_report_path)
-                    validation_manager.validate_job(g.job_id)
-
-                    # delete from SQS once processed
-                    message.delete()
-            except ResponseException as e:
-                # Handle exceptions explicitly raised during validation.
-                logger.error(str(e))
-
-                job = get_current_job()
-                if job:
-                    if job.filename is not None:
-                        # insert file-level error info to the database
-                        write_file_error(job.job_id, job.filename, e.errorType, e.extraInfo)
-                    if e.errorType != ValidationError.jobError:
-                        # job pass prerequisites for validation, but an error
-                        # happened somewhere. mark job as 'invalid'
-                        mark_job_status(job.job_id, 'invalid')
-                        if current_message:
-                            if e.errorType in [ValidationError.rowCountError, ValidationError.headerError,
-                                               ValidationError.fileTypeError]:
-                                current_message.delete()
-            except Exception as e:
-                # Handle uncaught exceptions in validation process.
-                logger.error(str(e))
-
-                # csv-specific errors get a different job status and response code
-                if isinstance(e, ValueError) or isinstance(e, csv.Error) or isinstance(e, UnicodeDecodeError):
-                    job_status = 'invalid'
-                else:
-                    job_status = 'failed'
-                job = get_current_job()
-                if job:
-                    if job.filename is not None:
-                        error_type = ValidationError.unknownError
-                        if isinstance(e, UnicodeDecodeError):
-                            error_type = ValidationError.encodingError
-                            # TODO Is this really the only case where the message should be deleted?
-                            if current_message:
-                                current_message.delete()
-                        write_file_error(job.job_id, job.filename, error_type)
-                    mark_job_status(job.job_id, job_status)
-            finally:
-                GlobalDB.close()
-                # Set visibility to 0 so that another attempt can be made to process in SQS immediately,
-                # instead of waiting for the timeout window to expire
-                for message in messages:
-                    message.change_visibility(VisibilityTimeout=0)
+def run_app():
+    """Run the application, with a supervised pool of worker processes when more than one is configured."""
+    with validator_context():
+        queue = sqs_queue()
+        workers = CONFIG_SERVICES.get('validator_workers') or 1
+        if workers > 1:
+            ValidatorSupervisor(queue, run_job, validator_context, workers, estimate_job=estimate_job).run()
+        else:
+            JobConsumer(queue, run_job).run()
+
+
+def run_job(job_id):
+    """Validate a job received from SQS, recording why it failed if it did.
+
+    Args:
+        job_id: ID of the job to validate
+
+    Returns:
+        True if the job's message should be deleted, False if the job should be retried
+    """
+    local = CONFIG_BROKER['local']
+    error_report_path = CONFIG_SERVICES['error_report_path']
+    try:
+        GlobalDB.db()
+        g.job_id = job_id
+        mark_job_status(g.job_id, "ready")
+        validation_manager = ValidationManager(local, error_report_path)
+        validation_manager.validate_job(g.job_id)
+        return True
+    except ResponseException as e:
+        # Handle exceptions explicitly raised during validation.
+        logger.error(str(e))
+
+        job = get_current_job()
+        if job:
+            if job.filename is not None:
+                # insert file-level error info to the database
+                write_file_error(job.job_id, job.filename, e.errorType, e.extraInfo)
+            if e.errorType != ValidationError.jobError:
+                # job pass prerequisites for validation, but an error
+                # happened somewhere. mark job as 'invalid'
+                mark_job_status(job.job_id, 'invalid')
+                if e.errorType in [ValidationError.rowCountError, ValidationError.headerError,
+                                   ValidationError.fileTypeError]:
+                    return True
+        return False
+    except Exception as e:
+        # Handle uncaught exceptions in validation process.
+        logger.error(str(e))
+
+        # csv-specific errors get a different job status and response code
+        if isinstance(e, ValueError) or isinstance(e, csv.Error) or isinstance(e, UnicodeDecodeError):
+            job_status = 'invalid'
+        else:
+            job_status = 'failed'
+        delete = False
+        job = get_current_job()
+        if job:
+            if job.filename is not None:
+                error_type = ValidationError.unknownError
+                if isinstance(e, UnicodeDecodeError):
+                    error_type = ValidationError.encodingError
+                    # TODO Is this really the only case where the message should be deleted?
+                    delete = True
+                write_file_error(job.job_id, job.filename, error_type)
+            mark_job_status(job.job_id, job_status)
+        return delete
+    finally:
+        # keep the engine and its connections for the next job
+        GlobalDB.release()
 
 
 def get_current_job():
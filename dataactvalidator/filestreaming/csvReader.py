@@ -1,26 +1,36 @@
 import csv
 import os
 import tempfile
+from collections import namedtuple
 
 import boto3
 
-from dataactcore.config import CONFIG_BROKER
-from dataactcore.models.stagingModels import FlexField
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 from dataactcore.utils.responseException import ResponseException
 from dataactcore.utils.statusCode import StatusCode
 from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.filestreaming.s3Stream import open_s3_text_stream
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
+# A single flex column value from a submitted row
+FlexCell = namedtuple('FlexCell', ['header', 'cell'])
+
 
 class CsvReader(object):
     """
-    Reads data from local CSV file (first downloading from S3 if necessary)
+    Reads data from a local CSV file, or from S3 either as a stream or by first downloading to a temp file
     """
 
     header_report_headers = ["Error type", "Header name"]
 
+    def __init__(self):
+        self.filename = None
+        self.has_tempfile = False
+        # Number of raw rows read from the file so far, including the header and any blank rows
+        self.row_count = 0
+
     def get_filename(self, region, bucket, filename, from_open_file=None):
         """Creates a filename based on the file path
         Args:
@@ -56,14 +66,20 @@ class CsvReader(object):
             long_to_short_dict: mapping of long to short schema column names
         """
 
-        if not self.filename:
-            self.get_filename(region, bucket, filename)
-
         self.is_local = is_local
-        try:
-            self.file = open(self.filename, "r", newline=None)
-        except:
-            raise ValueError("".join(["Filename provided not found : ", str(self.filename)]))
+        if region and bucket and CONFIG_SERVICES.get('stream_s3_files', True):
+            # Parse the file as it downloads instead of waiting for the whole file to be written to disk
+            self.filename = filename
+            self.file = open_s3_text_stream(region, bucket, filename)
+        else:
+            if not self.filename:
+                self.get_filename(region, bucket, filename)
+
+            try:
+                # Decoding as we read raises a UnicodeDecodeError for non-UTF8 characters without a separate pass
+                self.file = open(self.filename, "r", encoding='utf-8', newline=None)
+            except:
+                raise ValueError("".join(["Filename provided not found : ", str(self.filename)]))
 
         self.unprocessed = ''
         self.extra_line = False
@@ -72,6 +88,7 @@ class CsvReader(object):
         self.is_finished = False
         self.column_count = 0
         header_line = self.file.readline()
+        self.row_count = 1 if header_line else 0
         # make sure we have not finished reading the file
 
         if self.is_finished:
@@ -113,7 +130,7 @@ class CsvReader(object):
         """
         Read the next record into a dict and return it
         Returns:
-            pair of (dictionary of expected fields, list of FlexFields)
+            pair of (dictionary of expected fields, list of FlexCells)
         """
         return_dict = {}
         flex_fields = []
@@ -134,7 +151,7 @@ class CsvReader(object):
                 cell = None
             # self.expected_headers uses the short, machine-readable column names
             if self.expected_headers[idx] is None and self.flex_headers[idx] is not None:
-                flex_fields.append(FlexField(header=self.flex_headers[idx], cell=cell))
+                flex_fields.append(FlexCell(self.flex_headers[idx], cell))
             # We skip headers which aren't expected and aren't flex
             elif self.expected_headers[idx] is not None:
                 return_dict[self.expected_headers[idx]] = cell
@@ -142,11 +159,14 @@ class CsvReader(object):
 
     def _get_line(self):
         try:
-            # read next until we get a non-empty line or get an empty string signifying end of file
+            # read next until we get a non-empty line or get an empty string signifying end of file, counting every
+            # row read so the total can be checked against the number of rows validated
             line = next(self.csv_reader)
+            self.row_count += 1
             while line == '\n' or line == []:
                 line = next(self.csv_reader)
-        except:
+                self.row_count += 1
+        except StopIteration:
             # If we cannot continue, we've reached the end of the file
             line = ''
             self.is_finished = True
@@ -1,10 +1,15 @@
 import csv
+import io
+from itertools import islice
 import logging
 import os
 import smart_open
 
+from psycopg2.extensions import encodings
+from sqlalchemy import case, cast, Float, func, Numeric, Text
+
 from dataactcore.aws.s3Handler import S3Handler
-from dataactcore.config import CONFIG_BROKER
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
 
@@ -63,9 +68,9 @@ def get_write_csv_writer(file_name, upload_name, is_local, header):
     return csv_writer
 
 
-def write_query_to_file(local_filename, upload_name, header, file_type, is_local, query_func, query_utils,
-                        is_certified=False):
-    """Write file locally from a query, then stream it to S3
+def write_query_to_file(local_filename, upload_name, header, file_type, is_local, query, is_certified=False):
+    """Write file locally from a query, then stream it to S3. The query's results are read through a server-side
+       cursor, QUERY_SIZE rows at a time
 
         Args:
             local_filename - full path for local file
@@ -73,10 +78,13 @@ def write_query_to_file(local_filename, upload_name, header, file_type, is_local
             header - value to write as the first line of the file
             file_type - Type of file (for logging purposes only)
             is_local - True if in local development, False otherwise
-            query_func - function to call to query data
-            query_utils - variables to pass to query function
+            query - query of the rows to write, ordered so the file's rows are in a stable order
             is_certified - True if writing to the certified bucket, False otherwise (default False)
     """
+    if CONFIG_SERVICES.get('d_file_export_engine') == 'copy':
+        copy_query_to_file(local_filename, upload_name, header, file_type, is_local, query, is_certified)
+        return
+
     # create file locally
     with open(local_filename, 'w', newline='') as csv_file:
         # create local file and write headers
@@ -84,13 +92,11 @@ def write_query_to_file(local_filename, upload_name, header, file_type, is_local
         if header:
             out_csv.writerow(header)
 
-        page_idx = 0
+        results = iter(query.yield_per(QUERY_SIZE))
+        page_start = 0
         while True:
-            # query QUERY_SIZE number of rows
-            page_start = QUERY_SIZE * page_idx
-            rows = query_func(query_utils, page_start, (QUERY_SIZE * (page_idx + 1)))
-
-            if rows is None:
+            rows = list(islice(results, QUERY_SIZE))
+            if not rows:
                 break
 
             # write records to file
@@ -101,9 +107,7 @@ def write_query_to_file(local_filename, upload_name, header, file_type, is_local
                 'file_name': local_filename
             })
             out_csv.writerows(rows)
-            if len(rows) < QUERY_SIZE:
-                break
-            page_idx += 1
+            page_start += len(rows)
 
     # close file
     csv_file.close()
@@ -117,6 +121,102 @@ def write_query_to_file(local_filename, upload_name, header, file_type, is_local
         os.remove(local_filename)
 
 
+def copy_query_to_file(local_filename, upload_name, header, file_type, is_local, query, is_certified=False):
+    """Write file from a query with COPY TO STDOUT, the database formatting the rows as CSV. The output is written to
+       the local file as it comes, or straight to S3 when not running locally, without going through Python row by row.
+       The file is the same as write_query_to_file writes with csv.writer, except that COPY quotes values containing a
+       carriage return where csv.writer only quotes those containing a newline
+
+        Args:
+            local_filename - full path for local file
+            upload_name - file name to be used as S3 key
+            header - value to write as the first line of the file
+            file_type - Type of file (for logging purposes only)
+            is_local - True if in local development, False otherwise
+            query - query of the rows to write, ordered so the file's rows are in a stable order
+            is_certified - True if writing to the certified bucket, False otherwise (default False)
+    """
+    logger.debug({
+        'message': 'Copying {} CSV from the database'.format(file_type),
+        'message_type': 'ValidatorDebug',
+        'file_type': file_type,
+        'file_name': local_filename if is_local else upload_name
+    })
+
+    # the header is written by csv.writer, as COPY's would be cut short where names are longer than postgres allows
+    header_line = io.StringIO()
+    if header:
+        csv.writer(header_line, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n').writerow(header)
+    header_bytes = header_line.getvalue().encode()
+
+    connection = query.session.connection().connection
+    with connection.cursor() as cursor:
+        copy_sql = copy_query_sql(cursor, query)
+        if is_local:
+            with open(local_filename, 'wb') as csv_file:
+                csv_file.write(header_bytes)
+                cursor.copy_expert(copy_sql, csv_file)
+        else:
+            with smart_open.smart_open(s3_file_handler(upload_name, is_certified), 'w') as writer:
+                writer.write(header_bytes)
+                cursor.copy_expert(copy_sql, writer)
+
+
+def copy_query_sql(cursor, query):
+    """COPY statement writing the results of a query as CSV the way csv.writer does, NULLs and empty strings both
+       being left empty and numerics written the way str(Decimal) writes them
+
+        Args:
+            cursor - psycopg2 cursor, used to fill in the query's parameters
+            query - query of the rows to write
+
+        Returns:
+            the COPY statement
+    """
+    columns = []
+    for column in query.column_descriptions:
+        if isinstance(column['type'], Numeric) and not isinstance(column['type'], Float):
+            columns.append(func.nullif(decimal_text(column['expr']), ''))
+        else:
+            columns.append(func.nullif(cast(column['expr'], Text), ''))
+    query = query.with_entities(*columns)
+    compiled = query.statement.compile(dialect=query.session.connection().dialect)
+    select_sql = cursor.mogrify(str(compiled), compiled.params).decode(encodings[cursor.connection.encoding])
+    return 'COPY ({}) TO STDOUT WITH CSV'.format(select_sql)
+
+
+def decimal_text(expr):
+    """A numeric value as text, the way str(Decimal) writes it. Postgres writes numerics in plain notation, while
+       Decimal switches to scientific notation once the value's adjusted exponent is below -6, writing 0.0000000 as
+       0E-7 and 0.00000012 as 1.2E-7. That can only happen for values between -1 and 1, whose digits after any
+       leading zeros are the Decimal's coefficient
+
+        Args:
+            expr - numeric column or expression
+
+        Returns:
+            text expression of the value
+    """
+    digits = func.coalesce(func.nullif(func.ltrim(func.split_part(cast(expr, Text), '.', 2), '0'), ''), '0')
+    adjusted = func.length(digits) - 1 - func.scale(expr)
+    scientific = func.concat(case([(expr < 0, '-')], else_=''), func.left(digits, 1),
+                             case([(func.length(digits) > 1, func.concat('.', func.substr(digits, 2)))], else_=''),
+                             'E', adjusted)
+    return case([((func.abs(expr) < 1) & (adjusted < -6), scientific)], else_=cast(expr, Text))
+
+
+def s3_file_handler(upload_name, is_certified=False):
+    """S3 path to write a file to
+
+        Args:
+            upload_name - file name to be used as S3 key
+            is_certified - True if writing to the certified bucket, False otherwise (default False)
+    """
+    if is_certified:
+        return S3Handler.create_file_path(upload_name, CONFIG_BROKER["certified_bucket"])
+    return S3Handler.create_file_path(upload_name)
+
+
 def stream_file_to_s3(upload_name, reader, is_certified=False):
     """Stream file to S3
 
@@ -132,12 +232,7 @@ def stream_file_to_s3(upload_name, reader, is_certified=False):
         'file_name': file_name if file_name else path
     })
 
-    if is_certified:
-        handler = S3Handler.create_file_path(upload_name, CONFIG_BROKER["certified_bucket"])
-    else:
-        handler = S3Handler.create_file_path(upload_name)
-
-    with smart_open.smart_open(handler, 'w') as writer:
+    with smart_open.smart_open(s3_file_handler(upload_name, is_certified), 'w') as writer:
         while True:
             chunk = reader.read(CHUNK_SIZE)
             if chunk:
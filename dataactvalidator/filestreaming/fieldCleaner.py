@@ -150,6 +150,38 @@ class FieldCleaner(StringCleaner):
                 row[key] = cls.pad_field(field, value)
         return row
 
+    @classmethod
+    def clean_planned_row(cls, row, plan):
+        """ Cleans a row the same way as clean_row, using a column plan instead of the schema
+
+        Args:
+            row: Record in this row
+            plan: column plan bound to the keys of the row, see columnPlan.bind_plan
+
+        Returns:
+            Cleaned row
+        """
+        for column, (key, value) in zip(plan, list(row.items())):
+            if column is None or value is None:
+                continue
+            # Remove extra whitespace
+            value = value.strip()
+            # If field is wrapped in quotes then remove
+            if value.startswith('"') and value.endswith('"'):
+                value = value[1:-1].strip()
+            if column.numeric:
+                temp_value = value.replace(",", "")
+                if cls.is_numeric(temp_value):
+                    value = temp_value
+            if value == "":
+                # Replace empty strings with null
+                value = None
+            elif column.pad_length is not None:
+                # Pad to specified length with leading zeros
+                value = value.zfill(column.pad_length)
+            row[key] = value
+        return row
+
     @staticmethod
     def pad_field(field, value):
         """ Pad value with appropriate number of leading zeros if needed
@@ -0,0 +1,286 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import logging
+import queue
+import threading
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# Creating clients from boto3's default session isn't thread safe, and streams are opened from several threads at once
+_client_lock = threading.Lock()
+
+
+class S3ReadAheadStream(io.RawIOBase):
+    """
+    Reads an S3 object as a stream of bytes. A background thread downloads the object in chunks ahead of the reader,
+    holding at most a fixed number of chunks in memory, so parsing can start on the first bytes received and the rest
+    of the download overlaps with it.
+    """
+
+    CHUNK_SIZE = 1024 ** 2
+    READ_AHEAD_CHUNKS = 8
+    MAX_RETRIES = 3
+    # How long the download thread waits for room in the buffer before checking whether the stream was closed
+    PUT_TIMEOUT = 1
+
+    def __init__(self, region, bucket, key, chunk_size=None, read_ahead_chunks=None):
+        """
+        Args:
+            region: AWS region where the bucket is located
+            bucket: name of the S3 bucket
+            key: path of the object in the bucket
+            chunk_size: number of bytes requested from S3 per read
+            read_ahead_chunks: maximum number of downloaded chunks waiting to be read
+        """
+        super(S3ReadAheadStream, self).__init__()
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.client = s3_client(region)
+
+        self._chunks = queue.Queue(maxsize=read_ahead_chunks or self.READ_AHEAD_CHUNKS)
+        self._current = b''
+        self._error = None
+        self._finished = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._download, name='s3-read-ahead', daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """ Fill the buffer with the next downloaded bytes, blocking until some are available
+
+        Returns:
+            number of bytes read, 0 at the end of the object
+        """
+        while not self._current:
+            if self._finished:
+                return 0
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._finished = True
+                if self._error is not None:
+                    raise self._error
+            else:
+                self._current = chunk
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def close(self):
+        """ Stop the download and release the buffered chunks """
+        self._stopped.set()
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+        self._thread.join()
+        super(S3ReadAheadStream, self).close()
+
+    def _download(self):
+        """ Download the object chunk by chunk, resuming with a ranged GET from the last byte received if the
+        connection drops """
+        position = 0
+        retries = 0
+        try:
+            while not self._stopped.is_set():
+                request = {'Bucket': self.bucket, 'Key': self.key}
+                if position:
+                    request['Range'] = 'bytes={}-'.format(position)
+                body = self.client.get_object(**request)['Body']
+                try:
+                    while not self._stopped.is_set():
+                        chunk = body.read(self.chunk_size)
+                        if not chunk:
+                            return
+                        position += len(chunk)
+                        retries = 0
+                        self._put(chunk)
+                except Exception as e:
+                    # connection errors come from whichever urllib3 botocore is using, so retry any failed read
+                    retries += 1
+                    if retries > self.MAX_RETRIES:
+                        raise
+                    logger.warning({
+                        'message': 'Read of s3://{}/{} interrupted at byte {}, retrying: {}'.format(
+                            self.bucket, self.key, position, str(e)),
+                        'message_type': 'ValidatorWarning'
+                    })
+                finally:
+                    body.close()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(None)
+
+    def _put(self, chunk):
+        """ Queue a chunk for the reader, waiting for room in the buffer unless the stream has been closed """
+        while not self._stopped.is_set():
+            try:
+                self._chunks.put(chunk, timeout=self.PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+
+def open_s3_text_stream(region, bucket, key, encoding='utf-8'):
+    """ Open an S3 object as a text stream that is decoded as it is downloaded
+
+    Args:
+        region: AWS region where the bucket is located
+        bucket: name of the S3 bucket
+        key: path of the object in the bucket
+        encoding: encoding of the object
+
+    Returns:
+        text file object reading from the S3 object
+    """
+    raw = S3ReadAheadStream(region, bucket, key)
+    return io.TextIOWrapper(io.BufferedReader(raw, buffer_size=raw.chunk_size), encoding=encoding, newline=None)
+
+
+class S3MultipartWriteStream(io.RawIOBase):
+    """
+    Writes a stream of bytes to an S3 object. Bytes are gathered into large parts which are uploaded by background
+    threads while writing continues, holding at most a fixed number of parts in memory. The object only appears in
+    S3 once the stream is closed, and not at all if the stream is aborted.
+    """
+
+    PART_SIZE = 16 * 1024 ** 2
+    # S3 rejects parts other than the last smaller than this
+    MIN_PART_SIZE = 5 * 1024 ** 2
+    UPLOAD_THREADS = 3
+
+    def __init__(self, region, bucket, key, part_size=None, upload_threads=None):
+        """
+        Args:
+            region: AWS region where the bucket is located
+            bucket: name of the S3 bucket
+            key: path of the object in the bucket
+            part_size: number of bytes uploaded per part
+            upload_threads: maximum number of parts uploading at once
+        """
+        super(S3MultipartWriteStream, self).__init__()
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size or self.PART_SIZE, self.MIN_PART_SIZE)
+        self.client = s3_client(region)
+
+        self._upload_threads = upload_threads or self.UPLOAD_THREADS
+        self._pool = None
+        self._upload_id = None
+        self._chunks = []
+        self._size = 0
+        self._uploads = deque()
+        self._parts = []
+        self._aborted = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        """ Add bytes to the part being gathered, starting its upload once it's big enough
+
+        Returns:
+            number of bytes written
+        """
+        if self._aborted:
+            return len(data)
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        if self._size >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def close(self):
+        """ Upload the rest of the bytes and complete the object, unless the stream was aborted """
+        if self.closed:
+            return
+        try:
+            if not self._aborted:
+                if self._upload_id is None:
+                    # small objects are uploaded in one request
+                    self.client.put_object(Bucket=self.bucket, Key=self.key, Body=b''.join(self._chunks))
+                else:
+                    if self._size:
+                        self._upload_part()
+                    self._wait(0)
+                    self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                          MultipartUpload={'Parts': self._parts})
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            super(S3MultipartWriteStream, self).close()
+
+    def abort(self):
+        """ Stop writing and discard the parts uploaded so far """
+        if self._aborted:
+            return
+        self._aborted = True
+        self._chunks = []
+        for upload in self._uploads:
+            upload.cancel()
+        if self._upload_id is not None:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def _upload_part(self):
+        """ Start uploading the gathered bytes as the next part, waiting for room among the uploads in progress """
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+            self._pool = ThreadPoolExecutor(self._upload_threads)
+        self._wait(self._upload_threads - 1)
+        part_number = len(self._parts) + len(self._uploads) + 1
+        body = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        self._uploads.append(self._pool.submit(self._send_part, part_number, body))
+
+    def _send_part(self, part_number, body):
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                           PartNumber=part_number, Body=body)
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _wait(self, pending):
+        """ Wait until no more than the given number of parts are uploading """
+        while len(self._uploads) > pending:
+            self._parts.append(self._uploads.popleft().result())
+
+
+def s3_client(region):
+    """ Create an S3 client, which can be done from any thread
+
+    Args:
+        region: AWS region of the client
+
+    Returns:
+        boto3 S3 client
+    """
+    with _client_lock:
+        return boto3.client('s3', region_name=region)
+
+
+def open_s3_text_writer(region, bucket, key, encoding='utf-8', part_size=None):
+    """ Open an S3 object as a text stream that is encoded and uploaded as it is written
+
+    Args:
+        region: AWS region where the bucket is located
+        bucket: name of the S3 bucket
+        key: path of the object in the bucket
+        encoding: encoding of the object
+        part_size: number of bytes uploaded per part
+
+    Returns:
+        text file object writing to the S3 object, its raw S3MultipartWriteStream can be aborted
+    """
+    raw = S3MultipartWriteStream(region, bucket, key, part_size=part_size)
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=1024 ** 2), encoding=encoding, newline='')
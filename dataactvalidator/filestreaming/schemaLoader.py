@@ -8,6 +8,7 @@ from dataactcore.models.jobModels import FileType
 from dataactcore.models.validationModels import FileColumn, FieldType
 from dataactvalidator.health_check import create_app
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.validation_handlers.columnPlan import clear_column_plans
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,8 @@ class SchemaLoader(object):
                             raise ValueError('CSV File does not follow schema')
 
                 sess.commit()
+                # validators in other processes see the new rows and compile their plans again on their next job
+                clear_column_plans()
                 logger.info({
                     'message': '{} {} schema records added to {}'.format(file_column_count, file_type_name,
                                                                          FileColumn.__tablename__),
@@ -100,8 +103,30 @@ class SchemaLoader(object):
         field_length -- Maximum allowed length for this field
 
         """
-        new_column = FileColumn()
+        new_column = SchemaLoader.build_column(types, field_name, field_name_short, required, field_type, padded_flag,
+                                               field_length)
         new_column.file = file_type
+        sess.add(new_column)
+
+    @staticmethod
+    def build_column(types, field_name, field_name_short, required, field_type, padded_flag="False",
+                     field_length=None):
+        """
+        Creates a schema column without adding it to the database
+
+        Args:
+        types -- Dict of field type names to ids
+        field_name -- The name of the schema column
+        field_name_short -- The machine-friendly, short column name
+        required --  marks the column if data is allways required
+        field_type  -- sets the type of data allowed in the column
+        padded_flag -- True if this column should be padded
+        field_length -- Maximum allowed length for this field
+
+        Returns:
+        FileColumn object
+        """
+        new_column = FileColumn()
         new_column.required = False
         new_column.name = field_name.lower().strip().replace(' ', '_')
         new_column.name_short = field_name_short.lower().strip().replace(' ', '_')
@@ -141,7 +166,7 @@ class SchemaLoader(object):
             length_int = int(str(field_length).strip())
             new_column.length = length_int
 
-        sess.add(new_column)
+        return new_column
 
     @classmethod
     def load_all_from_path(cls, path):
@@ -0,0 +1,170 @@
+from collections import namedtuple
+import logging
+import os
+import time
+
+from sqlalchemy import func
+
+from dataactcore.aws.s3Handler import S3Handler
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.jobModels import Job
+from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_TYPE_DICT
+from dataactcore.models.validationModels import RuleSql
+
+logger = logging.getLogger(__name__)
+
+# Lanes in the order their jobs are run: FABS uploads are validated while their users wait on them, DABS files and
+# cross-file validations in bulk
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+# Rough cost of deriving and publishing one FABS row, in the units of a validation's cost: a row of a few hundred bytes
+# going through around ten derivations
+PUBLISH_ROW_COST = 5000
+
+JobEstimate = namedtuple('JobEstimate', ['job_id', 'lane', 'cost', 'file_size', 'rule_count'])
+ScheduledJob = namedtuple('ScheduledJob', ['message', 'estimate', 'added'])
+
+
+def estimate_job(job_id):
+    """ Estimate how much work validating a job is, and the lane it's run in
+
+    Args:
+        job_id: ID of the job
+
+    Returns:
+        JobEstimate. The cost is the size of the file in bytes times the number of rules run against it, plus one for
+        the schema checks. A cross-file job counts the size of all its submission's validated files. Publishing a FABS
+        submission has no file, so it's costed by the number of rows it publishes, and run in the bulk lane so a long
+        publish doesn't hold the worker kept for FABS validations
+    """
+    sess = GlobalDB.db().session
+    try:
+        job = sess.query(Job).filter_by(job_id=job_id).one_or_none()
+        if job is None:
+            # the job fails straight away
+            return JobEstimate(job_id, INTERACTIVE, 0, 0, 0)
+        if job.job_type_id == JOB_TYPE_DICT['fabs_publish']:
+            return JobEstimate(job_id, BULK, (job.number_of_rows or 0) * PUBLISH_ROW_COST, 0, 0)
+        if job.job_type_id == JOB_TYPE_DICT['validation']:
+            file_size = sess.query(func.coalesce(func.sum(Job.file_size), 0)).\
+                filter(Job.submission_id == job.submission_id,
+                       Job.job_type_id == JOB_TYPE_DICT['csv_record_validation']).scalar()
+            rules = sess.query(RuleSql).filter(RuleSql.rule_cross_file_flag.is_(True))
+        else:
+            # the size of the file isn't recorded until its validation starts
+            file_size = _file_size(job.filename)
+            rules = sess.query(RuleSql).filter(RuleSql.file_id == job.file_type_id,
+                                               RuleSql.rule_cross_file_flag.is_(False))
+        rule_count = rules.count()
+        lane = INTERACTIVE if job.file_type_id == FILE_TYPE_DICT['detached_award'] else BULK
+        return JobEstimate(job_id, lane, file_size * (rule_count + 1), file_size, rule_count)
+    finally:
+        # end the transaction, so the scheduler doesn't hold one open between jobs
+        sess.rollback()
+
+
+def _file_size(file_name):
+    """ Size of a submitted file in bytes, 0 if it can't be found """
+    if not file_name:
+        return 0
+    if CONFIG_BROKER['use_aws']:
+        return S3Handler.get_file_size(file_name) or 0
+    try:
+        return os.path.getsize(file_name)
+    except OSError:
+        return 0
+
+
+class JobScheduler:
+    """ Holds the jobs received from SQS until a worker is free to run them, deciding which goes next. Interactive jobs
+        go before bulk ones and cheaper jobs before more expensive ones in the same lane, but any job that has waited
+        scheduler_max_wait seconds goes first, so none wait forever. Bulk jobs can't take the last
+        interactive_workers workers, so there's always a worker free for FABS uploads.
+    """
+    def __init__(self, workers, interactive_workers=None, max_wait=None):
+        """ Create the scheduler
+
+        Args:
+            workers: number of workers jobs are run on
+            interactive_workers: number of workers kept for interactive jobs, defaults to the interactive_workers
+                setting. At least one worker is always left for bulk jobs
+            max_wait: seconds a job can wait before it goes ahead of the others, defaults to the scheduler_max_wait
+                setting
+        """
+        interactive_workers = CONFIG_SERVICES.get('interactive_workers', 1) if interactive_workers is None \
+            else interactive_workers
+        self.bulk_workers = max(workers - interactive_workers, 1)
+        self.max_wait = max_wait or CONFIG_SERVICES.get('scheduler_max_wait') or 1800
+        self.pending = {lane: [] for lane in LANES}
+        self.running = {lane: 0 for lane in LANES}
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self.pending.values())
+
+    def add(self, message, estimate):
+        """ Hold a job until it's run
+
+        Args:
+            message: SQS message of the job
+            estimate: JobEstimate of the job
+        """
+        self.pending[estimate.lane].append(ScheduledJob(message, estimate, time.time()))
+
+    def next(self):
+        """ Take the job to run next, if any can be
+
+        Returns:
+            ScheduledJob, or None if no job can be run. Each job returned has to be passed to done once it's finished
+        """
+        now = time.time()
+        starved = [job for jobs in self.pending.values() for job in jobs if now - job.added >= self.max_wait]
+        if starved:
+            job = min(starved, key=lambda job: job.added)
+        else:
+            job = None
+            for lane in LANES:
+                if not self.pending[lane] or (lane == BULK and self.running[BULK] >= self.bulk_workers):
+                    continue
+                job = min(self.pending[lane], key=lambda job: (job.estimate.cost, job.added))
+                break
+            if job is None:
+                return None
+        self.pending[job.estimate.lane].remove(job)
+        self.running[job.estimate.lane] += 1
+        return job
+
+    def done(self, job):
+        """ Record that a job taken from the scheduler has finished
+
+        Args:
+            job: ScheduledJob that finished
+        """
+        self.running[job.estimate.lane] -= 1
+
+    def drain(self):
+        """ Take all the jobs still waiting to run
+
+        Returns:
+            list of ScheduledJob
+        """
+        jobs = [job for lane in LANES for job in self.pending[lane]]
+        self.pending = {lane: [] for lane in LANES}
+        return jobs
+
+    def depth(self):
+        """ Jobs waiting and running in each lane
+
+        Returns:
+            dict of lane to its number of jobs waiting, their total estimated cost, the seconds the oldest has
+            waited and the number of jobs running
+        """
+        now = time.time()
+        return {lane: {
+            'waiting': len(self.pending[lane]),
+            'waiting_cost': sum(job.estimate.cost for job in self.pending[lane]),
+            'oldest_wait': round(max((now - job.added for job in self.pending[lane]), default=0), 1),
+            'running': self.running[lane]
+        } for lane in LANES}
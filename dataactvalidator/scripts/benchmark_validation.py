@@ -0,0 +1,130 @@
+import argparse
+import copy
+import csv
+import logging
+import os
+import random
+import time
+
+from dataactcore.logging import configure_logging
+from dataactcore.models.lookups import FIELD_TYPE_DICT, FIELD_TYPE_DICT_ID
+# Imported so every model FileColumn is related to is mapped
+import dataactcore.models.jobModels  # noqa
+import dataactcore.models.stagingModels  # noqa
+import dataactcore.models.userModel  # noqa
+from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.filestreaming.schemaLoader import SchemaLoader
+from dataactvalidator.validation_handlers.columnPlan import compile_plan
+from dataactvalidator.validation_handlers.columnValidator import ColumnValidator
+from dataactvalidator.validation_handlers.rowValidator import RowValidator
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+
+# A, B, C and FABS files
+FILE_TYPES = ['appropriations', 'program_activity', 'award_financial', 'detached_award']
+
+# Values that fail or exercise the cleaning of each type of field, mixed in with valid values
+BAD_VALUES = {
+    'INT': ['1.5', 'abc', '1,000', ' 12 ', '"7"'],
+    'LONG': ['1.5', 'abc', '1,000', ' 12 ', '"7"'],
+    'DECIMAL': ['abc', '1,000.25', '1e5', '"12.5"', '12,'],
+    'BOOLEAN': ['maybe', 'yes', 'f'],
+    'STRING': ['"quoted"', '  padded  ']
+}
+
+
+def load_schema(file_type):
+    """ Build the FileColumns for a file type from its schema file, without a database
+
+    Args:
+        file_type: name of the file type
+
+    Returns:
+        list of FileColumn objects
+    """
+    fields = []
+    with open(os.path.join(CONFIG_PATH, SchemaLoader.fieldFiles[file_type]), 'rU') as csvfile:
+        for record in csv.DictReader(csvfile):
+            record = FieldCleaner.clean_record(record)
+            fields.append(SchemaLoader.build_column(
+                FIELD_TYPE_DICT, FieldCleaner.clean_string(record['fieldname']),
+                FieldCleaner.clean_string(record['fieldname_short']), record['required'], record['data_type'],
+                record['padded_flag'], record['field_length']))
+    return fields
+
+
+def random_value(rand, field, error_rate):
+    """ Generate a value for a field, invalid error_rate of the time """
+    field_type = FIELD_TYPE_DICT_ID[field.field_types_id]
+    length = field.length or 10
+    if rand.random() < error_rate:
+        if rand.random() < 0.2:
+            return '9' * (length + 1)
+        return rand.choice(BAD_VALUES[field_type] + [''])
+    if not field.required and rand.random() < 0.3:
+        return ''
+    if field_type in ['INT', 'LONG']:
+        return str(rand.randint(0, 10 ** min(length, 9) - 1))
+    if field_type == 'DECIMAL':
+        return '{:.2f}'.format(rand.uniform(-100000, 100000))
+    if field_type == 'BOOLEAN':
+        return rand.choice(['true', 'false'])
+    return ''.join(rand.choice('0123456789ABCDEF') for _ in range(rand.randint(1, min(length, 12))))
+
+
+def generate_chunks(fields, rows, chunk_size, error_rate, seed):
+    """ Generate chunks of records like those ValidationManager reads from a file """
+    rand = random.Random(seed)
+    chunks = []
+    for start in range(2, rows + 2, chunk_size):
+        chunk = []
+        for row_number in range(start, min(start + chunk_size, rows + 2)):
+            record = {field.name_short: random_value(rand, field, error_rate) for field in fields}
+            record['row_number'] = row_number
+            chunk.append((row_number, record, []))
+        chunks.append(chunk)
+    return chunks
+
+
+def time_engine(validator, chunks):
+    """ Validate copies of the chunks, returning the results and the seconds spent validating """
+    chunks = copy.deepcopy(chunks)
+    start = time.time()
+    results = [validator.validate_chunk(chunk) for chunk in chunks]
+    return results, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the row and column schema validation engines')
+    parser.add_argument('-r', '--rows', help='Number of rows to generate per file type', type=int, default=20000)
+    parser.add_argument('-c', '--chunk_size', help='Number of rows validated at a time', type=int, default=1000)
+    parser.add_argument('-e', '--error_rate', help='Fraction of values that are invalid', type=float, default=0.02)
+    parser.add_argument('-t', '--file_types', help='File types to benchmark', nargs='+', choices=FILE_TYPES,
+                        default=FILE_TYPES)
+    args = parser.parse_args()
+
+    for file_type in args.file_types:
+        fields = load_schema(file_type)
+        plan = compile_plan(fields)
+        chunks = generate_chunks(fields, args.rows, args.chunk_size, args.error_rate, file_type)
+
+        row_results, row_time = time_engine(RowValidator(plan, file_type), chunks)
+        column_results, column_time = time_engine(ColumnValidator(plan, file_type), chunks)
+        if row_results != column_results:
+            raise AssertionError('Engines disagree on {} records'.format(file_type))
+
+        failures = sum(len(result[2]) for chunk_results in row_results for result in chunk_results)
+        logger.info({
+            'message': '{}: {} rows, {} failures, row engine {:.0f} rows/sec, column engine {:.0f} rows/sec '
+                       '({:.1f}x)'.format(file_type, args.rows, failures, args.rows / row_time,
+                                          args.rows / column_time, row_time / column_time),
+            'message_type': 'ValidatorInfo',
+            'file_type': file_type
+        })
+
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
@@ -6,6 +6,7 @@ import boto
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
 from dataactcore.models.domainModels import CGAC, SubTierAgency, FREC
 from dataactvalidator.health_check import create_app
@@ -60,6 +61,7 @@ def load_cgac(file_name):
         delete_missing_cgacs(models, data)
         update_cgacs(models, data)
         sess.add_all(models.values())
+        bump_reference_version(sess, CGAC)
         sess.commit()
 
         logger.info('%s CGAC records inserted', len(models))
@@ -120,6 +122,7 @@ def load_frec(file_name):
         delete_missing_frecs(models, data)
         update_frecs(models, data, cgac_dict)
         sess.add_all(models.values())
+        bump_reference_version(sess, FREC)
         sess.commit()
 
         logger.info('%s FREC records inserted', len(models))
@@ -185,6 +188,7 @@ def load_sub_tier_agencies(file_name):
         delete_missing_sub_tier_agencies(models, data)
         update_sub_tier_agencies(models, data, cgac_dict, frec_dict)
         sess.add_all(models.values())
+        bump_reference_version(sess, SubTierAgency)
         sess.commit()
 
         logger.info('%s Sub Tier Agency records inserted', len(models))
@@ -6,6 +6,7 @@ import boto
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
 from dataactcore.models.domainModels import ObjectClass, ProgramActivity, CountryCode, CFDAProgram
 from dataactvalidator.health_check import create_app
@@ -35,6 +36,7 @@ def load_object_class(filename):
         # insert to db
         table_name = model.__table__.name
         num = insert_dataframe(data, table_name, sess.connection())
+        bump_reference_version(sess, model)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
@@ -68,6 +70,7 @@ def load_program_activity(filename):
         # insert to db
         table_name = model.__table__.name
         num = insert_dataframe(data, table_name, sess.connection())
+        bump_reference_version(sess, model)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
@@ -94,6 +97,7 @@ def load_country_codes(filename):
         # insert to db
         table_name = model.__table__.name
         num = insert_dataframe(data, table_name, sess.connection())
+        bump_reference_version(sess, model)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
@@ -161,6 +165,7 @@ def load_cfda_program(filename):
         # insert to db
         table_name = model.__table__.name
         num = insert_dataframe(data, table_name, sess.connection())
+        bump_reference_version(sess, model)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
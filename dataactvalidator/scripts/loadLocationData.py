@@ -7,6 +7,7 @@ import urllib.request
 
 from dataactcore.logging import configure_logging
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.models.domainModels import CityCode, CountyCode, States, ZipCity
 
@@ -153,6 +154,7 @@ def load_city_data(city_file):
 
         # delete any data in the CityCode table
         sess.query(CityCode).delete()
+        bump_reference_version(sess, CityCode)
 
         # parse the new city code data
         parse_city_file(city_file, sess)
@@ -164,6 +166,7 @@ def load_county_data(county_file):
 
         # delete any data in the CityCode table
         sess.query(CountyCode).delete()
+        bump_reference_version(sess, CountyCode)
 
         # parse the new county code data
         parse_county_file(county_file, sess)
@@ -175,6 +178,7 @@ def load_state_data(state_file):
 
         # delete any data in the States table
         sess.query(States).delete()
+        bump_reference_version(sess, States)
 
         # parse the new state data
         parse_state_file(state_file, sess)
@@ -186,6 +190,7 @@ def load_zip_city_data(zip_city_file):
 
         # delete any data in the ZipCity table
         sess.query(ZipCity).delete()
+        bump_reference_version(sess, ZipCity)
 
         # parse the new zip city data
         parse_zip_city_file(zip_city_file, sess)
@@ -7,6 +7,7 @@ import boto
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
 from dataactcore.models.jobModels import Submission # noqa
 from dataactcore.models.userModel import User # noqa
@@ -69,6 +70,7 @@ def update_offices(csv_path):
     for _, row in new_data.iterrows():
         sess.add(FPDSContractingOffice(**row))
 
+    bump_reference_version(sess, FPDSContractingOffice)
     sess.commit()
     logger.info('%s records in CSV, %s existing', len(data.index), sum(data['existing_id'].notnull()))
 
@@ -7,8 +7,9 @@ import boto
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
-from dataactcore.models.domainModels import TASLookup
+from dataactcore.models.domainModels import TASLookup, tas_key
 from dataactvalidator.health_check import create_app
 from dataactvalidator.scripts.loaderUtils import clean_data
 
@@ -48,7 +49,10 @@ def clean_tas(csv_path):
          }
     )
     data["account_num"] = pd.to_numeric(data['account_num'])
-    return data.where(pd.notnull(data), None)
+    data = data.where(pd.notnull(data), None)
+    # set explicitly, as updates of existing TASes don't fill in defaults
+    data['tas_key'] = [tas_key(row) for row in data.to_dict('records')]
+    return data
 
 
 def update_tas_lookups(csv_path):
@@ -76,6 +80,7 @@ def update_tas_lookups(csv_path):
     for _, row in new_data.iterrows():
         sess.add(TASLookup(**row))
 
+    bump_reference_version(sess, TASLookup)
     sess.commit()
     logger.info('%s records in CSV, %s existing', len(data.index), sum(data['existing_id'].notnull()))
 
@@ -11,8 +11,9 @@ import pandas as pd
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.logging import configure_logging
-from dataactcore.models.domainModels import matching_cars_subquery, SF133
+from dataactcore.models.domainModels import update_matching_tas_ids, SF133
 from dataactvalidator.health_check import create_app
 from dataactvalidator.scripts.loaderUtils import clean_data, insert_dataframe
 
@@ -80,11 +81,10 @@ def update_tas_id(fiscal_year, fiscal_period):
                     (absolute_following_month % 12) + 1,    # 1-based
                     1)
 
-    subquery = matching_cars_subquery(sess, SF133, start_date, end_date)
     logger.info("Updating tas_ids for Fiscal %s-%s", fiscal_year, fiscal_period)
-    sess.query(SF133).\
-        filter_by(fiscal_year=fiscal_year, period=fiscal_period).\
-        update({SF133.tas_id: subquery}, synchronize_session=False)
+    update_matching_tas_ids(sess, SF133, start_date, end_date, SF133.fiscal_year == fiscal_year,
+                            SF133.period == fiscal_period)
+    bump_reference_version(sess, SF133)
     sess.commit()
 
 
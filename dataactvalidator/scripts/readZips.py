@@ -13,6 +13,7 @@ from sqlalchemy.exc import IntegrityError
 from dataactcore.logging import configure_logging
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.referenceCache import bump_reference_version
 from dataactcore.models.domainModels import Zips, StateCongressional
 
 from dataactvalidator.health_check import create_app
@@ -222,6 +223,7 @@ def read_zips():
 
         # delete old values in case something changed and one is now invalid
         sess.query(Zips).delete(synchronize_session=False)
+        bump_reference_version(sess, Zips)
         sess.commit()
 
         if CONFIG_BROKER["use_aws"]:
@@ -249,6 +251,10 @@ def read_zips():
 
         update_state_congr_table(sess)
 
+        # zip codes looked up while they were being loaded are looked up again
+        bump_reference_version(sess, Zips)
+        sess.commit()
+
         logger.info("Zipcode script complete")
 
 
@@ -0,0 +1,429 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from dataactcore.config import CONFIG_SERVICES
+from dataactvalidator.jobScheduler import INTERACTIVE, JobEstimate, JobScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class VisibilityHeartbeat:
+    """ Keeps SQS messages hidden from other consumers while their jobs run, by extending the messages' visibility
+        timeouts from a background thread. Used as a context manager, tracking each message while it's in flight.
+    """
+    def __init__(self, timeout=None):
+        """ Create the heartbeat
+
+        Args:
+            timeout: seconds the messages are hidden for by each extension, defaults to the sqs_visibility_timeout
+                setting. Tracked messages are extended each time half of the timeout has passed. Without a timeout
+                messages keep the queue's visibility timeout
+        """
+        self.timeout = timeout or CONFIG_SERVICES.get('sqs_visibility_timeout')
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        if self.timeout:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._beat, name='sqs-heartbeat', daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def track(self, message):
+        """ Keep extending a message's visibility until it's untracked """
+        with self.lock:
+            self.messages[id(message)] = message
+
+    def untrack(self, message):
+        """ Stop extending a message's visibility """
+        with self.lock:
+            self.messages.pop(id(message), None)
+
+    def _beat(self):
+        while not self.stopped.wait(self.timeout / 2):
+            with self.lock:
+                messages = list(self.messages.values())
+            for message in messages:
+                try:
+                    message.change_visibility(VisibilityTimeout=self.timeout)
+                except Exception as e:
+                    # the job carries on; at worst the message reappears and is processed again
+                    logger.warning({
+                        'message': 'Could not extend the visibility timeout of an SQS message',
+                        'message_type': 'ValidatorInfo',
+                        'message_body': message.body,
+                        'error': str(e)
+                    })
+
+
+class JobConsumer:
+    """ Receives validation jobs from SQS and runs them one at a time in this process. Messages are received with the
+        sqs_visibility_timeout, which is renewed while their jobs run. A message is deleted once its job is done, and
+        only made visible again straight away if its job should be retried.
+    """
+    # Most messages SQS hands out in one receive
+    MAX_MESSAGES = 10
+
+    def __init__(self, sqs_queue, run_job, wait_time=None, visibility_timeout=None):
+        """ Create the consumer
+
+        Args:
+            sqs_queue: queue to receive messages from
+            run_job: function validating the job ID of a message, returning whether the message should be deleted
+                rather than retried
+            wait_time: seconds each receive waits for messages to arrive, defaults to the sqs_wait_time setting
+            visibility_timeout: seconds messages are hidden for at a time, defaults to the sqs_visibility_timeout
+                setting
+        """
+        self.queue = sqs_queue
+        self.run_job = run_job
+        self.wait_time = CONFIG_SERVICES.get('sqs_wait_time', 10) if wait_time is None else wait_time
+        self.heartbeat = VisibilityHeartbeat(visibility_timeout)
+
+    def run(self, stop=None):
+        """ Receive and run jobs
+
+        Args:
+            stop: Event set when the consumer should stop receiving jobs, it runs until killed without one
+        """
+        logger.info("Starting SQS polling")
+        with self.heartbeat:
+            while stop is None or not stop.is_set():
+                for message in self.receive(1):
+                    delete = False
+                    try:
+                        delete = self.run_job(message.body)
+                    except Exception:
+                        logger.exception("Could not run job %s", message.body)
+                    finally:
+                        self.finish(message, delete)
+
+    def receive(self, capacity):
+        """ Receive as many messages as there are jobs that can be started, up to the most SQS allows
+
+        Args:
+            capacity: number of jobs that can be started
+
+        Returns:
+            list of messages received, tracked by the heartbeat until they're finished
+        """
+        options = {'MaxNumberOfMessages': min(capacity, self.MAX_MESSAGES), 'WaitTimeSeconds': self.wait_time}
+        if self.heartbeat.timeout:
+            options['VisibilityTimeout'] = self.heartbeat.timeout
+        try:
+            messages = self.queue.receive_messages(**options)
+        except Exception:
+            logger.exception("Could not receive SQS messages")
+            time.sleep(self.wait_time)
+            return []
+        for message in messages:
+            logger.info("Message received: %s", message.body)
+            self.heartbeat.track(message)
+        return messages
+
+    def finish(self, message, delete):
+        """ Delete a message whose job is done, or make it visible again so the job is retried straight away
+
+        Args:
+            message: message to finish
+            delete: whether to delete the message rather than retry its job
+        """
+        self.heartbeat.untrack(message)
+        try:
+            if delete:
+                message.delete()
+            else:
+                message.change_visibility(VisibilityTimeout=0)
+        except Exception:
+            # the message reappears once its visibility timeout runs out
+            logger.exception("Could not finish SQS message %s", message.body)
+
+
+class WorkerStats:
+    """ Jobs run by a worker process and the time spent running them, shared between the worker and the supervisor """
+    JOBS, BUSY_SECONDS, JOB_STARTED = range(3)
+
+    def __init__(self):
+        self.values = multiprocessing.Array('d', 3)
+
+    def start_job(self):
+        """ Mark the worker as busy """
+        with self.values.get_lock():
+            self.values[self.JOB_STARTED] = time.time()
+
+    def finish_job(self):
+        """ Mark the worker as idle again, counting the job it ran """
+        with self.values.get_lock():
+            started = self.values[self.JOB_STARTED]
+            if started:
+                self.values[self.JOBS] += 1
+                self.values[self.BUSY_SECONDS] += time.time() - started
+                self.values[self.JOB_STARTED] = 0
+
+    def snapshot(self):
+        """ Jobs run so far and seconds spent running them, including the time spent on the current job
+
+        Returns:
+            tuple of the number of jobs run and the busy seconds
+        """
+        with self.values.get_lock():
+            jobs, busy, started = self.values[:]
+        if started:
+            busy += time.time() - started
+        return int(jobs), busy
+
+
+class ValidatorSupervisor(JobConsumer):
+    """ Receives validation jobs from SQS for a pool of worker processes, each running one job at a time. Messages are
+        received while workers are idle, up to job_buffer_size waiting at once, and a JobScheduler decides which of
+        the waiting jobs each worker runs next. Workers that exit are replaced, and the share of its time each worker
+        spent running jobs is logged periodically along with the jobs waiting in each lane.
+    """
+    # Seconds between checks that the workers are still running, while no jobs can be started
+    CHECK_INTERVAL = 5
+    # Seconds workers are given to finish their current job when the supervisor stops, before they're killed
+    SHUTDOWN_TIMEOUT = 60
+
+    def __init__(self, sqs_queue, run_job, worker_context, workers=None, report_interval=None, estimate_job=None,
+                 buffer_size=None, **kwargs):
+        """ Create the supervisor
+
+        Args:
+            sqs_queue: queue to receive messages from
+            run_job: function validating the job ID of a message in a worker, returning whether the message should be
+                deleted rather than retried
+            worker_context: function returning the context manager each worker runs its jobs in
+            workers: number of worker processes, defaults to the validator_workers setting
+            report_interval: seconds between utilization reports, defaults to the worker_report_interval setting
+            estimate_job: function returning the JobEstimate of a job ID. Without it jobs are run in the order
+                they're received
+            buffer_size: most jobs received and waiting for a worker at once, defaults to the job_buffer_size setting
+                or the number of workers
+            kwargs: other JobConsumer options
+        """
+        super().__init__(sqs_queue, run_job, **kwargs)
+        self.worker_context = worker_context
+        self.workers = workers or CONFIG_SERVICES.get('validator_workers') or 1
+        self.report_interval = report_interval or CONFIG_SERVICES.get('worker_report_interval') or 300
+        self.estimate_job = estimate_job
+        self.buffer_size = buffer_size or CONFIG_SERVICES.get('job_buffer_size') or self.workers
+        self.scheduler = JobScheduler(self.workers)
+        self.stop = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.stats = [WorkerStats() for _ in range(self.workers)]
+        self.processes = [None] * self.workers
+        self.tasks = [None] * self.workers
+        # ScheduledJob each worker is running
+        self.assignments = [None] * self.workers
+        self.last_report = None
+
+    def run(self, stop=None):
+        """ Start the workers and hand them jobs until the supervisor is interrupted or terminated
+
+        Args:
+            stop: Event set when the supervisor should stop, it runs until interrupted or terminated without one
+        """
+        if stop is None:
+            signal.signal(signal.SIGTERM, _exit)
+        logger.info({
+            'message': 'Starting {} validator workers'.format(self.workers),
+            'message_type': 'ValidatorInfo',
+            'workers': self.workers
+        })
+        self.last_report = (time.time(), [stats.snapshot() for stats in self.stats])
+        with self.heartbeat:
+            try:
+                while stop is None or not stop.is_set():
+                    self.check_workers()
+                    # receiving waits for messages to arrive, otherwise wait for a worker to finish its job
+                    room = self.buffer_size - len(self.scheduler)
+                    polled = room > 0 and None in self.assignments
+                    if polled:
+                        for message in self.receive(room):
+                            self.scheduler.add(message, self.estimate(message))
+                    dispatched = self.dispatch()
+                    self.collect_results(0 if polled or dispatched else self.CHECK_INTERVAL)
+                    if time.time() - self.last_report[0] >= self.report_interval:
+                        self.report()
+            except (KeyboardInterrupt, SystemExit):
+                logger.info({'message': 'Stopping validator workers', 'message_type': 'ValidatorInfo'})
+            finally:
+                self.shutdown()
+
+    def estimate(self, message):
+        """ JobEstimate of a message's job. Jobs that can't be estimated are run as soon as a worker is free """
+        if self.estimate_job is not None:
+            try:
+                return self.estimate_job(message.body)
+            except Exception:
+                logger.exception("Could not estimate job %s", message.body)
+        return JobEstimate(message.body, INTERACTIVE, 0, None, None)
+
+    def dispatch(self):
+        """ Hand the jobs the scheduler picks to idle workers
+
+        Returns:
+            number of jobs handed out
+        """
+        dispatched = 0
+        for index, assignment in enumerate(self.assignments):
+            if assignment is not None:
+                continue
+            job = self.scheduler.next()
+            if job is None:
+                break
+            logger.info({
+                'message': 'Starting job {} on worker {}'.format(job.estimate.job_id, index),
+                'message_type': 'ValidatorInfo',
+                'job_id': job.estimate.job_id,
+                'worker': index,
+                'lane': job.estimate.lane,
+                'estimated_cost': job.estimate.cost,
+                'wait_seconds': round(time.time() - job.added, 1)
+            })
+            self.assignments[index] = job
+            self.tasks[index].put(job.message.body)
+            dispatched += 1
+        return dispatched
+
+    def collect_results(self, timeout=0):
+        """ Finish the messages of the jobs workers are done with
+
+        Args:
+            timeout: seconds to wait for a job to be done if none are yet
+        """
+        while True:
+            try:
+                index, delete = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+            except queue.Empty:
+                return
+            timeout = 0
+            self.finish_assignment(index, delete)
+
+    def finish_assignment(self, index, delete):
+        """ Finish the message of the job a worker was running, if it was running one """
+        job, self.assignments[index] = self.assignments[index], None
+        if job is not None:
+            self.scheduler.done(job)
+            self.finish(job.message, delete)
+
+    def check_workers(self):
+        """ Start any worker that isn't running, releasing the message of the job it was running """
+        for index, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.error({
+                    'message': 'Validator worker {} exited, restarting it'.format(index),
+                    'message_type': 'ValidatorInfo',
+                    'worker': index,
+                    'pid': process.pid,
+                    'exit_code': process.exitcode
+                })
+                # a worker that died mid-job is idle now, and its job is retried
+                self.collect_results()
+                self.stats[index].finish_job()
+                self.finish_assignment(index, False)
+            self.tasks[index] = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_run_worker, name='validator-worker-{}'.format(index),
+                                              args=(self.worker_context, self.run_job, index, self.tasks[index],
+                                                    self.results, self.stop, self.stats[index]))
+            process.start()
+            self.processes[index] = process
+
+    def report(self):
+        """ Log the jobs each worker ran since the last report, the share of the time it spent running them and the
+            jobs waiting in each lane
+        """
+        now = time.time()
+        last_time, last_snapshots = self.last_report
+        snapshots = [stats.snapshot() for stats in self.stats]
+        elapsed = max(now - last_time, 1e-6)
+        workers = []
+        for index, ((jobs, busy), (last_jobs, last_busy)) in enumerate(zip(snapshots, last_snapshots)):
+            process = self.processes[index]
+            workers.append({
+                'worker': index,
+                'pid': process.pid if process else None,
+                'jobs': jobs - last_jobs,
+                'total_jobs': jobs,
+                'utilization': round((busy - last_busy) / elapsed, 3)
+            })
+        logger.info({
+            'message': 'Validator worker utilization',
+            'message_type': 'ValidatorInfo',
+            'interval_seconds': round(elapsed, 1),
+            'jobs_in_flight': sum(job is not None for job in self.assignments),
+            'utilization': round(sum(worker['utilization'] for worker in workers) / len(workers), 3),
+            'worker_utilization': workers,
+            'lanes': self.scheduler.depth()
+        })
+        self.last_report = (now, snapshots)
+        return workers
+
+    def shutdown(self):
+        """ Ask the workers to stop once their current job is done, killing any still running after the timeout.
+            The messages of jobs that didn't finish, or hadn't started, are released to be retried
+        """
+        self.stop.set()
+        deadline = time.time() + self.SHUTDOWN_TIMEOUT
+        for process in self.processes:
+            if process is not None:
+                process.join(max(deadline - time.time(), 0))
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        self.collect_results()
+        for index in range(self.workers):
+            self.finish_assignment(index, False)
+        for job in self.scheduler.drain():
+            self.finish(job.message, False)
+
+
+def _run_worker(worker_context, run_job, index, tasks, results, stop, stats):
+    """ Entry point of a worker process, running the jobs it's handed until it's asked to stop. The supervisor handles
+        interrupts and stops workers through the stop event, so workers ignore interrupts and are killed outright when
+        terminated
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logger.info({
+        'message': 'Validator worker started',
+        'message_type': 'ValidatorInfo',
+        'worker': index,
+        'pid': os.getpid()
+    })
+    with worker_context():
+        while not stop.is_set():
+            try:
+                job_id = tasks.get(timeout=1)
+            except queue.Empty:
+                continue
+            stats.start_job()
+            delete = False
+            try:
+                delete = run_job(job_id)
+            except Exception:
+                logger.exception("Could not run job %s", job_id)
+            finally:
+                stats.finish_job()
+                results.put((index, delete))
+
+
+def _exit(signum, frame):
+    """ Stop the supervisor on SIGTERM the same way as on an interrupt """
+    raise SystemExit(0)
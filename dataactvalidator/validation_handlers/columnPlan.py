@@ -0,0 +1,108 @@
+import copy
+
+from sqlalchemy import func
+
+from dataactcore.models.lookups import FIELD_TYPE_DICT_ID
+from dataactcore.models.validationModels import FileColumn
+from dataactvalidator.validation_handlers.validationError import ValidationError
+from dataactvalidator.validation_handlers.validator import Failure, TYPE_CHECKS, Validator
+
+
+class ColumnPlan:
+    """ Everything needed to clean and validate one column of a file, resolved once from its FileColumn so rows can be
+        processed without looking anything up per cell
+    """
+    __slots__ = ['index', 'name', 'name_short', 'field_type', 'check_type', 'required', 'required_failure', 'length',
+                 'pad_length', 'numeric']
+
+    def __init__(self, index, field):
+        """ Compile the plan for a column
+
+        Args:
+            index: position of the column, in the schema until the plan is bound to a file's columns
+            field: FileColumn object for the column
+        """
+        self.index = index
+        self.name = field.name
+        self.name_short = field.name_short
+        self.field_type = FIELD_TYPE_DICT_ID.get(field.field_types_id)
+        # None when any value is of the right type
+        self.check_type = TYPE_CHECKS.get(self.field_type)
+        self.required = bool(field.required)
+        self.required_failure = Failure(self.name_short, ValidationError.requiredError, "", "", "fatal")
+        self.length = field.length
+        self.pad_length = field.length if field.padded_flag and field.length is not None else None
+        self.numeric = self.field_type in ["INT", "DECIMAL", "LONG"]
+
+    def at_index(self, index):
+        """ Copy of this plan for the column at the given position """
+        column = copy.copy(self)
+        column.index = index
+        return column
+
+
+def compile_plan(fields):
+    """ Compile the column plans for a file type's schema
+
+    Args:
+        fields: list of FileColumn objects for the file type
+
+    Returns:
+        tuple of ColumnPlan objects in schema order
+    """
+    return tuple(ColumnPlan(index, field) for index, field in enumerate(fields))
+
+
+def bind_plan(plan, keys):
+    """ Arrange a plan to match the columns of the records read from a file, so a record's values can be zipped with
+        the plan rather than looked up by name
+
+    Args:
+        plan: tuple of ColumnPlan objects for the file type
+        keys: keys of the records, in order
+
+    Returns:
+        tuple with the ColumnPlan for each key, at that key's position, and None for the keys that aren't validated
+
+    Raises:
+        KeyError: if a column of the schema is missing from the records, or the records have a column that isn't in
+            the schema
+    """
+    by_name = {column.name_short: column for column in plan}
+    missing = [name for name in by_name if name not in keys]
+    if missing:
+        raise KeyError(missing[0])
+    return tuple(None if key in Validator.META_FIELDS else by_name[key].at_index(index)
+                 for index, key in enumerate(keys))
+
+
+# File type ID to (fingerprint of the schema, FileColumn objects, column plan), kept for the life of the process
+_plan_cache = {}
+
+
+def get_column_plan(sess, file_type_id):
+    """ Get the schema and column plan for a file type. Plans are cached across jobs and compiled again when the
+        schema is reloaded, which replaces every FileColumn of the file type with new rows
+
+    Args:
+        sess: current DB session
+        file_type_id: ID of the file type
+
+    Returns:
+        pair of the list of FileColumn objects for the file type, detached from the session, and its column plan
+    """
+    fingerprint = tuple(sess.query(func.count(FileColumn.file_column_id), func.max(FileColumn.file_column_id)).
+                        filter(FileColumn.file_id == file_type_id).one())
+    cached = _plan_cache.get(file_type_id)
+    if cached is None or cached[0] != fingerprint:
+        fields = sess.query(FileColumn).filter(FileColumn.file_id == file_type_id).\
+            order_by(FileColumn.file_column_id).all()
+        for field in fields:
+            sess.expunge(field)
+        cached = _plan_cache[file_type_id] = (fingerprint, fields, compile_plan(fields))
+    return cached[1], cached[2]
+
+
+def clear_column_plans():
+    """ Drop the cached column plans, so they're compiled from the schema the next time they're used """
+    _plan_cache.clear()
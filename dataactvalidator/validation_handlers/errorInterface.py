@@ -1,3 +1,6 @@
+from datetime import datetime
+from functools import lru_cache
+
 from dataactcore.models.errorModels import ErrorMetadata
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
@@ -9,9 +12,14 @@ from dataactcore.models.lookups import ERROR_TYPE_DICT
 class ErrorInterface:
     """Manages communication with error database."""
 
+    # Number of error_metadata rows written per insert statement
+    INSERT_BATCH_SIZE = 1000
+
     def __init__(self):
-        """ Create empty row error dict """
-        self.rowErrors = {}
+        """ Create empty row error counts """
+        # (job ID, field name, error type) to number of errors, and to the details of the first error
+        self.error_counts = {}
+        self.error_details = {}
 
     def record_row_error(self, job_id, filename, field_name, error_type, row, original_label=None, file_type_id=None,
                          target_file_id=None, severity_id=None):
@@ -29,15 +37,41 @@ class ErrorInterface:
             target_file_id: Id of target file type
             severity_id: Id of error severity
         """
-        key = "".join([str(job_id), field_name, str(error_type)])
-        if key in self.rowErrors:
-            self.rowErrors[key]["numErrors"] += 1
+        key = (job_id, field_name, str(error_type))
+        count = self.error_counts.get(key)
+        if count is None:
+            self.error_counts[key] = 1
+            self.error_details[key] = (filename, error_type, row, original_label, file_type_id, target_file_id,
+                                       severity_id)
         else:
-            error_dict = {"filename": filename, "fieldName": field_name, "jobId": job_id, "errorType": error_type,
-                          "numErrors": 1,
-                          "firstRow": row, "originalRuleLabel": original_label, "fileTypeId": file_type_id,
-                          "targetFileId": target_file_id, "severity": severity_id}
-            self.rowErrors[key] = error_dict
+            self.error_counts[key] = count + 1
+
+    def merge(self, other):
+        """ Add the errors recorded by another ErrorInterface, such as one a worker recorded, to these. Errors already
+            recorded here keep their details, so merging in the order the errors were found gives the same result as
+            recording them all here
+
+        Args:
+            other: ErrorInterface to add the errors of
+        """
+        for key, count in other.error_counts.items():
+            if key in self.error_counts:
+                self.error_counts[key] += count
+            else:
+                self.error_counts[key] = count
+                self.error_details[key] = other.error_details[key]
+
+    @property
+    def rowErrors(self):
+        """ Recorded errors as dicts, keyed by (job ID, field name, error type) """
+        row_errors = {}
+        for key, count in self.error_counts.items():
+            filename, error_type, row, original_label, file_type_id, target_file_id, severity_id = \
+                self.error_details[key]
+            row_errors[key] = {"filename": filename, "fieldName": key[1], "jobId": key[0], "errorType": error_type,
+                               "numErrors": count, "firstRow": row, "originalRuleLabel": original_label,
+                               "fileTypeId": file_type_id, "targetFileId": target_file_id, "severity": severity_id}
+        return row_errors
 
     def write_all_row_errors(self, job_id):
         """ Writes all recorded errors to database
@@ -46,48 +80,51 @@ class ErrorInterface:
             job_id: ID to write errors for
         """
         sess = GlobalDB.db().session
-        for key in self.rowErrors.keys():
-            error_dict = self.rowErrors[key]
-            # Set info for this error
-            this_job = error_dict["jobId"]
+        now = datetime.utcnow()
+        rows = []
+        for key, count in self.error_counts.items():
+            this_job, field_name, _ = key
             if int(job_id) != int(this_job):
                 # This row is for a different job, skip it
                 continue
-            field_name = error_dict["fieldName"]
-            try:
-                # If last part of key is an int, it's one of our prestored messages
-                error_type = int(error_dict["errorType"])
-            except ValueError:
-                # For rule failures, it will hold the error message
-                error_msg = error_dict["errorType"]
-                if "Field must be no longer than specified limit" in error_msg:
-                    rule_failed_id = ERROR_TYPE_DICT['length_error']
-                else:
-                    rule_failed_id = ERROR_TYPE_DICT['rule_failed']
-                error_row = ErrorMetadata(job_id=this_job, filename=error_dict["filename"], field_name=field_name,
-                                          error_type_id=rule_failed_id, rule_failed=error_msg,
-                                          occurrences=error_dict["numErrors"], first_row=error_dict["firstRow"],
-                                          original_rule_label=error_dict["originalRuleLabel"],
-                                          file_type_id=error_dict["fileTypeId"],
-                                          target_file_type_id=error_dict["targetFileId"],
-                                          severity_id=error_dict["severity"])
-            else:
-                # This happens if cast to int was successful
-                error_string = ValidationError.get_error_type_string(error_type)
-                error_id = ERROR_TYPE_DICT[error_string]
-                # Create error metadata
-                error_row = ErrorMetadata(job_id=this_job, filename=error_dict["filename"], field_name=field_name,
-                                          error_type_id=error_id, occurrences=error_dict["numErrors"],
-                                          first_row=error_dict["firstRow"],
-                                          rule_failed=ValidationError.get_error_message(error_type),
-                                          original_rule_label=error_dict["originalRuleLabel"],
-                                          file_type_id=error_dict["fileTypeId"],
-                                          target_file_type_id=error_dict["targetFileId"],
-                                          severity_id=error_dict["severity"])
-
-            sess.add(error_row)
-
-        # Commit the session to write all rows
+            filename, error_type, row, original_label, file_type_id, target_file_id, severity_id = \
+                self.error_details[key]
+            error_type_id, rule_failed = error_metadata_type(error_type)
+            rows.append({
+                'job_id': this_job, 'filename': filename, 'field_name': field_name, 'error_type_id': error_type_id,
+                'rule_failed': rule_failed, 'occurrences': count, 'first_row': row,
+                'original_rule_label': original_label, 'file_type_id': file_type_id,
+                'target_file_type_id': target_file_id, 'severity_id': severity_id, 'created_at': now,
+                'updated_at': now
+            })
+
+        # Write the rows a batch at a time in multi-row inserts, then commit them together
+        for start in range(0, len(rows), self.INSERT_BATCH_SIZE):
+            sess.execute(ErrorMetadata.__table__.insert().values(rows[start:start + self.INSERT_BATCH_SIZE]))
         sess.commit()
-        # Clear the dictionary
-        self.rowErrors = {}
+        # Clear the counts
+        self.error_counts = {}
+        self.error_details = {}
+
+
+@lru_cache(maxsize=None)
+def error_metadata_type(error_type):
+    """ Get the error type ID and message stored for an error, looked up once per process
+
+    Args:
+        error_type: type of error, either one of our prestored ValidationError types or a rule failure message
+
+    Returns:
+        tuple of the error_type_id and the rule_failed message
+    """
+    try:
+        # If it's an int, it's one of our prestored messages
+        error_type = int(error_type)
+    except ValueError:
+        # For rule failures, it will hold the error message
+        if "Field must be no longer than specified limit" in error_type:
+            return ERROR_TYPE_DICT['length_error'], error_type
+        return ERROR_TYPE_DICT['rule_failed'], error_type
+    # This happens if cast to int was successful
+    return (ERROR_TYPE_DICT[ValidationError.get_error_type_string(error_type)],
+            ValidationError.get_error_message(error_type))
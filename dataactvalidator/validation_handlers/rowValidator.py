@@ -0,0 +1,141 @@
+import multiprocessing
+from collections import deque
+
+from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.validation_handlers.columnPlan import bind_plan
+from dataactvalidator.validation_handlers.validator import Validator
+
+
+class RowValidator:
+    """ Cleans rows read from a submitted file and runs the schema validations (required fields, type and length) on
+        them. Only holds data that can be pickled so it can be handed to worker processes.
+    """
+
+    def __init__(self, plan, file_type):
+        """ Create the row validator
+
+        Args:
+            plan: tuple of ColumnPlan objects for the file type, see columnPlan.compile_plan
+            file_type: name of the file type being validated
+        """
+        self.plan = plan
+        self.file_type = file_type
+        self.csv_schema = {column.name_short: column for column in plan}
+        # The plan arranged to match the columns of each layout of record seen, keyed by the record's keys
+        self.bound_plans = {}
+
+    def bind_plan(self, record):
+        """ Get the plan arranged to match the columns of a record """
+        keys = tuple(record)
+        plan = self.bound_plans.get(keys)
+        if plan is None:
+            plan = self.bound_plans[keys] = bind_plan(self.plan, keys)
+        return plan
+
+    def validate_record(self, record):
+        """ Clean and validate a single record
+
+        Args:
+            record: dict of the record as read from the file
+
+        Returns:
+            Tuple with four elements:
+            1. Dict of record after preprocessing
+            2. Boolean indicating whether the record passed validation
+            3. List of Failure tuples
+            4. Boolean indicating whether the record should be written to staging
+        """
+        plan = self.bind_plan(record)
+        record = FieldCleaner.clean_planned_row(record, plan)
+
+        # D files are obtained from upstream systems (ASP and FPDS) that perform their own basic
+        # validations, so these validations are not repeated here
+        if self.file_type in ["award", "award_procurement"]:
+            # Skip basic validations for D files, set as valid to trigger write to staging
+            return record, True, [], True
+
+        if self.file_type in ["detached_award"]:
+            record['afa_generated_unique'] = (record['award_modification_amendme'] or '-none-') + "_" + \
+                                             (record['awarding_sub_tier_agency_c'] or '-none-') + "_" + \
+                                             (record['fain'] or '-none-') + "_" + (record['uri'] or '-none-')
+        passed_validations, failures, valid = Validator.validate_planned(record, plan,
+                                                                         self.file_type in ["detached_award"])
+        return record, passed_validations, failures, valid
+
+    def validate_chunk(self, chunk):
+        """ Clean and validate a chunk of rows
+
+        Args:
+            chunk: list of (row number, record, flex fields) tuples, record is None for rows that couldn't be read
+
+        Returns:
+            list of the results of validate_record for each row in the chunk, None for rows that couldn't be read
+        """
+        return [self.validate_record(record) if record is not None else None for _, record, _ in chunk]
+
+
+class ValidationPool:
+    """ Runs a RowValidator over chunks of rows, either in this process or spread across a pool of worker processes.
+        Results are always returned in the order the chunks were read, so the output doesn't depend on the number of
+        processes.
+    """
+    # Number of chunks queued per worker process, bounding how far reading runs ahead of writing
+    CHUNKS_PER_PROCESS = 2
+
+    def __init__(self, row_validator, processes=1):
+        """ Create the pool. Worker processes are forked here, so this should be done before any other threads are
+            started for the job
+
+        Args:
+            row_validator: RowValidator to run over the rows
+            processes: number of worker processes to validate with, 1 validates in this process
+        """
+        self.row_validator = row_validator
+        self.processes = processes
+        self.pool = None
+        if processes > 1:
+            self.pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(row_validator,))
+
+    def validate(self, chunks):
+        """ Validate chunks of rows
+
+        Args:
+            chunks: iterable of lists of (row number, record, flex fields) tuples
+
+        Yields:
+            pairs of (chunk, list of results from RowValidator.validate_chunk), in the order the chunks were read
+        """
+        if self.pool is None:
+            for chunk in chunks:
+                yield chunk, self.row_validator.validate_chunk(chunk)
+            return
+
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, self.pool.apply_async(_validate_chunk, (chunk,))))
+            if len(in_flight) >= self.processes * self.CHUNKS_PER_PROCESS:
+                chunk, result = in_flight.popleft()
+                yield chunk, result.get()
+        while in_flight:
+            chunk, result = in_flight.popleft()
+            yield chunk, result.get()
+
+    def close(self):
+        """ Stop the worker processes """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+# RowValidator used by a worker process, set once when the worker starts rather than sent with every chunk
+_worker_validator = None
+
+
+def _init_worker(row_validator):
+    global _worker_validator
+    _worker_validator = row_validator
+
+
+def _validate_chunk(chunk):
+    return _worker_validator.validate_chunk(chunk)
@@ -0,0 +1,111 @@
+from collections import namedtuple
+import hashlib
+import re
+from string import Formatter
+
+from sqlalchemy import text
+
+CompiledRule = namedtuple('CompiledRule', ['name', 'setup', 'statement'])
+
+# Only the submission ID is substituted into rule SQL
+SUBMISSION_FIELDS = ('', '0')
+
+# Rule queries are wrapped so their failures come back in row order. The query ends on its own line in case its last
+# line is a comment
+ORDERED_FAILURES = 'SELECT * FROM (\n{}\n) AS failures ORDER BY row_number NULLS LAST'
+
+# Quoted text, comments and statement separators, so statements are only split on semicolons outside of the others
+SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|--[^\n]*|/\*.*?\*/|(\$[A-Za-z_]*\$).*?\1|;", re.DOTALL)
+
+
+def compile_rule_sql(rule_sql, submission_id=None):
+    """ Rewrite the str.format template of a rule into a statement taking the submission ID as its only parameter
+
+    Args:
+        rule_sql: SQL of the rule, with {0} where the submission ID goes
+        submission_id: when given, the submission ID is written into the statement instead, for running the rule
+            without preparing it
+
+    Returns:
+        CompiledRule with the name the statement is prepared under, the statements the rule runs before its query
+        (such as creating functions it uses) and the query, with $1 in place of the submission ID. The query returns
+        the failures ordered by row number
+
+    Raises:
+        ValueError: if the template has a placeholder other than the submission ID
+    """
+    statement = []
+    for literal, field, _, _ in Formatter().parse(rule_sql):
+        statement.append(literal)
+        if field is None:
+            continue
+        if field not in SUBMISSION_FIELDS:
+            raise ValueError('Unknown placeholder in rule SQL: {{{}}}'.format(field))
+        # Identifiers can't be parameters. The ones suffixed with the submission ID only name CTEs and aliases
+        # within the query, so they can just drop the suffix
+        if not literal or not (literal[-1].isalnum() or literal[-1] == '_'):
+            statement.append('$1' if submission_id is None else str(int(submission_id)))
+    statement = ''.join(statement)
+    statements = split_statements(statement)
+    if not statements:
+        raise ValueError('Rule SQL has no statements')
+    return CompiledRule('rule_' + hashlib.md5(statement.encode('utf-8')).hexdigest(), tuple(statements[:-1]),
+                        ORDERED_FAILURES.format(statements[-1]))
+
+
+def split_statements(sql):
+    """ Split SQL into its statements, leaving out empty ones and the trailing semicolons
+
+    Args:
+        sql: SQL to split
+
+    Returns:
+        list of statements
+    """
+    statements = []
+    start = 0
+    has_code = False
+    position = 0
+    for token in SQL_TOKEN.finditer(sql):
+        # Anything between the tokens is code, as is quoted text
+        has_code = has_code or bool(sql[position:token.start()].strip()) or token.group().startswith(("'", '"', '$'))
+        position = token.end()
+        if token.group() == ';':
+            if has_code:
+                statements.append(sql[start:token.start()].strip())
+            start = token.end()
+            has_code = False
+    if has_code or sql[position:].strip():
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def prepare_rule(connection, compiled_rule):
+    """ Prepare a compiled rule on a connection, unless it already has been. Prepared statements last as long as the
+        database connection does, so the pool's connections keep theirs from one submission to the next. The rule's
+        setup statements have to have been run first
+
+    Args:
+        connection: SQLAlchemy connection to prepare the rule on
+        compiled_rule: CompiledRule to prepare
+    """
+    prepared = connection.info.setdefault('prepared_rules', set())
+    if compiled_rule.name not in prepared:
+        connection.execute('PREPARE {} (integer) AS {}'.format(compiled_rule.name, compiled_rule.statement))
+        prepared.add(compiled_rule.name)
+
+
+def execute_statement(compiled_rule, explain=False):
+    """ Statement running a prepared rule for the submission bound to :submission_id
+
+    Args:
+        compiled_rule: CompiledRule to run
+        explain: when True, the statement returns the EXPLAIN (ANALYZE, BUFFERS) output of the rule instead
+
+    Returns:
+        SQLAlchemy text clause
+    """
+    statement = 'EXECUTE {}(:submission_id)'.format(compiled_rule.name)
+    if explain:
+        statement = 'EXPLAIN (ANALYZE, BUFFERS) ' + statement
+    return text(statement)
@@ -0,0 +1,211 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from dataactcore.config import CONFIG_SERVICES
+from dataactcore.interfaces.db import GlobalDB
+from dataactvalidator.validation_handlers.ruleCompiler import compile_rule_sql, execute_statement, prepare_rule
+
+logger = logging.getLogger(__name__)
+
+RuleResult = namedtuple('RuleResult', ['rule', 'columns', 'batches', 'duration', 'plan'])
+
+
+class SqlRuleExecutor:
+    """ Runs the SQL of validation rules, spread across a bounded pool of database connections. The rules only read
+        the staging tables so they don't depend on each other; their failures are still handed back in rule order, so
+        reports come out the same however many rules run at once.
+    """
+    # Number of rules run ahead of the one being processed, per connection
+    RULES_PER_CONNECTION = 2
+
+    def __init__(self, connections=None, prepare=None, explain=None, fetch_size=None):
+        """ Create the executor
+
+        Args:
+            connections: number of rules to run at once, defaults to the sql_rule_connections setting. With 1 the
+                rules are run one at a time on the connection passed to run
+            prepare: whether to run the rules as prepared statements, defaults to the prepare_sql_rules setting
+            explain: whether to log the EXPLAIN (ANALYZE, BUFFERS) output of each rule, defaults to the
+                explain_sql_rules setting
+            fetch_size: number of failures read from the database at a time, defaults to the sql_rule_fetch_size
+                setting
+        """
+        self.connections = connections or CONFIG_SERVICES.get('sql_rule_connections') or 1
+        self.prepare = CONFIG_SERVICES.get('prepare_sql_rules', False) if prepare is None else prepare
+        self.explain = CONFIG_SERVICES.get('explain_sql_rules', False) if explain is None else explain
+        self.fetch_size = fetch_size or CONFIG_SERVICES.get('sql_rule_fetch_size') or 10000
+        # (rule name, seconds until the rule's first failures came back) for each rule run, in rule order
+        self.timings = []
+
+    def run(self, rules, submission_id, connection):
+        """ Run the rules against a submission
+
+        Args:
+            rules: RuleSql objects to run, in the order their failures should be reported
+            submission_id: ID of the submission to check
+            connection: connection to run the rules on when they're run one at a time. Rules run at once use their
+                own connections, so they only see committed data
+
+        Yields:
+            RuleResult for each rule, in rule order. Its batches are lists of the rule's failed rows, ordered by row
+            number, read from the database as they're iterated. Failures not read before the next rule is asked for
+            are dropped
+        """
+        rules = list(rules)
+        if self.connections <= 1 or len(rules) <= 1:
+            for rule in rules:
+                yield from self._deliver(self._run_rule(connection, rule, self._compile(rule, submission_id),
+                                                        submission_id))
+            return
+
+        # worker threads don't have the app context GlobalDB relies on, so they take connections from the engine and
+        # are handed the SQL to run rather than reading it from the rule's session
+        engine = GlobalDB.db().engine
+        window = self.connections * self.RULES_PER_CONNECTION
+        in_flight = deque()
+        with ThreadPoolExecutor(self.connections) as pool:
+            try:
+                for rule in rules:
+                    in_flight.append(pool.submit(self._run_rule_on_engine, engine, rule,
+                                                 self._compile(rule, submission_id), submission_id))
+                    if len(in_flight) >= window:
+                        yield from self._deliver(in_flight.popleft().result())
+                while in_flight:
+                    yield from self._deliver(in_flight.popleft().result())
+            finally:
+                # don't start any more rules if processing stopped early, and release the ones already run
+                for future in in_flight:
+                    if not future.cancel():
+                        future.add_done_callback(_discard)
+
+    def _compile(self, rule, submission_id):
+        """ The rule's SQL for the submission, or the rule compiled to a prepared statement """
+        return compile_rule_sql(rule.rule_sql, None if self.prepare else submission_id)
+
+    def _deliver(self, result):
+        self._record(result)
+        try:
+            yield result
+        finally:
+            result.batches.close()
+
+    def _run_rule_on_engine(self, engine, rule, compiled_rule, submission_id):
+        connection = engine.connect()
+        try:
+            return self._run_rule(connection, rule, compiled_rule, submission_id, own_connection=True)
+        except Exception:
+            connection.close()
+            raise
+
+    def _run_rule(self, connection, rule, compiled_rule, submission_id, own_connection=False):
+        """ Run a rule on a connection, reading its first batch of failures
+
+        Args:
+            connection: SQLAlchemy connection to run the rule on
+            rule: the rule being run
+            compiled_rule: the rule's CompiledRule, with the submission ID written in unless it's to be prepared
+            submission_id: ID of the submission to check
+            own_connection: whether the connection belongs to the rule, to be closed once its failures are read
+
+        Returns:
+            RuleResult
+        """
+        # the setup creates temporary functions, which are rolled back with the transaction unlike the statement
+        for statement in compiled_rule.setup:
+            connection.execute(statement)
+        plan = None
+        if self.prepare:
+            prepare_rule(connection, compiled_rule)
+            if self.explain:
+                plan = _plan(connection.execute(execute_statement(compiled_rule, explain=True),
+                                                submission_id=submission_id))
+            # a cursor can't be declared for EXECUTE, so Postgres sends all the failures of prepared rules at once
+            start = time.time()
+            result = connection.execute(execute_statement(compiled_rule), submission_id=submission_id)
+        else:
+            if self.explain:
+                plan = _plan(connection.execute('EXPLAIN (ANALYZE, BUFFERS) ' + compiled_rule.statement))
+            # a server-side cursor, so only fetch_size failures are held in memory at a time
+            start = time.time()
+            result = connection.execution_options(stream_results=True, max_row_buffer=self.fetch_size).\
+                execute(compiled_rule.statement)
+        columns = result.keys()
+        first_batch = result.fetchmany(self.fetch_size)
+        batches = FailureBatches(result, first_batch, self.fetch_size, connection if own_connection else None)
+        return RuleResult(rule, columns, batches, time.time() - start, plan)
+
+    def _record(self, result):
+        self.timings.append((result.rule.query_name, result.duration))
+        if result.plan is not None:
+            logger.info({
+                'message': 'Query plan for rule {}'.format(result.rule.query_name),
+                'message_type': 'ValidatorInfo',
+                'rule': result.rule.query_name,
+                'prepared': self.prepare,
+                'query_duration': result.duration,
+                'plan': result.plan
+            })
+        return result
+
+    def log_timings(self, message, **log_fields):
+        """ Log how long each rule took, slowest first
+
+        Args:
+            message: message to log
+            log_fields: other fields to include in the log entry
+        """
+        log_fields.update({
+            'message': message,
+            'message_type': 'ValidatorInfo',
+            'rule_connections': self.connections,
+            'rule_timings': sorted(self.timings, key=lambda timing: timing[1], reverse=True),
+            'total_rule_duration': sum(duration for _, duration in self.timings)
+        })
+        logger.info(log_fields)
+
+
+class FailureBatches:
+    """ The failed rows of a rule, read from its result a batch at a time """
+    def __init__(self, result, first_batch, fetch_size, connection=None):
+        """ Create the batches
+
+        Args:
+            result: SQLAlchemy result of the rule's query
+            first_batch: failures already read from the result
+            fetch_size: number of failures to read at a time
+            connection: connection to close along with the result, if the rule had one of its own
+        """
+        self.result = result
+        self.first_batch = first_batch
+        self.fetch_size = fetch_size
+        self.connection = connection
+
+    def __iter__(self):
+        try:
+            batch, self.first_batch = self.first_batch, None
+            while batch:
+                yield batch
+                batch = self.result.fetchmany(self.fetch_size)
+        finally:
+            self.close()
+
+    def close(self):
+        """ Stop reading failures, releasing the cursor and the rule's own connection """
+        self.first_batch = None
+        self.result.close()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _discard(future):
+    """ Release the failures of a rule run after processing stopped """
+    if not future.cancelled() and future.exception() is None:
+        future.result().batches.close()
+
+
+def _plan(result):
+    """ Join the lines of EXPLAIN output """
+    return '\n'.join(row[0] for row in result)
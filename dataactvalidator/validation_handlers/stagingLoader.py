@@ -0,0 +1,235 @@
+import csv
+import io
+import logging
+from datetime import datetime
+
+import psycopg2
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataactcore.config import CONFIG_SERVICES
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.lookups import RULE_SEVERITY_DICT
+from dataactcore.models.stagingModels import FlexField
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+logger = logging.getLogger(__name__)
+
+LOAD_METHODS = ('copy', 'insert')
+
+
+class StagingLoader:
+    """ Buffers validated records and their flex fields and writes them to the staging tables in batches.
+
+        Error report output is queued alongside the records so that it can be replayed in row order once the batch
+        has been written, keeping the reports identical to a row-by-row load.
+    """
+    BATCH_SIZE = 10000
+
+    def __init__(self, model, job, writer, error_list, batch_size=None, method=None):
+        """ Create the loader
+
+        Args:
+            model: ORM model for the staging table being loaded
+            job: current job
+            writer: CsvWriter object for the error report
+            error_list: instance of ErrorInterface to keep track of errors
+            batch_size: number of queued rows that triggers a flush, defaults to the staging_batch_size config value
+            method: 'copy' to load with COPY FROM STDIN, 'insert' for a multi-row insert, defaults to the
+                staging_load_method config value
+        """
+        self.table = model.__table__
+        self.job = job
+        self.writer = writer
+        self.error_list = error_list
+        self.batch_size = batch_size or CONFIG_SERVICES.get('staging_batch_size') or self.BATCH_SIZE
+        self.method = method or CONFIG_SERVICES.get('staging_load_method') or 'copy'
+        if self.method not in LOAD_METHODS:
+            raise ValueError('Unknown staging load method: {}'.format(self.method))
+
+        # the primary key is generated by the database, all other columns may be loaded
+        self.columns = [column for column in self.table.columns if not column.primary_key]
+        self.default_columns = [column for column in self.columns if column.default is not None]
+        # columns with a default are left out of a record that doesn't provide them, everything else is loaded as
+        # NULL when missing
+        self.default_keys = [column.key for column in self.columns
+                             if column.default is not None or column.server_default is not None]
+        self.value_keys = [column.key for column in self.columns if column.key not in self.default_keys]
+        self.pending = []
+        self.failed_rows = []
+
+        # flex fields are held column-wise, every cell in a job shares the same submission, job, and file type
+        self.flex_rows = []
+        self.flex_headers = []
+        self.flex_cells = []
+
+    def add(self, row_number, record, callback=None):
+        """ Queue a record to be written to the staging table
+
+        Args:
+            row_number: row number of the record in the submitted file
+            record: dict of column values for the record, keys that are not staging columns are ignored
+            callback: function to call once the record has been written successfully
+        """
+        values = {key: record.get(key) for key in self.value_keys}
+        values.update((key, record[key]) for key in self.default_keys if key in record)
+        values['row_number'] = row_number
+        self.pending.append((row_number, values, callback))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_flex(self, row_number, flex_fields):
+        """ Queue the flex fields of a row to be written to the flex_field table
+
+        Args:
+            row_number: row number of the record in the submitted file
+            flex_fields: list of FlexCells for the row
+        """
+        for flex_field in flex_fields:
+            self.flex_rows.append(row_number)
+            self.flex_headers.append(flex_field.header)
+            self.flex_cells.append(flex_field.cell)
+
+    def defer(self, callback):
+        """ Queue a function to be called, in row order, the next time the loader is flushed
+
+        Args:
+            callback: function to call
+        """
+        self.pending.append((None, None, callback))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Write all queued records to the staging table and replay the queued callbacks
+
+        Returns:
+            list of the row numbers of this flush that could not be written to the staging table, those of every
+            flush so far being kept in failed_rows
+        """
+        records = [(row_number, values) for row_number, values, _ in self.pending if values is not None]
+        failed_rows = set(self._load(records)) if records else set()
+        if self.flex_rows:
+            self._load_flex()
+
+        for row_number, values, callback in self.pending:
+            if values is not None and row_number in failed_rows:
+                write_staging_error(row_number, self.job, self.writer, self.error_list)
+            elif callback is not None:
+                callback()
+
+        self.pending = []
+        failed_rows = sorted(failed_rows)
+        self.failed_rows.extend(failed_rows)
+        return failed_rows
+
+    def _load(self, records):
+        """ Write a batch of records, isolating any rows that can't be written
+
+        Args:
+            records: list of (row number, column values) tuples
+
+        Returns:
+            list of row numbers that could not be written
+        """
+        sess = GlobalDB.db().session
+        try:
+            if self.method == 'copy':
+                self._copy([values for _, values in records])
+            else:
+                sess.execute(self.table.insert(), [values for _, values in records])
+            sess.commit()
+            return []
+        except (SQLAlchemyError, psycopg2.Error) as e:
+            # errors raised by COPY come straight from psycopg2 rather than being wrapped by sqlalchemy
+            sess.rollback()
+            logger.warning({
+                'message': 'Batch load to {} failed, loading rows individually: {}'.format(self.table.name, str(e)),
+                'message_type': 'ValidatorWarning',
+                'submission_id': self.job.submission_id,
+                'job_id': self.job.job_id
+            })
+
+        failed_rows = []
+        for row_number, values in records:
+            try:
+                sess.execute(self.table.insert(), values)
+                sess.commit()
+            except SQLAlchemyError:
+                sess.rollback()
+                failed_rows.append(row_number)
+        return failed_rows
+
+    def _load_flex(self):
+        """ Write all queued flex fields to the flex_field table """
+        job = self.job
+        now = datetime.utcnow()
+        columns = ['submission_id', 'job_id', 'file_type_id', 'row_number', 'header', 'cell', 'created_at',
+                   'updated_at']
+        rows = [(job.submission_id, job.job_id, job.file_type_id, row_number, header, cell, now, now)
+                for row_number, header, cell in zip(self.flex_rows, self.flex_headers, self.flex_cells)]
+
+        sess = GlobalDB.db().session
+        if self.method == 'copy':
+            copy_rows(FlexField.__tablename__, columns, rows)
+        else:
+            sess.execute(FlexField.__table__.insert(), [dict(zip(columns, row)) for row in rows])
+        sess.commit()
+
+        self.flex_rows = []
+        self.flex_headers = []
+        self.flex_cells = []
+
+    def _copy(self, records):
+        """ Stream a batch of records into the staging table using COPY FROM STDIN
+
+        Args:
+            records: list of dicts of column values
+        """
+        for values in records:
+            self._apply_defaults(values)
+        columns = [column.key for column in self.columns if any(column.key in values for values in records)]
+        copy_rows(self.table.name, columns, ([values.get(column) for column in columns] for values in records))
+
+    def _apply_defaults(self, values):
+        """ COPY bypasses the python-side column defaults sqlalchemy applies on insert, so apply them here """
+        for column in self.default_columns:
+            if column.key not in values:
+                default = column.default
+                values[column.key] = default.arg(_DefaultContext(values)) if default.is_callable else default.arg
+
+
+class _DefaultContext:
+    """ Stand-in for the execution context sqlalchemy passes to callable column defaults """
+    def __init__(self, parameters):
+        self.current_parameters = parameters
+
+
+def copy_rows(table_name, columns, rows):
+    """ Load rows into a table using COPY FROM STDIN within the current session's transaction
+
+    Args:
+        table_name: name of the table to load
+        columns: list of column names, in the order their values appear in each row
+        rows: iterable of row value lists
+    """
+    buffer = io.StringIO()
+    csv_writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+    csv_writer.writerows(rows)
+    buffer.seek(0)
+
+    cursor = GlobalDB.db().session.connection().connection.cursor()
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH CSV'.format(table_name, ', '.join(columns)), buffer)
+
+
+def write_staging_error(row_number, job, writer, error_list):
+    """ Record a row that could not be written into the staging table
+
+    Args:
+        row_number: row number of the record that failed
+        job: current job
+        writer: CsvWriter object
+        error_list: instance of ErrorInterface to keep track of errors
+    """
+    writer.writerow(["Formatting Error", ValidationError.writeErrorMsg, row_number, ""])
+    error_list.record_row_error(job.job_id, job.filename, "Formatting Error", ValidationError.writeError,
+                                row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
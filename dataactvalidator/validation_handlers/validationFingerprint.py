@@ -0,0 +1,80 @@
+import hashlib
+import json
+
+from sqlalchemy import func
+
+from dataactcore.interfaces.referenceCache import reference_versions
+from dataactcore.models.jobModels import Submission
+from dataactcore.models.lookups import FILE_TYPE_DICT
+from dataactcore.models.stagingModels import PublishedAwardFinancialAssistance
+from dataactcore.models.validationModels import FileColumn, RuleSql
+from dataactvalidator.filestreaming.s3Stream import S3ReadAheadStream
+
+# Part of every fingerprint, so raising it invalidates the validations recorded before a change to how the validator
+# itself checks files
+FINGERPRINT_VERSION = 1
+
+# Bytes read from the file at a time while hashing it
+HASH_CHUNK_SIZE = 8 * 1024 ** 2
+
+
+def hash_file(file_name, region=None, bucket=None):
+    """ SHA-256 of the contents of a submitted file
+
+    Args:
+        file_name: path of the file, on disk or in the bucket
+        region: AWS region of the bucket
+        bucket: S3 bucket the file is in, the file is read from disk without one
+
+    Returns:
+        hex digest of the file's contents
+    """
+    digest = hashlib.sha256()
+    stream = S3ReadAheadStream(region, bucket, file_name) if bucket else open(file_name, 'rb')
+    with stream:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def validation_fingerprint(sess, submission, file_type_id, file_hash):
+    """ Fingerprint of everything a file's validation results depend on: its contents, the columns it's checked
+        against, the SQL rules run on it and what those rules look up outside the file. That's the submission's agency
+        and reporting period, the versions of the reference tables, when the agency's other submissions for the year
+        last changed, and for FABS files the awards published so far. Cross-file rules aren't included, the cross-file
+        job always runs again
+
+    Args:
+        sess: database session
+        submission: the file's submission
+        file_type_id: ID of the file's type
+        file_hash: SHA-256 of the file's contents
+
+    Returns:
+        hex digest
+    """
+    columns = sess.query(FileColumn.name, FileColumn.name_short, FileColumn.field_types_id, FileColumn.required,
+                         FileColumn.padded_flag, FileColumn.length).\
+        filter_by(file_id=file_type_id).order_by(FileColumn.name)
+    rules = sess.query(RuleSql.query_name, RuleSql.rule_label, RuleSql.rule_sql, RuleSql.rule_error_message,
+                       RuleSql.rule_severity_id, RuleSql.target_file_id).\
+        filter_by(file_id=file_type_id, rule_cross_file_flag=False).order_by(RuleSql.query_name, RuleSql.rule_sql_id)
+    submission_values = [submission.cgac_code, submission.frec_code, submission.reporting_fiscal_year,
+                         submission.reporting_fiscal_period]
+
+    # rules such as A16 check whether the agency has published other submissions for the year
+    other_submissions_updated = sess.query(func.max(Submission.updated_at)).\
+        filter(Submission.submission_id != submission.submission_id,
+               Submission.cgac_code == submission.cgac_code,
+               Submission.reporting_fiscal_year == submission.reporting_fiscal_year).scalar()
+    submission_values.append(str(other_submissions_updated) if other_submissions_updated else None)
+
+    # FABS rules check corrections and deletions against the awards published so far, which grow with every publish
+    if file_type_id == FILE_TYPE_DICT['detached_award']:
+        submission_values.append(
+            sess.query(func.max(PublishedAwardFinancialAssistance.published_award_financial_assistance_id)).scalar())
+
+    fingerprint = json.dumps([FINGERPRINT_VERSION, file_hash, [list(column) for column in columns],
+                              [list(rule) for rule in rules], submission_values,
+                              sorted(reference_versions(sess).items())])
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
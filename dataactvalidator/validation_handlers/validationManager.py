@@ -1,24 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import csv
 import os
 import logging
-import smart_open
 from datetime import datetime
+from functools import partial
 
+from boto3.s3.transfer import TransferConfig
+import flask
 from sqlalchemy import and_, or_
-from sqlalchemy.exc import SQLAlchemyError
 
+from dataactbroker.handlers.fabsPublishHandler import publish_fabs_submission
 from dataactbroker.handlers.submission_handler import populate_submission_error_info
 
 from dataactcore.aws.s3Handler import S3Handler
 from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
 
-from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.db import GlobalDB, thread_db
 from dataactcore.interfaces.function_bag import (
     create_file_if_needed, write_file_error, mark_file_complete, run_job_checks, mark_job_status,
     populate_job_error_info, get_action_dates
 )
+from dataactcore.interfaces.stagingPartitions import clear_submission_rows, prepare_submission_partition
 
-from dataactcore.models.domainModels import matching_cars_subquery
+from dataactcore.models.domainModels import update_matching_tas_ids
 from dataactcore.models.jobModels import Submission
 from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT, RULE_SEVERITY_DICT
 from dataactcore.models.validationModels import FileColumn
@@ -35,16 +40,19 @@ from dataactcore.utils.statusCode import StatusCode
 from dataactvalidator.filestreaming.csvReader import CsvReader
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
-from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.filestreaming.s3Stream import open_s3_text_writer, s3_client
 
+from dataactvalidator.validation_handlers.columnPlan import get_column_plan
+from dataactvalidator.validation_handlers.columnValidator import ColumnValidator
 from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
-from dataactvalidator.validation_handlers.validator import Validator, cross_validate_sql, validate_file_by_sql
+from dataactvalidator.validation_handlers.rowValidator import RowValidator, ValidationPool
+from dataactvalidator.validation_handlers.stagingLoader import StagingLoader
+from dataactvalidator.validation_handlers.validationFingerprint import hash_file, validation_fingerprint
+from dataactvalidator.validation_handlers.validator import cross_validate_sql, validate_file_by_sql
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
 logger = logging.getLogger(__name__)
 
-CHUNK_SIZE = 1024
-
 
 class ValidationManager:
     """
@@ -53,6 +61,8 @@ class ValidationManager:
     reportHeaders = ["Field name", "Error message", "Row number", "Value provided", "Rule label"]
     crossFileReportHeaders = ["Source File", "Target File", "Field names", "Error message", "Values provided",
                               "Row number", "Rule label"]
+    # Number of rows handed to the validation pool at a time
+    VALIDATION_CHUNK_SIZE = 1000
 
     def __init__(self, is_local=True, directory=""):
         # Initialize instance variables
@@ -84,6 +94,44 @@ class ValidationManager:
             return CsvLocalWriter(file_name, header)
         return CsvS3Writer(region_name, bucket_name, file_name, header)
 
+    @contextmanager
+    def open_report(self, file_name, header):
+        """ Open an error or warning report, yielding a csv writer for its rows
+
+        Locally, reports are written to the error report path. Otherwise they're uploaded to S3 in parts as they're
+        written, or written to the error report path first and uploaded once complete if spill_reports_to_disk is set.
+        Reports of validations that fail part way through aren't uploaded.
+
+        Args:
+            file_name: name of the report
+            header: column headers of the report
+        """
+        local_path = "".join([CONFIG_SERVICES['error_report_path'], file_name])
+        part_size = CONFIG_SERVICES.get('report_part_size')
+        spill = self.isLocal or CONFIG_SERVICES.get('spill_reports_to_disk')
+        if spill:
+            stream = open(local_path, 'w', newline='')
+        else:
+            stream = open_s3_text_writer(CONFIG_BROKER['aws_region'], CONFIG_BROKER['aws_bucket'],
+                                         self.get_file_name(file_name), part_size=part_size)
+        try:
+            report = csv.writer(stream, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+            report.writerow(header)
+            yield report
+        except BaseException:
+            if not spill:
+                stream.buffer.raw.abort()
+            stream.close()
+            raise
+        stream.close()
+
+        if spill and not self.isLocal:
+            # upload the finished report in concurrent parts, then remove the local copy
+            config = TransferConfig(multipart_chunksize=part_size) if part_size else TransferConfig()
+            s3_client(CONFIG_BROKER['aws_region']).\
+                upload_file(local_path, CONFIG_BROKER['aws_bucket'], self.get_file_name(file_name), Config=config)
+            os.remove(local_path)
+
     def get_file_name(self, path):
         """ Return full path of error report based on provided name """
         if self.isLocal:
@@ -91,38 +139,27 @@ class ValidationManager:
         # Forcing forward slash here instead of using os.path to write a valid path for S3
         return "".join(["errors/", path])
 
-    def read_record(self, reader, writer, row_number, job, fields, error_list):
-        """ Read and process the next record
+    def read_record(self, reader, row_number):
+        """ Read the next record
 
         Args:
             reader: CsvReader object
-            writer: CsvWriter object
             row_number: Next row number to be read
-            job: current job
-            fields: List of FileColumn objects for this file type
-            error_list: instance of ErrorInterface to keep track of errors
 
         Returns:
             Tuple with six elements:
-            1. Dict of record after preprocessing
+            1. Dict of record as read from the file
             2. Boolean indicating whether to reduce row count
             3. Boolean indicating whether to skip row
             4. Boolean indicating whether to stop reading
             5. Row error has been found
-            6. Dict of flex columns
+            6. List of FlexCells for the row
         """
         reduce_row = False
         row_error_found = False
-        job_id = job.job_id
         try:
-            (next_record, flex_fields) = reader.get_next_record()
-            record = FieldCleaner.clean_row(next_record, self.long_to_short_dict, fields)
+            (record, flex_fields) = reader.get_next_record()
             record["row_number"] = row_number
-            for flex_field in flex_fields:
-                flex_field.submission_id = job.submission_id
-                flex_field.job_id = job.job_id
-                flex_field.row_number = row_number
-                flex_field.file_type_id = job.file_type_id
 
             if reader.is_finished and len(record) < 2:
                 # This is the last line and is empty, don't record an error
@@ -134,9 +171,6 @@ class ValidationManager:
                 # Don't count last row if empty
                 reduce_row = True
             else:
-                writer.writerow(["Formatting Error", ValidationError.readErrorMsg, str(row_number), ""])
-                error_list.record_row_error(job_id, job.filename, "Formatting Error", ValidationError.readError,
-                                            row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
                 row_error_found = True
 
             return {}, reduce_row, True, False, row_error_found, []
@@ -173,16 +207,30 @@ class ValidationManager:
         # Get orm model for this file
         model = [ft.model for ft in FILE_TYPE if ft.name == file_type][0]
 
+        # A file that hasn't changed since it was last validated against the same columns and rules keeps the
+        # results of that validation
+        file_hash = validation_hash = None
+        if CONFIG_SERVICES.get('reuse_unchanged_validations', False):
+            file_hash = hash_file(job.filename, CONFIG_BROKER['aws_region'],
+                                  CONFIG_BROKER['aws_bucket'] if CONFIG_BROKER['use_aws'] else None)
+            validation_hash = validation_fingerprint(sess, job.submission, job.file_type_id, file_hash)
+            if validation_hash == job.validation_hash:
+                return self.reuse_validation(job, file_hash, log_str)
+        job.file_hash = file_hash
+        job.validation_hash = None
+        sess.commit()
+
         # Delete existing file level errors for this submission
         sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id).delete()
         sess.commit()
 
         # Clear existing records for this submission
-        sess.query(model).filter_by(submission_id=submission_id).delete()
+        clear_submission_rows(sess, model, submission_id)
         sess.commit()
 
         # Clear existing flex fields for this job
-        sess.query(FlexField).filter_by(job_id=job_id).delete()
+        sess.query(FlexField).filter_by(submission_id=submission_id, job_id=job_id).delete()
+        prepare_submission_partition(sess, FlexField, submission_id)
         sess.commit()
 
         # If local, make the error report directory
@@ -194,9 +242,7 @@ class ValidationManager:
         region_name = CONFIG_BROKER['aws_region']
 
         error_file_name = report_file_name(job.submission_id, False, job.file_type.name)
-        error_file_path = "".join([CONFIG_SERVICES['error_report_path'], error_file_name])
         warning_file_name = report_file_name(job.submission_id, True, job.file_type.name)
-        warning_file_path = "".join([CONFIG_SERVICES['error_report_path'], warning_file_name])
 
         # Create File Status object
         create_file_if_needed(job_id, file_name)
@@ -211,29 +257,22 @@ class ValidationManager:
         job.file_size = file_size
         sess.commit()
 
-        # Get fields for this file
-        fields = sess.query(FileColumn).filter(FileColumn.file_id == FILE_TYPE_DICT[file_type]).all()
-
-        for field in fields:
-            sess.expunge(field)
+        # Get fields for this file, along with the plan for cleaning and validating its columns
+        fields, plan = get_column_plan(sess, FILE_TYPE_DICT[file_type])
 
-        csv_schema = {row.name_short: row for row in fields}
+        # Rows are cleaned and validated in chunks, spread across worker processes if configured. The workers are
+        # started before the file is opened so they aren't forked while the file is being streamed
+        validator_class = ColumnValidator if CONFIG_SERVICES.get('validation_engine') == 'column' else RowValidator
+        row_validator = validator_class(plan, file_type)
+        validation_pool = ValidationPool(row_validator, CONFIG_SERVICES.get('validator_processes') or 1)
 
         try:
             extension = os.path.splitext(file_name)[1]
             if not extension or extension.lower() not in ['.csv', '.txt']:
                 raise ResponseException("", StatusCode.CLIENT_ERROR, None, ValidationError.fileTypeError)
 
-            # Count file rows: throws a File Level Error for non-UTF8 characters
-            temp_file = open(reader.get_filename(region_name, bucket_name, file_name), encoding='utf-8')
-            file_row_count = len(list(csv.reader(temp_file)))
-            try:
-                temp_file.close()
-            except AttributeError:
-                # File does not exist, and so does not need to be closed
-                pass
-
-            # Pull file and return info on whether it's using short or long col headers
+            # Pull file and return info on whether it's using short or long col headers. The file is decoded as it
+            # is read, throwing a File Level Error for non-UTF8 characters
             reader.open_file(region_name, bucket_name, file_name, fields, bucket_name,
                              self.get_file_name(error_file_name), self.long_to_short_dict, is_local=self.isLocal)
 
@@ -255,87 +294,92 @@ class ValidationManager:
                 'start_time': loading_start
             })
 
-            with open(error_file_path, 'w', newline='') as error_file,\
-                    open(warning_file_path, 'w', newline='') as warning_file:
-                error_csv = csv.writer(error_file, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
-                warning_csv = csv.writer(warning_file, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
-
-                # write headers to file
-                error_csv.writerow(self.reportHeaders)
-                warning_csv.writerow(self.reportHeaders)
-                while not reader.is_finished:
-                    row_number += 1
-
-                    if row_number % 100 == 0:
-                        elapsed_time = (datetime.now()-loading_start).total_seconds()
-                        logger.info({
-                            'message': 'Loading row: {} {}'.format(str(row_number), log_str),
-                            'message_type': 'ValidatorInfo',
-                            'submission_id': submission_id,
-                            'job_id': job_id,
-                            'file_type': file_type,
-                            'action': 'data_loading',
-                            'status': 'loading',
-                            'rows_loaded': row_number,
-                            'start_time': loading_start,
-                            'elapsed_time': elapsed_time
-                        })
-                    #
-                    # first phase of validations: read record and record a
-                    # formatting error if there's a problem
-                    #
-                    (record, reduceRow, skip_row, doneReading, rowErrorHere, flex_cols) = \
-                        self.read_record(reader, error_csv, row_number, job, fields, error_list)
-                    if reduceRow:
-                        row_number -= 1
-                    if rowErrorHere:
-                        error_rows.append(row_number)
-                    if doneReading:
-                        # Stop reading from input file
-                        break
-                    elif skip_row:
-                        # Do not write this row to staging, but continue processing future rows
-                        continue
-
-                    #
-                    # second phase of validations: do basic schema checks
-                    # (e.g., require fields, field length, data type)
-                    #
-                    # D files are obtained from upstream systems (ASP and FPDS) that perform their own basic
-                    # validations, so these validations are not repeated here
-                    if file_type in ["award", "award_procurement"]:
-                        # Skip basic validations for D files, set as valid to trigger write to staging
-                        passed_validations = True
-                        valid = True
-                    else:
-                        if file_type in ["detached_award"]:
-                            record['afa_generated_unique'] = (record['award_modification_amendme'] or '-none-') + "_" +\
-                                                             (record['awarding_sub_tier_agency_c'] or '-none-') + \
-                                                             "_" + (record['fain'] or '-none-') + "_" + \
-                                                             (record['uri'] or '-none-')
-                        passed_validations, failures, valid = Validator.validate(record, csv_schema,
-                                                                                 file_type in ["detached_award"])
-                    if valid:
-                        # todo: update this logic later when we have actual validations
-                        if file_type in ["detached_award"]:
-                            record["is_valid"] = True
-
-                        model_instance = model(job_id=job_id, submission_id=submission_id,
-                                               valid_record=passed_validations, **record)
-                        skip_row = not insert_staging_model(model_instance, job, error_csv, error_list)
-                        if flex_cols:
-                            sess.add_all(flex_cols)
-                            sess.commit()
-
-                        if skip_row:
-                            error_rows.append(row_number)
+            with self.open_report(error_file_name, self.reportHeaders) as error_csv,\
+                    self.open_report(warning_file_name, self.reportHeaders) as warning_csv:
+
+                def read_chunks():
+                    """ Read the file into chunks of rows to validate, read errors are passed along in row order """
+                    nonlocal row_number
+                    chunk = []
+                    while not reader.is_finished:
+                        row_number += 1
+
+                        if row_number % 100 == 0:
+                            elapsed_time = (datetime.now()-loading_start).total_seconds()
+                            logger.info({
+                                'message': 'Loading row: {} {}'.format(str(row_number), log_str),
+                                'message_type': 'ValidatorInfo',
+                                'submission_id': submission_id,
+                                'job_id': job_id,
+                                'file_type': file_type,
+                                'action': 'data_loading',
+                                'status': 'loading',
+                                'rows_loaded': row_number,
+                                'start_time': loading_start,
+                                'elapsed_time': elapsed_time
+                            })
+                        #
+                        # first phase of validations: read record and record a
+                        # formatting error if there's a problem
+                        #
+                        (record, reduce_row, skip_row, done_reading, row_error_here, flex_cols) = \
+                            self.read_record(reader, row_number)
+                        if reduce_row:
+                            row_number -= 1
+                        if row_error_here:
+                            chunk.append((row_number, None, None))
+                        if done_reading:
+                            # Stop reading from input file
+                            break
+                        elif not skip_row:
+                            chunk.append((row_number, record, flex_cols))
+
+                        if len(chunk) >= self.VALIDATION_CHUNK_SIZE:
+                            yield chunk
+                            chunk = []
+                    if chunk:
+                        yield chunk
+
+                # records are written to staging in batches, any error report output for a row is queued with the
+                # loader so the reports are still written in row order
+                staging_loader = StagingLoader(model, job, error_csv, error_list)
+
+                #
+                # second phase of validations: do basic schema checks
+                # (e.g., require fields, field length, data type)
+                #
+                for chunk, results in validation_pool.validate(read_chunks()):
+                    for (current_row, _, flex_cols), result in zip(chunk, results):
+                        if result is None:
+                            error_rows.append(current_row)
+                            staging_loader.defer(partial(write_read_error, current_row, job, error_csv, error_list))
                             continue
 
-                    if not passed_validations:
-                        fatal = write_errors(failures, job, self.short_to_long_dict, error_csv, warning_csv, row_number,
-                                             error_list, flex_cols)
-                        if fatal:
-                            error_rows.append(row_number)
+                        record, passed_validations, failures, valid = result
+                        write_row_errors = None
+                        if not passed_validations:
+                            write_row_errors = partial(write_errors, failures, job, self.short_to_long_dict,
+                                                       error_csv, warning_csv, current_row, error_list, flex_cols)
+                            if any(failure.severity == 'fatal' for failure in failures):
+                                error_rows.append(current_row)
+
+                        if valid:
+                            # todo: update this logic later when we have actual validations
+                            if file_type in ["detached_award"]:
+                                record["is_valid"] = True
+
+                            record.update(job_id=job_id, submission_id=submission_id,
+                                          valid_record=passed_validations)
+                            # a row that can't be written to staging only reports the write error, so its validation
+                            # errors are written once the loader has written the row
+                            staging_loader.add(current_row, record, write_row_errors)
+                            if flex_cols:
+                                staging_loader.add_flex(current_row, flex_cols)
+                        elif write_row_errors:
+                            staging_loader.defer(write_row_errors)
+
+                staging_loader.flush()
+                error_rows.extend(staging_loader.failed_rows)
 
                 loading_duration = (datetime.now()-loading_start).total_seconds()
                 logger.info({
@@ -361,36 +405,6 @@ class ValidationManager:
                 sql_error_rows = self.run_sql_validations(job, file_type, self.short_to_long_dict, error_csv,
                                                           warning_csv, row_number, error_list)
                 error_rows.extend(sql_error_rows)
-            error_file.close()
-            warning_file.close()
-
-            # stream file to S3 when not local
-            if not self.isLocal:
-                # stream error file
-                with open(error_file_path, 'rb') as csv_file:
-                    with smart_open.smart_open(S3Handler.create_file_path(self.get_file_name(error_file_name)), 'w')\
-                            as writer:
-                        while True:
-                            chunk = csv_file.read(CHUNK_SIZE)
-                            if chunk:
-                                writer.write(chunk)
-                            else:
-                                break
-                csv_file.close()
-                os.remove(error_file_path)
-
-                # stream warning file
-                with open(warning_file_path, 'rb') as warning_csv_file:
-                    with smart_open.smart_open(S3Handler.create_file_path(self.get_file_name(warning_file_name)), 'w')\
-                            as warning_writer:
-                        while True:
-                            chunk = warning_csv_file.read(CHUNK_SIZE)
-                            if chunk:
-                                warning_writer.write(chunk)
-                            else:
-                                break
-                warning_csv_file.close()
-                os.remove(warning_file_path)
 
             # Calculate total number of rows in file
             # that passed validations
@@ -411,8 +425,8 @@ class ValidationManager:
                     update({"reporting_start_date": min_action_date, "reporting_end_date": max_action_date},
                            synchronize_session=False)
 
-            # Ensure validated rows match initial row count
-            if file_row_count != row_number:
+            # Ensure validated rows match the raw row count of the file
+            if reader.row_count != row_number:
                 raise ResponseException("", StatusCode.CLIENT_ERROR, None, ValidationError.rowCountError)
 
             # Update job metadata
@@ -428,12 +442,17 @@ class ValidationManager:
                 # set number of errors and warnings for detached submission
                 populate_submission_error_info(submission_id)
 
+            # Only a validation that finished can be reused
+            job.validation_hash = validation_hash
+            sess.commit()
+
             # Mark validation as finished in job tracker
             mark_job_status(job_id, "finished")
             mark_file_complete(job_id, file_name)
         finally:
             # Ensure the files always close
             reader.close()
+            validation_pool.close()
 
             validation_duration = (datetime.now()-validation_start).total_seconds()
             logger.info({
@@ -451,6 +470,47 @@ class ValidationManager:
 
         return True
 
+    def reuse_validation(self, job, file_hash, log_str):
+        """ Finish a job whose file is the same as the one last validated for it, against the same columns and
+            rules, keeping the staging rows, errors and reports of that validation
+
+        Args:
+            job: Job to be validated
+            file_hash: SHA-256 of the job's file
+            log_str: description of the job for log messages
+
+        Returns:
+            True
+        """
+        sess = GlobalDB.db().session
+        logger.info({
+            'message': 'Reusing the validation of the unchanged file {}'.format(log_str),
+            'message_type': 'ValidatorInfo',
+            'submission_id': job.submission_id,
+            'job_id': job.job_id,
+            'file_type': job.file_type.name,
+            'action': 'run_validation',
+            'status': 'reused',
+            'file_hash': file_hash
+        })
+        create_file_if_needed(job.job_id, job.filename)
+        # the file may have been uploaded again under a new name
+        sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job.job_id).\
+            update({'filename': job.filename}, synchronize_session=False)
+        if CONFIG_BROKER["use_aws"]:
+            job.file_size = S3Handler.get_file_size(job.filename)
+        else:
+            job.file_size = os.path.getsize(job.filename)
+        job.file_hash = file_hash
+        sess.commit()
+
+        populate_job_error_info(job)
+        if job.file_type.name == 'detached_award':
+            populate_submission_error_info(job.submission_id)
+        mark_job_status(job.job_id, "finished")
+        mark_file_complete(job.job_id, job.filename)
+        return True
+
     def run_sql_validations(self, job, file_type, short_colnames, writer, warning_writer, row_number, error_list):
         """ Run all SQL rules for this file type
 
@@ -464,10 +524,11 @@ class ValidationManager:
             error_list: instance of ErrorInterface to keep track of errors
 
         Returns:
-            a list of the row numbers that failed one of the sql-based validations
+            a set of the row numbers that failed one of the sql-based validations
         """
         job_id = job.job_id
-        error_rows = []
+        error_rows = set()
+        # failures are written out as they're read from the database rather than collected first
         sql_failures = validate_file_by_sql(job, file_type, self.short_to_long_dict)
         for failure in sql_failures:
             # convert shorter, machine friendly column names used in the
@@ -478,7 +539,7 @@ class ValidationManager:
                 field_name = failure.field_name
 
             if failure.severity_id == RULE_SEVERITY_DICT['fatal']:
-                error_rows.append(failure.row)
+                error_rows.add(failure.row)
 
             try:
                 # If error is an int, it's one of our prestored messages
@@ -528,69 +589,9 @@ class ValidationManager:
         sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id).delete()
         sess.commit()
 
-        # get all cross file rules from db
-        cross_file_rules = sess.query(RuleSql).filter_by(rule_cross_file_flag=True)
-
         # for each cross-file combo, run associated rules and create error report
-        for c in get_cross_file_pairs():
-            first_file = c[0]
-            second_file = c[1]
-            combo_rules = cross_file_rules.filter(or_(and_(
-                RuleSql.file_id == first_file.id,
-                RuleSql.target_file_id == second_file.id), and_(
-                RuleSql.file_id == second_file.id,
-                RuleSql.target_file_id == first_file.id)))
-
-            # get error file name/path
-            error_file_name = report_file_name(submission_id, False, first_file.name, second_file.name)
-            error_file_path = "".join([CONFIG_SERVICES['error_report_path'], error_file_name])
-            warning_file_name = report_file_name(submission_id, True, first_file.name, second_file.name)
-            warning_file_path = "".join([CONFIG_SERVICES['error_report_path'], warning_file_name])
-
-            # open error report and gather failed rules within it
-            with open(error_file_path, 'w', newline='') as error_file,\
-                    open(warning_file_path, 'w', newline='') as warning_file:
-                error_csv = csv.writer(error_file, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
-                warning_csv = csv.writer(warning_file, delimiter=',', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
-
-                # write headers to file
-                error_csv.writerow(self.crossFileReportHeaders)
-                warning_csv.writerow(self.crossFileReportHeaders)
-
-                # send comboRules to validator.crossValidate sql
-                cross_validate_sql(combo_rules.all(), submission_id, self.short_to_long_dict, first_file.id,
-                                   second_file.id, job, error_csv, warning_csv, error_list, job_id)
-            # close files
-            error_file.close()
-            warning_file.close()
-
-            # stream file to S3 when not local
-            if not self.isLocal:
-                # stream error file
-                with open(error_file_path, 'rb') as csv_file:
-                    with smart_open.smart_open(S3Handler.create_file_path(self.get_file_name(error_file_name)),
-                                               'w') as writer:
-                        while True:
-                            chunk = csv_file.read(CHUNK_SIZE)
-                            if chunk:
-                                writer.write(chunk)
-                            else:
-                                break
-                csv_file.close()
-                os.remove(error_file_path)
-
-                # stream warning file
-                with open(warning_file_path, 'rb') as warning_csv_file:
-                    with smart_open.smart_open(S3Handler.create_file_path(self.get_file_name(warning_file_name)),
-                                               'w') as warning_writer:
-                        while True:
-                            chunk = warning_csv_file.read(CHUNK_SIZE)
-                            if chunk:
-                                warning_writer.write(chunk)
-                            else:
-                                break
-                warning_csv_file.close()
-                os.remove(warning_file_path)
+        for pair_errors in self.run_cross_file_pairs(job, get_cross_file_pairs()):
+            error_list.merge(pair_errors)
 
         # write all recorded errors to database
         error_list.write_all_row_errors(job_id)
@@ -623,6 +624,88 @@ class ValidationManager:
         # Mark validation complete
         mark_file_complete(job_id)
 
+    def run_cross_file_pairs(self, job, pairs):
+        """ Run the cross-file rules of each pair of files and write their reports. The pairs only read the staging
+            tables, so cross_file_workers of them are run at once, each in a thread with its own database connection
+
+            Args:
+                job: the cross-file Job
+                pairs: the pairs of file types to check against each other
+
+            Returns:
+                list of the ErrorInterface recording the errors of each pair, in pair order
+        """
+        workers = min(CONFIG_SERVICES.get('cross_file_workers') or 1, len(pairs))
+        if workers <= 1:
+            return [self.run_cross_file_pair(job, first_file, second_file) for first_file, second_file in pairs]
+
+        # the threads have a context of the app, or of one of their own outside of it, for their GlobalDB connections
+        app = flask.current_app._get_current_object() if flask.current_app else flask.Flask(__name__)
+        engine = GlobalDB.db().engine
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(self._run_cross_file_pair_in_thread, app, engine, job.job_id, first_file,
+                                   second_file) for first_file, second_file in pairs]
+            try:
+                return [future.result() for future in futures]
+            finally:
+                # don't start the remaining pairs if one failed
+                for future in futures:
+                    future.cancel()
+
+    def _run_cross_file_pair_in_thread(self, app, engine, job_id, first_file, second_file):
+        with thread_db(app, engine) as db:
+            job = db.session.query(Job).filter_by(job_id=job_id).one()
+            return self.run_cross_file_pair(job, first_file, second_file)
+
+    def run_cross_file_pair(self, job, first_file, second_file):
+        """ Run the cross-file rules between two files and write their error and warning reports
+
+            Args:
+                job: the cross-file Job
+                first_file: FileType of the first file of the pair
+                second_file: FileType of the second file of the pair
+
+            Returns:
+                ErrorInterface recording the errors found
+        """
+        sess = GlobalDB.db().session
+        submission_id = job.submission_id
+        pair_start = datetime.now()
+        error_list = ErrorInterface()
+        combo_rules = sess.query(RuleSql).filter_by(rule_cross_file_flag=True).filter(or_(and_(
+            RuleSql.file_id == first_file.id,
+            RuleSql.target_file_id == second_file.id), and_(
+            RuleSql.file_id == second_file.id,
+            RuleSql.target_file_id == first_file.id))).order_by(RuleSql.rule_sql_id).all()
+
+        # get error file name/path
+        error_file_name = report_file_name(submission_id, False, first_file.name, second_file.name)
+        warning_file_name = report_file_name(submission_id, True, first_file.name, second_file.name)
+
+        # open error report and gather failed rules within it
+        with self.open_report(error_file_name, self.crossFileReportHeaders) as error_csv,\
+                self.open_report(warning_file_name, self.crossFileReportHeaders) as warning_csv:
+
+            # send comboRules to validator.crossValidate sql
+            cross_validate_sql(combo_rules, submission_id, self.short_to_long_dict, first_file.id, second_file.id,
+                               job, error_csv, warning_csv, error_list, job.job_id)
+
+        logger.info({
+            'message': 'Completed cross-file validations of {} and {} on submission_id: {}'.format(
+                first_file.name, second_file.name, submission_id),
+            'message_type': 'ValidatorInfo',
+            'submission_id': submission_id,
+            'job_id': job.job_id,
+            'action': 'run_cross_file_pair',
+            'status': 'finish',
+            'files': [first_file.name, second_file.name],
+            'rule_count': len(combo_rules),
+            'error_count': sum(error_list.error_counts.values()),
+            'start': pair_start,
+            'duration': (datetime.now() - pair_start).total_seconds()
+        })
+        return error_list
+
     def validate_job(self, job_id):
         """ Gets file for job, validates each row, and sends valid rows to a staging table
         Args:
@@ -648,8 +731,8 @@ class ValidationManager:
             raise ResponseException('Prerequisites for Job ID {} are not complete'.format(job_id),
                                     StatusCode.CLIENT_ERROR, None, validation_error_type)
 
-        # Make sure this is a validation job
-        if job.job_type.name in ('csv_record_validation', 'validation'):
+        # Make sure this is a validation or FABS publish job
+        if job.job_type.name in ('csv_record_validation', 'validation', 'fabs_publish'):
             job_type_name = job.job_type.name
         else:
             validation_error_type = ValidationError.jobError
@@ -664,6 +747,8 @@ class ValidationManager:
             self.run_validation(job)
         elif job_type_name == 'validation':
             self.run_cross_validation(job)
+        elif job_type_name == 'fabs_publish':
+            publish_fabs_submission(job, self.isLocal)
         else:
             raise ResponseException("Bad job type for validator", StatusCode.INTERNAL_ERROR)
 
@@ -677,36 +762,23 @@ def update_tas_ids(model_class, submission_id):
     sess = GlobalDB.db().session
     submission = sess.query(Submission).filter_by(submission_id=submission_id).one()
 
-    subquery = matching_cars_subquery(sess, model_class, submission.reporting_start_date, submission.reporting_end_date)
-    sess.query(model_class).filter_by(submission_id=submission_id).\
-        update({getattr(model_class, 'tas_id'): subquery}, synchronize_session=False)
+    update_matching_tas_ids(sess, model_class, submission.reporting_start_date, submission.reporting_end_date,
+                            model_class.submission_id == submission_id)
     sess.commit()
 
 
-def insert_staging_model(model, job, writer, error_list):
-    """ If there is an error during ORM insertion, mark that and continue
+def write_read_error(row_number, job, writer, error_list):
+    """ Record a row that could not be parsed
 
     Args:
-        model: ORM model instance for the current row
+        row_number: row number of the record that failed
         job: Current job
         writer: CsvWriter object
         error_list: instance of ErrorInterface to keep track of errors
-
-    Returns:
-        True if insertion was a success, False otherwise
     """
-    sess = GlobalDB.db().session
-    try:
-        sess.add(model)
-        sess.commit()
-    except SQLAlchemyError:
-        sess.rollback()
-        # Write failed, move to next record
-        writer.writerow(["Formatting Error", ValidationError.writeErrorMsg, model.row_number, ""])
-        error_list.record_row_error(job.job_id, job.filename, "Formatting Error", ValidationError.writeError,
-                                    model.row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
-        return False
-    return True
+    writer.writerow(["Formatting Error", ValidationError.readErrorMsg, str(row_number), ""])
+    error_list.record_row_error(job.job_id, job.filename, "Formatting Error", ValidationError.readError,
+                                row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
 
 
 def write_errors(failures, job, short_colnames, writer, warning_writer, row_number, error_list, flex_cols):
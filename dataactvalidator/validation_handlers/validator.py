@@ -1,11 +1,17 @@
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
 from decimal import Decimal, DecimalException
 from datetime import datetime
 import logging
 
+from sqlalchemy import and_, any_, bindparam, Integer, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from dataactcore.config import CONFIG_SERVICES
 from dataactcore.models.lookups import (FIELD_TYPE_DICT_ID, FILE_TYPE_DICT_ID, FILE_TYPE_DICT, FILE_TYPE_DICT_LETTER,
                                         RULE_SEVERITY_DICT)
+from dataactcore.models.stagingModels import FlexField
 from dataactcore.models.validationModels import RuleSql
+from dataactvalidator.validation_handlers.ruleExecutor import SqlRuleExecutor
 from dataactvalidator.validation_handlers.validationError import ValidationError
 from dataactcore.interfaces.db import GlobalDB
 
@@ -124,30 +130,96 @@ class Validator(object):
             return True
         if datatype == "STRING":
             return len(data) > 0
-        if datatype == "BOOLEAN":
-            if data.upper() in Validator.BOOLEAN_VALUES:
-                return True
-            return False
-        if datatype == "INT":
-            try:
-                int(data)
-                return True
-            except ValueError:
-                return False
-        if datatype == "DECIMAL":
-            try:
-                Decimal(data)
-                return True
-            except DecimalException:
-                return False
-        if datatype == "LONG":
-            try:
-                int(data)
-                return True
-            except ValueError:
-                return False
+        if datatype in TYPE_CHECKS:
+            return TYPE_CHECKS[datatype](data)
         raise ValueError("".join(["Data Type Error, Type: ", datatype, ", Value: ", data]))
 
+    @staticmethod
+    def validate_planned(record, plan, fabs_record=False):
+        """
+        Run the same single file validations as validate, using a column plan instead of the schema
+
+        Args:
+        record -- dict representation of a single record of data
+        plan -- column plan bound to the keys of the record, see columnPlan.bind_plan
+        fabs_record -- True if the record is from a FABS file
+
+        Returns:
+        Tuple of three values:
+        True if validation passed, False if failed
+        List of Failure tuples
+        True if type check passed, False if type failed
+        """
+        record_failed = False
+        record_type_failure = False
+        failed_rules = []
+
+        total_fields = 0
+        blank_fields = 0
+        for column, current_data in zip(plan, record.values()):
+            if column is None:
+                # Skip fields that are not user submitted
+                continue
+            total_fields += 1
+
+            if current_data is not None:
+                current_data = current_data.strip()
+
+            if not current_data:
+                # If field is empty and not required its valid
+                blank_fields += 1
+                if column.required:
+                    record_failed = True
+                    failed_rules.append(column.required_failure)
+                continue
+
+            if column.check_type is not None and not column.check_type(current_data):
+                record_type_failure = True
+                record_failed = True
+                failed_rules.append(Failure(column.name_short, ValidationError.typeError, current_data, "", "fatal"))
+                # Don't check value rules if type failed
+                continue
+
+            if column.length is not None and len(current_data) > column.length:
+                record_failed = True
+                warning_type = "fatal" if fabs_record else "warning"
+                failed_rules.append(Failure(column.name_short, ValidationError.lengthError, current_data, "",
+                                            warning_type))
+
+        # if all columns are blank (empty row), set it so it doesn't add to the error messages or write the line,
+        # just ignore it
+        if total_fields == blank_fields:
+            record_failed = False
+            record_type_failure = True
+        return (not record_failed), failed_rules, (not record_type_failure)
+
+
+def is_boolean(data):
+    """ Check whether data is one of the accepted boolean values """
+    return data.upper() in Validator.BOOLEAN_VALUES
+
+
+def is_int(data):
+    """ Check whether data can be converted to an int """
+    try:
+        int(data)
+        return True
+    except ValueError:
+        return False
+
+
+def is_decimal(data):
+    """ Check whether data can be converted to a Decimal """
+    try:
+        Decimal(data)
+        return True
+    except DecimalException:
+        return False
+
+
+# Checks for non-empty data of each field type that needs one, strings always pass
+TYPE_CHECKS = {"BOOLEAN": is_boolean, "INT": is_int, "LONG": is_int, "DECIMAL": is_decimal}
+
 
 def cross_validate_sql(rules, submission_id, short_to_long_dict, first_file, second_file, job, error_csv, warning_csv,
                        error_list, job_id):
@@ -158,9 +230,12 @@ def cross_validate_sql(rules, submission_id, short_to_long_dict, first_file, sec
         submission_id -- ID of submission to run cross-file validation
     """
     conn = GlobalDB.db().connection
+    executor = SqlRuleExecutor()
+    flex_fields = FlexFieldCache.for_files(submission_id, [first_file, second_file])
 
-    # Put each rule through evaluate, appending all failures into list
-    for rule in rules:
+    # Run the rules, several at once if configured, and evaluate the failures of each in rule order
+    for rule_result in executor.run(rules, submission_id, conn):
+        rule = rule_result.rule
         rule_start = datetime.now()
         logger.info({
             'message': 'Beginning cross-file rule {} on submission_id: {}'.format(rule.query_name, str(submission_id)),
@@ -172,80 +247,51 @@ def cross_validate_sql(rules, submission_id, short_to_long_dict, first_file, sec
             'status': 'start',
             'start': rule_start
         })
-        failed_rows = conn.execute(rule.rule_sql.format(submission_id))
         logger.info({
-            'message': 'Finished running cross-file rule {} on submission_id: {}. Starting flex field gathering and ' +
+            'message': 'Finished running cross-file rule {} on submission_id: {}. Starting flex field gathering and '
                        'file writing'.format(rule.query_name, str(submission_id)),
             'message_type': 'ValidatorInfo',
             'rule': rule.query_name,
             'job_id': job.job_id,
-            'submission_id': submission_id
+            'submission_id': submission_id,
+            'query_duration': rule_result.duration
         })
-        if failed_rows.rowcount:
-            # get list of fields involved in this validation
-            # note: row_number is metadata, not a field being
-            # validated, so exclude it
-            cols = failed_rows.keys()
-            cols.remove('row_number')
-            column_string = ", ".join(short_to_long_dict[c] if c in short_to_long_dict else c for c in cols)
-
-            # materialize as we'll iterate over the failed_rows twice
-            failed_rows = list(failed_rows)
-            num_failed_rows = len(failed_rows)
-            slice_start = 0
-            slice_size = 10000
-            while slice_start <= num_failed_rows:
-                # finding out row numbers for logger
-                last_error_curr_slice = slice_start + slice_size
-                failed_row_subset = failed_rows[slice_start:last_error_curr_slice]
-                if last_error_curr_slice > num_failed_rows:
-                    last_error_curr_slice = num_failed_rows
-                logger.info({
-                    'message': 'Starting flex field gathering for cross-file rule {} on submission_id: {} for ' +
-                               'failure rows: {}-{}'.format(rule.query_name, str(submission_id), str(slice_start),
-                                                            str(last_error_curr_slice)),
-                    'message_type': 'ValidatorInfo',
-                    'rule': rule.query_name,
-                    'job_id': job.job_id,
-                    'submission_id': submission_id
-                })
-                flex_data = relevant_cross_flex_data(failed_row_subset, submission_id, [first_file, second_file])
-                logger.info({
-                    'message': 'Finished flex field gathering for cross-file rule {} on submission_id: {} for ' +
-                               'failure rows: {}-{}'.format(rule.query_name, str(submission_id), str(slice_start),
-                                                            str(last_error_curr_slice)),
-                    'message_type': 'ValidatorInfo',
-                    'rule': rule.query_name,
-                    'job_id': job.job_id,
-                    'submission_id': submission_id
-                })
-
-                for row in failed_row_subset:
-                    # get list of values for each column
-                    values = ["{}: {}".format(short_to_long_dict[c], str(row[c])) if c in short_to_long_dict else
-                              "{}: {}".format(c, str(row[c])) for c in cols]
-                    values = ", ".join(values)
-                    full_column_string = column_string
-                    # go through all flex fields in this row and add to the columns and values
-                    for field in flex_data[row['row_number']]:
-                        full_column_string += ", " + field.header + "_file" +\
-                                              FILE_TYPE_DICT_LETTER[field.file_type_id].lower()
-                        values += ", {}: {}".format(field.header + "_file" +
-                                                    FILE_TYPE_DICT_LETTER[field.file_type_id].lower(), field.cell)
-
-                    target_file_type = FILE_TYPE_DICT_ID[rule.target_file_id]
-
-                    failure = [rule.file.name, target_file_type, full_column_string, str(rule.rule_error_message),
-                               values, row['row_number'], str(rule.rule_label), rule.file_id, rule.target_file_id,
-                               rule.rule_severity_id]
-                    if failure[9] == RULE_SEVERITY_DICT['fatal']:
-                        error_csv.writerow(failure[0:7])
-                    if failure[9] == RULE_SEVERITY_DICT['warning']:
-                        warning_csv.writerow(failure[0:7])
-                    error_list.record_row_error(job_id, "cross_file",
-                                                failure[0], failure[3], failure[5], failure[6],
-                                                failure[7], failure[8], severity_id=failure[9])
-                slice_start = slice_start + slice_size
+        # get list of fields involved in this validation
+        # note: row_number is metadata, not a field being
+        # validated, so exclude it
+        cols = list(rule_result.columns)
+        cols.remove('row_number')
+        column_string = ", ".join(short_to_long_dict[c] if c in short_to_long_dict else c for c in cols)
+        target_file_type = FILE_TYPE_DICT_ID[rule.target_file_id]
+
+        # failures are read from the database a batch at a time, and written out before the next batch is read
+        failure_count = 0
+        for failed_rows in rule_result.batches:
+            failure_count += len(failed_rows)
+            flex_data = flex_fields.fetch(failed_rows)
+            for row in failed_rows:
+                # get list of values for each column
+                values = ["{}: {}".format(short_to_long_dict[c], str(row[c])) if c in short_to_long_dict else
+                          "{}: {}".format(c, str(row[c])) for c in cols]
+                values = ", ".join(values)
+                full_column_string = column_string
+                # go through all flex fields in this row and add to the columns and values
+                for field in flex_data[row['row_number']]:
+                    full_column_string += ", " + field.header + "_file" +\
+                                          FILE_TYPE_DICT_LETTER[field.file_type_id].lower()
+                    values += ", {}: {}".format(field.header + "_file" +
+                                                FILE_TYPE_DICT_LETTER[field.file_type_id].lower(), field.cell)
+
+                failure = [rule.file.name, target_file_type, full_column_string, str(rule.rule_error_message),
+                           values, row['row_number'], str(rule.rule_label), rule.file_id, rule.target_file_id,
+                           rule.rule_severity_id]
+                if failure[9] == RULE_SEVERITY_DICT['fatal']:
+                    error_csv.writerow(failure[0:7])
+                if failure[9] == RULE_SEVERITY_DICT['warning']:
+                    warning_csv.writerow(failure[0:7])
+                error_list.record_row_error(job_id, "cross_file",
+                                            failure[0], failure[3], failure[5], failure[6],
+                                            failure[7], failure[8], severity_id=failure[9])
 
         rule_duration = (datetime.now()-rule_start).total_seconds()
         logger.info({
@@ -257,9 +303,14 @@ def cross_validate_sql(rules, submission_id, short_to_long_dict, first_file, sec
             'action': 'run_cross_validation_rule',
             'status': 'finish',
             'start': rule_start,
-            'duration': rule_duration
+            'duration': rule_duration,
+            'query_duration': rule_result.duration,
+            'failures': failure_count
         })
 
+    executor.log_timings('Cross-file rule timings on submission_id: {}'.format(submission_id), job_id=job.job_id,
+                         submission_id=submission_id)
+
 
 def validate_file_by_sql(job, file_type, short_to_long_dict):
     """ Check all SQL rules
@@ -269,8 +320,8 @@ def validate_file_by_sql(job, file_type, short_to_long_dict):
         file_type: file type being checked
         short_to_long_dict: mapping of short to long schema column names
 
-    Returns:
-        List of ValidationFailures
+    Yields:
+        ValidationFailures, as the failures of each rule are read from the database
     """
 
     sql_val_start = datetime.now()
@@ -287,15 +338,18 @@ def validate_file_by_sql(job, file_type, short_to_long_dict):
         'start_time': sql_val_start
     })
     sess = GlobalDB.db().session
+    # rules running on their own connections only see the staging rows once they're committed
+    sess.commit()
 
     # Pull all SQL rules for this file type
     file_id = FILE_TYPE_DICT[file_type]
-    rules = sess.query(RuleSql).filter_by(file_id=file_id, rule_cross_file_flag=False)
-    errors = []
-
-    # For each rule, execute sql for rule
-    for rule in rules:
+    rules = sess.query(RuleSql).filter_by(file_id=file_id, rule_cross_file_flag=False).order_by(RuleSql.rule_sql_id)
+    executor = SqlRuleExecutor()
+    flex_fields = FlexFieldCache.for_job(job.job_id)
 
+    # For each rule, execute sql for rule, several at once if configured
+    for rule_result in executor.run(rules, job.submission_id, sess.connection()):
+        rule = rule_result.rule
         rule_start = datetime.now()
         logger.info({
             'message': 'Beginning SQL validation rule {} {}'.format(rule.query_name, log_string),
@@ -309,19 +363,18 @@ def validate_file_by_sql(job, file_type, short_to_long_dict):
             'start_time': rule_start
         })
 
-        failures = sess.execute(rule.rule_sql.format(job.submission_id))
-        if failures.rowcount:
-            # Create column list (exclude row_number)
-            cols = failures.keys()
-            cols.remove("row_number")
-            col_headers = [short_to_long_dict.get(field, field) for field in cols]
+        # Create column list (exclude row_number)
+        cols = list(rule_result.columns)
+        cols.remove("row_number")
+        col_headers = [short_to_long_dict.get(field, field) for field in cols]
 
-            # materialize as we'll iterate over the failures twice
-            failures = list(failures)
-            flex_data = relevant_flex_data(failures, job.job_id)
-
-            errors.extend(failure_row_to_tuple(rule, flex_data, cols, col_headers, file_id, failure)
-                          for failure in failures)
+        # Failures are read from the database a batch at a time, and handed on before the next batch is read
+        failure_count = 0
+        for failures in rule_result.batches:
+            failure_count += len(failures)
+            flex_data = flex_fields.fetch(failures)
+            for failure in failures:
+                yield failure_row_to_tuple(rule, flex_data, cols, col_headers, file_id, failure)
 
         rule_duration = (datetime.now() - rule_start).total_seconds()
         logger.info({
@@ -335,9 +388,14 @@ def validate_file_by_sql(job, file_type, short_to_long_dict):
             'status': 'finish',
             'start_time': rule_start,
             'end_time': datetime.now(),
-            'duration': rule_duration
+            'duration': rule_duration,
+            'query_duration': rule_result.duration,
+            'failures': failure_count
         })
 
+    executor.log_timings('SQL validation rule timings {}'.format(log_string), submission_id=job.submission_id,
+                         job_id=job.job_id, file_type=job.file_type.name)
+
     sql_val_duration = (datetime.now()-sql_val_start).total_seconds()
     logger.info({
         'message': 'Completed SQL validations {}'.format(log_string),
@@ -351,54 +409,76 @@ def validate_file_by_sql(job, file_type, short_to_long_dict):
         'end_time': datetime.now(),
         'duration': sql_val_duration
     })
-    return errors
 
 
-def relevant_flex_data(failures, job_id):
-    """Create a dictionary mapping row numbers of failures to lists of
-    FlexFields"""
-    sess = GlobalDB.db().session
-    flex_data = defaultdict(list)
-    fail_string = "), (".join(str(f['row_number']) for f in failures if f['row_number'])
-    # only do the rest of this gathering if there's any rows to search in the first place, there is at least
-    # one rule that returns NULL for row_number
-    if fail_string:
-        # VALUES and EXISTS are ridiculous in sqlalchemy, using raw sql for this
-        query = (
-            "WITH all_values AS (SELECT * FROM (VALUES (" + fail_string + ")) as all_flexs (row_number)) " +
-            "SELECT * " +
-            "FROM flex_field " +
-            "WHERE job_id=" + str(job_id) +
-            " AND EXISTS (SELECT * FROM all_values WHERE flex_field.row_number = all_values.row_number)"
-        )
-        query_result = sess.execute(query)
-        for flex_field in query_result:
-            flex_data[flex_field.row_number].append(flex_field)
-    return flex_data
-
-
-def relevant_cross_flex_data(failed_rows, submission_id, files):
-    """Create a dictionary mapping row numbers of cross-file failures to lists of FlexFields"""
-    sess = GlobalDB.db().session
-    flex_data = defaultdict(list)
-    fail_string = "), (".join(str(f['row_number']) for f in failed_rows if f['row_number'])
-    # only do the rest of this gathering if there's any rows to search in the first place, there is at least
-    # one rule that returns NULL for row_number
-    if fail_string:
-        file_types = ", ".join(str(f) for f in files)
-        # VALUES and EXISTS are ridiculous in sqlalchemy, using raw sql for this
-        query = (
-            "WITH all_values AS(SELECT * FROM(VALUES (" + fail_string + ")) as all_flexs(row_number)) " +
-            "SELECT * " +
-            "FROM flex_field " +
-            "WHERE submission_id = " + str(submission_id) +
-            " AND file_type_id IN (" + file_types + ")" +
-            " AND EXISTS (SELECT * FROM all_values WHERE flex_field.row_number = all_values.row_number)"
-        )
-        query_result = sess.execute(query)
-        for flex_field in query_result:
-            flex_data[flex_field.row_number].append(flex_field)
-    return flex_data
+class FlexFieldCache:
+    """ Flex fields of the rows of a job, or of some of the files of a submission, kept in memory as rules need them.
+        The flex fields of a recently failed row are fetched once however many rules it fails, and not at all if there
+        are none
+    """
+    def __init__(self, *criteria, max_rows=None):
+        """ Create the cache
+
+        Args:
+            criteria: SQLAlchemy filters picking the flex fields to look in
+            max_rows: number of rows whose flex fields are kept, the least recently used being dropped first. Defaults
+                to the flex_field_cache_rows config value
+        """
+        self.criteria = criteria
+        self.max_rows = max_rows or CONFIG_SERVICES.get('flex_field_cache_rows') or 50000
+        # row number to list of flex fields, for the rows with any that have been looked up most recently
+        self.flex_data = OrderedDict()
+        self.has_flex = None
+
+    @classmethod
+    def for_job(cls, job_id, max_rows=None):
+        """ Cache of the flex fields of a job's file """
+        return cls(FlexField.job_id == job_id, max_rows=max_rows)
+
+    @classmethod
+    def for_files(cls, submission_id, file_type_ids, max_rows=None):
+        """ Cache of the flex fields of the given files of a submission, for cross-file rules """
+        return cls(FlexField.submission_id == submission_id, FlexField.file_type_id.in_(file_type_ids),
+                   max_rows=max_rows)
+
+    def fetch(self, failures):
+        """ Get the flex fields of the rows that failed a rule
+
+        Args:
+            failures: failed rows of the rule, with row numbers in their row_number column
+
+        Returns:
+            dict mapping row numbers of the failures to lists of flex fields, empty lists for rows without any
+        """
+        sess = GlobalDB.db().session
+        if self.has_flex is None:
+            self.has_flex = sess.query(sess.query(FlexField).filter(*self.criteria).exists()).scalar()
+        if not self.has_flex:
+            return defaultdict(list)
+
+        # only look up rows that aren't cached, there is at least one rule that returns NULL for row_number
+        row_numbers = {failure['row_number'] for failure in failures if failure['row_number']}
+        flex_data = defaultdict(list)
+        for row_number in row_numbers.intersection(self.flex_data):
+            self.flex_data.move_to_end(row_number)
+            flex_data[row_number] = self.flex_data[row_number]
+
+        missing = sorted(row_numbers.difference(flex_data))
+        if missing:
+            # the row numbers are passed as a single array rather than a huge list of values
+            query = select([FlexField.__table__]).\
+                where(and_(FlexField.row_number == any_(bindparam('rows', type_=ARRAY(Integer))), *self.criteria)).\
+                order_by(FlexField.flex_field_id)
+            fetched = defaultdict(list)
+            for flex_field in sess.execute(query, {'rows': missing}):
+                fetched[flex_field.row_number].append(flex_field)
+            # rows without flex fields aren't kept, so the cache only holds rows there is something to reuse for
+            flex_data.update(fetched)
+            self.flex_data.update(fetched)
+
+        while len(self.flex_data) > self.max_rows:
+            self.flex_data.popitem(last=False)
+        return flex_data
 
 
 def failure_row_to_tuple(rule, flex_data, cols, col_headers, file_id, sql_failure):
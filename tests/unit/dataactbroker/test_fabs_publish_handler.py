@@ -0,0 +1,195 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+import random
+
+from dataactbroker.handlers.fabsPublishHandler import (move_certified_fabs_files, publish_derived_fabs_rows,
+                                                       publish_fabs_rows)
+from dataactcore.interfaces.referenceCache import clear_reference_data
+from dataactcore.models.jobModels import CertifiedFilesHistory, FileType, JobStatus, JobType
+from dataactcore.models.stagingModels import PublishedAwardFinancialAssistance
+from tests.unit.dataactcore.factories.domain import (
+    CGACFactory, FRECFactory, SubTierAgencyFactory, StatesFactory, CountyCodeFactory, CFDAProgramFactory,
+    ZipCityFactory, ZipsFactory, CityCodeFactory, CountryCodeFactory)
+from tests.unit.dataactcore.factories.job import CertifyHistoryFactory, JobFactory, SubmissionFactory
+from tests.unit.dataactcore.factories.staging import (DetachedAwardFinancialAssistanceFactory,
+                                                      FPDSContractingOfficeFactory,
+                                                      PublishedAwardFinancialAssistanceFactory)
+
+# columns set when the rows are published rather than derived
+PUBLISH_TIME_COLUMNS = ('published_award_financial_assistance_id', 'created_at', 'updated_at', 'modified_at')
+
+
+def initialize_db_values(sess):
+    """ Reference data covering each way the derivations look values up, with duplicates where tables allow them """
+    cgac = CGACFactory(cgac_code='097', agency_name='CGAC Agency')
+    frec = FRECFactory(frec_code='1137', agency_name='FREC Agency', cgac=cgac)
+    sess.add_all([cgac, frec])
+    sess.commit()
+
+    sess.add_all([
+        SubTierAgencyFactory(sub_tier_agency_code='1234', sub_tier_agency_name='CGAC Sub Tier', cgac=cgac, frec=frec,
+                             is_frec=False),
+        SubTierAgencyFactory(sub_tier_agency_code='4321', sub_tier_agency_name='FREC Sub Tier', cgac=cgac, frec=frec,
+                             is_frec=True),
+        CFDAProgramFactory(program_number=12.345, program_title='First Program'),
+        CFDAProgramFactory(program_number=12.345, program_title='Second Program'),
+        CFDAProgramFactory(program_number=10.1, program_title=None),
+        StatesFactory(state_code='NY', state_name='New York'),
+        StatesFactory(state_code='VA', state_name='Virginia'),
+        CountyCodeFactory(state_code='NY', county_number='001', county_name='Albany'),
+        CountyCodeFactory(state_code='NY', county_number='002', county_name='Bronx'),
+        CountyCodeFactory(state_code='VA', county_number='003', county_name='Fairfax'),
+        ZipCityFactory(zip_code='12345', city_name='Test Zip City'),
+        ZipCityFactory(zip_code='54321', city_name='Other Zip City'),
+        ZipCityFactory(zip_code='98765', city_name='No County City'),
+        ZipCityFactory(zip_code='11111', city_name='One District City'),
+        ZipsFactory(zip5='12345', zip_last4='6789', state_abbreviation='NY', county_number='001',
+                    congressional_district_no='01'),
+        ZipsFactory(zip5='12345', zip_last4='4321', state_abbreviation='NY', county_number='001',
+                    congressional_district_no='02'),
+        ZipsFactory(zip5='12345', zip_last4='1111', state_abbreviation='NY', county_number='002',
+                    congressional_district_no=None),
+        ZipsFactory(zip5='54321', zip_last4='4321', state_abbreviation='VA', county_number='003',
+                    congressional_district_no='05'),
+        ZipsFactory(zip5='98765', zip_last4='0001', state_abbreviation='NY', county_number='009',
+                    congressional_district_no=None),
+        ZipsFactory(zip5='98765', zip_last4='0002', state_abbreviation='NY', county_number='009',
+                    congressional_district_no=None),
+        ZipsFactory(zip5='11111', zip_last4='2222', state_abbreviation='VA', county_number='003',
+                    congressional_district_no='07'),
+        CityCodeFactory(city_code='00001', state_code='NY', feature_name='Test City', county_number='001',
+                        county_name='Albany'),
+        CityCodeFactory(city_code='00002', state_code='VA', feature_name='Fairfax City', county_number='003',
+                        county_name='Fairfax'),
+        CityCodeFactory(city_code='00003', state_code='ny', feature_name='test zip city', county_number='001',
+                        county_name='Albany'),
+        CityCodeFactory(city_code='00004', state_code='NY', feature_name='Test Zip City', county_number='001',
+                        county_name='Albany'),
+        CityCodeFactory(city_code='00005', state_code='VA', feature_name='ONE DISTRICT CITY', county_number='003',
+                        county_name='Fairfax'),
+        FPDSContractingOfficeFactory(contracting_office_code='033103', contracting_office_name='Office'),
+        FPDSContractingOfficeFactory(contracting_office_code='033103', contracting_office_name='Duplicate Office'),
+        FPDSContractingOfficeFactory(contracting_office_code='ABC123', contracting_office_name='Upper Office'),
+        CountryCodeFactory(country_code='USA', country_name='United States of America'),
+        CountryCodeFactory(country_code='CAN', country_name='Canada')
+    ])
+    sess.commit()
+
+
+def random_row(rand, afa_generated_unique, correction_late_delete_ind):
+    """ Values of a submitted row that the derivations can handle, chosen at random """
+    record_type = rand.choice((1, 2))
+    if record_type == 1:
+        ppop_code = rand.choice(('NY**001', 'ny**002', 'VA**003'))
+    else:
+        ppop_code = rand.choice(('00*****', '00forgn', 'NY**001', 'VA**003', 'NY00001', 'va00002', 'NY00000',
+                                 'NYABCDE', 'NY'))
+    return {
+        'afa_generated_unique': afa_generated_unique,
+        'correction_late_delete_ind': correction_late_delete_ind,
+        'record_type': record_type,
+        'action_date': rand.choice(('20170115', '2017-02-28', '03/31/2017')),
+        'place_of_performance_code': ppop_code,
+        'place_of_performance_zip4a': rand.choice((None, '', 'city-wide', '12345', '123456789', '123454321',
+                                                   '123450000', '543214321', '98765', '987650002', '11111',
+                                                   '111112222')),
+        'place_of_performance_congr': rand.choice((None, '', '03')),
+        'legal_entity_zip5': rand.choice((None, '', '12345', '54321', '98765', '11111')),
+        'legal_entity_zip_last4': rand.choice((None, '', '6789', '1111', '4321', '0000')),
+        'federal_action_obligation': rand.choice((None, Decimal('0'), Decimal('1234.56'))),
+        'non_federal_funding_amount': rand.choice((None, Decimal('-20.01'), Decimal('7'))),
+        'cfda_number': rand.choice((None, '12.345', '12.3450', '10.1', '99.999', 'twelve')),
+        'awarding_sub_tier_agency_c': rand.choice((None, '', '1234', '4321')),
+        'funding_sub_tier_agency_co': rand.choice((None, '', '1234', '4321')),
+        'awarding_office_code': rand.choice((None, '', '033103', 'abc123', 'ABC123', 'ZZZ999')),
+        'funding_office_code': rand.choice((None, '', '033103', 'abc123', 'ABC123', 'ZZZ999')),
+        'place_of_perform_country_c': rand.choice((None, '', 'USA', 'can', 'XYZ')),
+        'legal_entity_country_code': rand.choice((None, '', 'usa', 'CAN', 'XYZ'))
+    }
+
+
+def published_rows(sess):
+    """ Every published row, in a stable order, leaving out the values set at the time of publishing """
+    columns = [column for column in PublishedAwardFinancialAssistance.__table__.columns
+               if column.name not in PUBLISH_TIME_COLUMNS]
+    return sorted((tuple(row) for row in sess.query(*columns)), key=repr)
+
+
+def test_publish_fabs_rows(database):
+    """ Publishing a submission's rows in the database gives the same rows as running them through fabs_derivations
+        one at a time, including rows correcting or deleting both earlier submissions and earlier rows of their own """
+    sess = database.session
+    clear_reference_data()
+    rand = random.Random(22)
+    initialize_db_values(sess)
+
+    sub, other_sub = SubmissionFactory(d2_submission=True), SubmissionFactory(d2_submission=True)
+    sess.add_all([sub, other_sub])
+    sess.flush()
+    for afa_generated_unique, is_active in (('PUB1', True), ('PUB2', True), ('PUB3', True), ('PUB4', True),
+                                            ('PUB4', False), ('UNTOUCHED', True)):
+        sess.add(PublishedAwardFinancialAssistanceFactory(afa_generated_unique=afa_generated_unique,
+                                                          is_active=is_active, submission_id=other_sub.submission_id))
+
+    # awards published before are only corrected or deleted, while awards new to the broker can be submitted more
+    # than once and then corrected or deleted within the same submission
+    awards = [('PUB1', 'C'), ('PUB2', 'd'), ('PUB3', 'C'), ('PUB3', 'c'), ('PUB4', 'D'), ('PUB4', 'C'), ('NEW1', None),
+              ('NEW1', 'C'), ('NEW2', ''), ('NEW2', None), ('NEW3', 'D'), ('NEW4', None), ('NEW4', 'd'),
+              ('NEW4', 'C')]
+    awards += [('NEW{}'.format(number), rand.choice((None, '', 'C', 'D'))) for number in range(5, 120)]
+    valid_rows = 0
+    for row_number, (afa_generated_unique, correction_late_delete_ind) in enumerate(awards, start=2):
+        is_valid = rand.random() > 0.05
+        valid_rows += is_valid
+        sess.add(DetachedAwardFinancialAssistanceFactory(
+            submission_id=sub.submission_id, row_number=row_number, is_valid=is_valid,
+            **random_row(rand, afa_generated_unique, correction_late_delete_ind)))
+    sess.add(DetachedAwardFinancialAssistanceFactory(submission_id=other_sub.submission_id, is_valid=True,
+                                                     **random_row(rand, 'PUB1', 'C')))
+    sess.commit()
+
+    agency_codes = publish_fabs_rows(sess, sub.submission_id)
+    sess.flush()
+    published = published_rows(sess)
+    sess.rollback()
+
+    expected_agency_codes = publish_derived_fabs_rows(sess, sub.submission_id)
+    sess.flush()
+    expected = published_rows(sess)
+    sess.rollback()
+
+    # every valid row is published alongside the 6 published before
+    assert len(expected) == valid_rows + 6
+    assert published == expected
+    assert set(agency_codes) == set(expected_agency_codes)
+
+
+def test_move_certified_fabs_files(database, job_constants, mock_broker_config_paths):
+    """ A published FABS submission is certified with a file of its published rows in place of its uploaded file,
+        written without needing a request's context """
+    sess = database.session
+    sub = SubmissionFactory(d2_submission=True, cgac_code='097', frec_code=None)
+    sess.add(sub)
+    sess.flush()
+    certify_history = CertifyHistoryFactory(submission_id=sub.submission_id, created_at=datetime(2017, 3, 4))
+    upload_job = JobFactory(submission_id=sub.submission_id, filename='/path/to/fabs.csv',
+                            file_type=sess.query(FileType).filter_by(name='detached_award').one(),
+                            job_type=sess.query(JobType).filter_by(name='file_upload').one(),
+                            job_status=sess.query(JobStatus).filter_by(name='finished').one())
+    sess.add_all([certify_history, upload_job,
+                  PublishedAwardFinancialAssistanceFactory(submission_id=sub.submission_id, fain='FAIN1',
+                                                           is_active=True),
+                  PublishedAwardFinancialAssistanceFactory(fain='OTHER', is_active=True)])
+    sess.commit()
+
+    move_certified_fabs_files(sess, sub, certify_history, True)
+
+    file_history = sess.query(CertifiedFilesHistory).filter_by(certify_history_id=certify_history.certify_history_id).\
+        one()
+    assert file_history.file_type_id == upload_job.file_type_id
+    assert file_history.filename.startswith(str(mock_broker_config_paths['broker_files']))
+    assert file_history.warning_filename is None
+    with open(file_history.filename) as published_file:
+        rows = list(csv.DictReader(published_file))
+    assert [row['fain'] for row in rows] == ['FAIN1']
@@ -1,5 +1,8 @@
 from collections import OrderedDict
+from contextlib import contextmanager
 import csv
+from decimal import Decimal
+import io
 import os
 import re
 from unittest.mock import Mock
@@ -8,6 +11,7 @@ from dataactcore.models.jobModels import FileType, JobStatus, JobType
 from dataactcore.models.stagingModels import DetachedAwardProcurement, PublishedAwardFinancialAssistance
 from dataactcore.utils import fileE
 from dataactbroker.handlers import fileGenerationHandler
+from dataactvalidator.filestreaming import csv_selection
 from tests.unit.dataactcore.factories.staging import (AwardFinancialAssistanceFactory, AwardProcurementFactory,
                                                       DetachedAwardProcurementFactory,
                                                       PublishedAwardFinancialAssistanceFactory)
@@ -47,8 +51,9 @@ def test_generate_d1_file_query(monkeypatch, mock_broker_config_paths, database,
     assert file_rows[0] == [key for key in fileGenerationHandler.fileD1.mapping]
 
     # check body
-    dap_one = database.session.query(DetachedAwardProcurement).filter_by(detached_award_proc_unique='unique2').first()
-    dap_two = database.session.query(DetachedAwardProcurement).filter_by(detached_award_proc_unique='unique1').first()
+    # rows are written in the order they were loaded
+    dap_one = database.session.query(DetachedAwardProcurement).filter_by(detached_award_proc_unique='unique1').first()
+    dap_two = database.session.query(DetachedAwardProcurement).filter_by(detached_award_proc_unique='unique2').first()
     expected1, expected2 = [], []
     for value in fileGenerationHandler.fileD1.db_columns:
         # loop through all values and format date columns
@@ -91,8 +96,9 @@ def test_generate_d2_file_query(monkeypatch, mock_broker_config_paths, database,
     assert file_rows[0] == [key for key in fileGenerationHandler.fileD2.mapping]
 
     # check body
-    pafa1 = database.session.query(PublishedAwardFinancialAssistance).filter_by(afa_generated_unique='unique2').first()
-    pafa2 = database.session.query(PublishedAwardFinancialAssistance).filter_by(afa_generated_unique='unique1').first()
+    # rows are written in the order they were published
+    pafa1 = database.session.query(PublishedAwardFinancialAssistance).filter_by(afa_generated_unique='unique1').first()
+    pafa2 = database.session.query(PublishedAwardFinancialAssistance).filter_by(afa_generated_unique='unique2').first()
     expected1, expected2 = [], []
     for value in fileGenerationHandler.fileD2.db_columns:
         # loop through all values and format date columns
@@ -107,6 +113,80 @@ def test_generate_d2_file_query(monkeypatch, mock_broker_config_paths, database,
     assert file_rows[2] == expected2
 
 
+def test_generate_d2_file_pages(monkeypatch, mock_broker_config_paths, database, job_constants):
+    """Rows are streamed to the file a page at a time, each row written once in the order it was published"""
+    monkeypatch.setattr(csv_selection, 'QUERY_SIZE', 2)
+    pafa = PublishedAwardFinancialAssistanceFactory
+    database.session.add_all([pafa(awarding_agency_code='123', action_date=action_date, fain=fain, is_active=True)
+                              for fain, action_date in (('C', '20170103'), ('A', '20170101'), ('E', '20170105'),
+                                                        ('B', '20170102'), ('D', '20170104'))])
+    job = JobFactory(
+        job_status=database.session.query(JobStatus).filter_by(name='running').one(),
+        job_type=database.session.query(JobType).filter_by(name='file_upload').one(),
+        file_type=database.session.query(FileType).filter_by(name='award').one(),
+    )
+    database.session.add(job)
+    database.session.commit()
+
+    file_path = str(mock_broker_config_paths['d_file_storage_path'].join('d2'))
+    fileGenerationHandler.generate_d_file('D2', '123', '01/01/2017', '01/31/2017', job.job_id, 'd2', is_local=True)
+
+    fain_index = fileGenerationHandler.fileD2.db_columns.index('fain')
+    assert [row[fain_index] for row in read_file_rows(file_path)[1:]] == ['C', 'A', 'E', 'B', 'D']
+
+
+def test_d_file_export_engines(monkeypatch, mock_broker_config_paths, database, job_constants):
+    """Copying D files from the database writes the same bytes as writing their rows with csv.writer, locally or to
+    S3, but for COPY quoting values containing a carriage return"""
+    values = [None, '', 'plain', 'comma, separated', 'say "hi"', 'two\nlines', ' leading space', '\\N', 'a\rb']
+    amounts = [None, Decimal('0.0000000'), Decimal('0.00000012'), Decimal('-0.000000120'), Decimal('0.0000010'),
+               Decimal('-12.50'), Decimal('1234.5'), Decimal('0'), Decimal('100000000.0000000')]
+    for index, (value, amount) in enumerate(zip(values, amounts)):
+        database.session.add_all([
+            DetachedAwardProcurementFactory(awarding_agency_code='123', action_date='20170115',
+                                            detached_award_proc_unique='unique{}'.format(index), piid=value,
+                                            award_description=value, federal_action_obligation=amount),
+            PublishedAwardFinancialAssistanceFactory(awarding_agency_code='123', action_date='20170115', fain=value,
+                                                     award_description=value, is_active=True, record_type=index,
+                                                     federal_action_obligation=amount,
+                                                     non_federal_funding_amount=amount,
+                                                     face_value_loan_guarantee=amount,
+                                                     original_loan_subsidy_cost=amount)
+        ])
+    database.session.commit()
+
+    s3_files = {}
+
+    @contextmanager
+    def s3_file(handler, mode):
+        s3_files[handler] = io.BytesIO()
+        yield s3_files[handler]
+
+    monkeypatch.setattr(csv_selection.smart_open, 'smart_open', s3_file)
+    monkeypatch.setattr(csv_selection.S3Handler, 'create_file_path', lambda upload_name: upload_name)
+
+    def export(file_utils, engine, is_local):
+        monkeypatch.setattr(csv_selection, 'CONFIG_SERVICES', {'d_file_export_engine': engine} if engine else {})
+        file_path = str(mock_broker_config_paths['d_file_storage_path'].join(engine or 'default'))
+        query = file_utils.query_data(database.session, '123', '01/01/2017', '01/31/2017')
+        csv_selection.write_query_to_file(file_path, engine, list(file_utils.mapping), 'D', is_local, query)
+        if not is_local:
+            return s3_files[engine].getvalue()
+        with open(file_path, 'rb') as csv_file:
+            return csv_file.read()
+
+    for file_utils in (fileGenerationHandler.fileD1, fileGenerationHandler.fileD2):
+        expected = export(file_utils, 'csv', True)
+        assert b'0E-7' in expected and b'1.2E-7' in expected and b'-1.20E-7' in expected
+        # csv.writer remains the engine where none is configured
+        assert export(file_utils, None, True) == expected
+        for is_local in (True, False):
+            copied = export(file_utils, 'copy', is_local)
+            assert len(list(csv.reader(io.StringIO(copied.decode(), newline='')))) == len(values) + 1
+            assert copied != expected
+            assert copied.replace(b'"a\rb"', b'a\rb') == expected
+
+
 def test_generate_f_file(monkeypatch, mock_broker_config_paths):
     """A CSV with fields in the right order should be written to the file system"""
     file_f_mock = Mock()
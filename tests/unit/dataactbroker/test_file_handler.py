@@ -7,13 +7,17 @@ import pytest
 
 import calendar
 
-from dataactbroker.handlers import fileHandler
-from dataactcore.models.jobModels import JobStatus, JobType, FileType, CertifiedFilesHistory
+from dataactbroker.handlers import fabsPublishHandler, fileHandler
+from dataactcore.models.jobModels import Job, JobStatus, JobType, FileType, CertifiedFilesHistory
+from dataactcore.models.lookups import PUBLISH_STATUS_DICT
+from dataactcore.models.stagingModels import PublishedAwardFinancialAssistance
 from dataactcore.utils.responseException import ResponseException
 from tests.unit.dataactbroker.utils import add_models, delete_models
 from tests.unit.dataactcore.factories.domain import CGACFactory
 from tests.unit.dataactcore.factories.job import (JobFactory, SubmissionFactory, CertifyHistoryFactory,
                                                   SubmissionNarrativeFactory, CertifiedFilesHistoryFactory)
+from tests.unit.dataactcore.factories.staging import (DetachedAwardFinancialAssistanceFactory,
+                                                      PublishedAwardFinancialAssistanceFactory)
 from tests.unit.dataactcore.factories.user import UserFactory
 
 
@@ -571,3 +575,92 @@ def test_file_history_url(database, monkeypatch):
     json_response = fileHandler.file_history_url(sub, file_hist.certified_files_history_id, False, False)
     url = json.loads(json_response.get_data().decode('utf-8'))["url"]
     assert url == 'some/url/here.csv'
+
+
+def publish_response(json_response):
+    assert json_response.status_code == 200
+    return json.loads(json_response.get_data().decode('UTF-8'))
+
+
+def test_submit_detached_file_queues_publish(database, job_constants, monkeypatch):
+    """ Publishing a FABS submission hands it to a publish job, which derives and publishes its valid rows while its
+        progress can be checked """
+    sess = database.session
+    user = UserFactory()
+    sub = SubmissionFactory(d2_submission=True, publish_status_id=PUBLISH_STATUS_DICT['unpublished'])
+    sess.add_all([user, sub])
+    sess.commit()
+    sess.add_all([DetachedAwardFinancialAssistanceFactory(submission_id=sub.submission_id, is_valid=is_valid,
+                                                          action_date='20170101', correction_late_delete_ind=None)
+                  for is_valid in (True, True, False)])
+    # the upload's validation counts the header along with the rows
+    sess.add(JobFactory(submission_id=sub.submission_id, number_of_rows=4,
+                        job_type=sess.query(JobType).filter_by(name='csv_record_validation').one(),
+                        job_status=sess.query(JobStatus).filter_by(name='finished').one(),
+                        file_type=sess.query(FileType).filter_by(name='detached_award').one()))
+    sess.commit()
+    assert fileHandler.submission_to_dict_for_status(sub)['number_of_rows'] == 4
+
+    queue = Mock()
+    monkeypatch.setattr(fileHandler, 'g', Mock(user=user))
+    monkeypatch.setattr(fileHandler, 'sqs_queue', Mock(return_value=queue))
+    response = publish_response(fileHandler.FileHandler.submit_detached_file(sub))
+
+    publish_job = sess.query(Job).filter_by(job_id=response['job_id']).one()
+    assert publish_job.job_type_name == 'fabs_publish'
+    assert publish_job.job_status_name == 'ready'
+    assert publish_job.number_of_rows == 2
+    assert sub.publish_status_id == PUBLISH_STATUS_DICT['publishing']
+    assert fileHandler.submission_to_dict_for_status(sub)['number_of_rows'] == 4
+    queue.send_message.assert_called_once_with(MessageBody=str(publish_job.job_id))
+    with pytest.raises(ResponseException) as e:
+        fileHandler.FileHandler.submit_detached_file(sub)
+    assert str(e.value) == 'Submission is already publishing'
+
+    move_certified_fabs_files = Mock()
+    monkeypatch.setattr(fabsPublishHandler, 'move_certified_fabs_files', move_certified_fabs_files)
+    fabsPublishHandler.publish_fabs_submission(publish_job, True)
+
+    assert sub.publish_status_id == PUBLISH_STATUS_DICT['published']
+    assert sub.certifying_user_id == user.user_id
+    assert sess.query(PublishedAwardFinancialAssistance).filter_by(submission_id=sub.submission_id).count() == 2
+    assert move_certified_fabs_files.call_count == 1
+    status = publish_response(fileHandler.get_fabs_publish_status(sub))
+    assert status == {'submission_id': sub.submission_id, 'publish_status': 'published',
+                      'job_id': publish_job.job_id, 'job_status': 'finished', 'total_rows': 2, 'rows_derived': 2,
+                      'rows_inserted': 2, 'message': ''}
+    assert fileHandler.submission_to_dict_for_status(sub)['number_of_rows'] == 4
+
+    # receiving the job again doesn't publish the rows twice
+    fabsPublishHandler.publish_fabs_submission(publish_job, True)
+    assert sess.query(PublishedAwardFinancialAssistance).filter_by(submission_id=sub.submission_id).count() == 2
+
+
+def test_publish_fabs_submission_collision(database, job_constants, monkeypatch):
+    """ A publish job finding rows that were published by another submission in the meantime leaves the submission
+        unpublished, reporting why """
+    sess = database.session
+    user = UserFactory()
+    sub = SubmissionFactory(d2_submission=True, publish_status_id=PUBLISH_STATUS_DICT['publishing'])
+    sess.add_all([user, sub])
+    sess.commit()
+    publish_job = JobFactory(submission_id=sub.submission_id, user_id=user.user_id,
+                             job_type=sess.query(JobType).filter_by(name='fabs_publish').one(),
+                             job_status=sess.query(JobStatus).filter_by(name='running').one(),
+                             file_type=sess.query(FileType).filter_by(name='detached_award').one(),
+                             number_of_rows=1)
+    sess.add_all([publish_job,
+                  DetachedAwardFinancialAssistanceFactory(submission_id=sub.submission_id, is_valid=True,
+                                                          afa_generated_unique='AWARD', action_date='20170101',
+                                                          correction_late_delete_ind=None),
+                  PublishedAwardFinancialAssistanceFactory(afa_generated_unique='AWARD', is_active=True)])
+    sess.commit()
+
+    fabsPublishHandler.publish_fabs_submission(publish_job, True)
+
+    assert sub.publish_status_id == PUBLISH_STATUS_DICT['unpublished']
+    status = publish_response(fileHandler.get_fabs_publish_status(sub))
+    assert status['job_status'] == 'failed'
+    assert status['rows_inserted'] == 0
+    assert status['message'] == fabsPublishHandler.COLLIDING_ROWS_MESSAGE
+    assert sess.query(PublishedAwardFinancialAssistance).count() == 1
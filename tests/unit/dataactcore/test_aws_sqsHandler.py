@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from dataactcore.aws.sqsHandler import SQSMockQueue
+
+
+@pytest.fixture
+def queue(database):
+    SQSMockQueue.purge()
+    yield SQSMockQueue
+    SQSMockQueue.purge()
+
+
+def bodies(messages):
+    return [message.body for message in messages]
+
+
+def test_receive_batches(queue):
+    """Messages are received in the order they were sent, up to the number asked for"""
+    for job_id in (3, 1, 2):
+        queue.send_message(MessageBody=str(job_id))
+
+    assert bodies(queue.receive_messages(WaitTimeSeconds=0)) == [3]
+    assert bodies(queue.receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=10)) == [1, 2]
+    assert queue.receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=10) == []
+    with pytest.raises(ValueError):
+        queue.receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=11)
+
+
+def test_visibility(queue):
+    """Received messages are hidden until their visibility timeout runs out, or they're released or deleted"""
+    for job_id in (1, 2, 3):
+        queue.send_message(MessageBody=str(job_id))
+    first, second, third = queue.receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=3, VisibilityTimeout=0.2)
+
+    first.change_visibility(VisibilityTimeout=0)
+    second.change_visibility(VisibilityTimeout=60)
+    third.delete()
+    assert bodies(queue.receive_messages(WaitTimeSeconds=0, MaxNumberOfMessages=3)) == [1]
+
+    time.sleep(0.3)
+    assert queue.receive_messages(WaitTimeSeconds=0) == []
+    second.change_visibility(VisibilityTimeout=0)
+    assert bodies(queue.receive_messages(WaitTimeSeconds=0)) == [2]
+
+
+def test_long_poll(queue):
+    """Receives wait for a message to become visible"""
+    queue.send_message(MessageBody='1')
+    message, = queue.receive_messages(WaitTimeSeconds=0, VisibilityTimeout=0.5)
+
+    start = time.time()
+    assert bodies(queue.receive_messages(WaitTimeSeconds=2)) == [1]
+    assert 0.4 < time.time() - start < 2
+
+    start = time.time()
+    assert queue.receive_messages(WaitTimeSeconds=1) == []
+    assert time.time() - start >= 1
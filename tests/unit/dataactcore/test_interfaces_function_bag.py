@@ -0,0 +1,67 @@
+from collections import namedtuple
+import hashlib
+
+import pytest
+
+from dataactcore.interfaces import function_bag
+from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.jobModels import FileType, JobStatus, JobType
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+UploadFile = namedtuple('UploadFile', ['file_type', 'upload_name', 'file_name', 'file_letter'])
+
+
+@pytest.fixture
+def validated_file(database, job_constants, tmpdir, monkeypatch):
+    """ An appropriations file of an existing submission, validated before with its validation reused when unchanged """
+    sess = database.session
+    monkeypatch.setattr(function_bag, 'CONFIG_SERVICES', {'reuse_unchanged_validations': True})
+    monkeypatch.setitem(function_bag.CONFIG_BROKER, 'use_aws', False)
+
+    csv_file = tmpdir.join('appropriations.csv')
+    csv_file.write('a,b\n1,2\n')
+    sub = SubmissionFactory()
+    sess.add(sub)
+    sess.flush()
+    file_type = sess.query(FileType).filter_by(name='appropriations').one()
+    finished = sess.query(JobStatus).filter_by(name='finished').one()
+    upload_job = JobFactory(submission_id=sub.submission_id, file_type=file_type, job_status=finished,
+                            job_type=sess.query(JobType).filter_by(name='file_upload').one())
+    val_job = JobFactory(submission_id=sub.submission_id, file_type=file_type, job_status=finished,
+                         job_type=sess.query(JobType).filter_by(name='csv_record_validation').one(),
+                         filename=str(csv_file), number_of_rows=2, validation_hash='fingerprint',
+                         file_hash=hashlib.sha256(b'a,b\n1,2\n').hexdigest())
+    sess.add_all([upload_job, val_job])
+    sess.flush()
+    sess.add(ErrorMetadata(job_id=val_job.job_id, occurrences=1))
+    sess.commit()
+    return sub, val_job, csv_file
+
+
+def upload_again(sub, csv_file):
+    function_bag.add_jobs_for_uploaded_file(UploadFile('appropriations', str(csv_file), 'appropriations.csv', 'A'),
+                                            sub.submission_id, True)
+
+
+def test_upload_unchanged_file(database, validated_file):
+    """ Uploading the same file again keeps the results of its last validation for the validator to reuse """
+    sub, val_job, csv_file = validated_file
+    upload_again(sub, csv_file)
+
+    assert val_job.number_of_rows == 2
+    assert val_job.validation_hash == 'fingerprint'
+    assert database.session.query(ErrorMetadata).filter_by(job_id=val_job.job_id).count() == 1
+
+
+@pytest.mark.parametrize('use_aws, contents', [(False, 'a,b\n1,3\n'), (True, 'a,b\n1,2\n')])
+def test_upload_changed_file(database, validated_file, monkeypatch, use_aws, contents):
+    """ Uploading a changed file, or one that can't be checked yet, resets the results of the last validation """
+    sub, val_job, csv_file = validated_file
+    monkeypatch.setitem(function_bag.CONFIG_BROKER, 'use_aws', use_aws)
+    changed_file = csv_file.dirpath().join('changed.csv')
+    changed_file.write(contents)
+    upload_again(sub, changed_file)
+
+    assert val_job.number_of_rows is None
+    assert val_job.validation_hash is None
+    assert database.session.query(ErrorMetadata).filter_by(job_id=val_job.job_id).count() == 0
@@ -0,0 +1,87 @@
+import pytest
+
+from dataactcore.interfaces.referenceCache import (ReferenceData, ZipInfo, bump_reference_version, clear_reference_data,
+                                                   get_reference_data, reference_versions)
+from dataactcore.models.domainModels import States, Zips
+from tests.unit.dataactcore.factories.domain import (CGACFactory, CityCodeFactory, FRECFactory, StatesFactory,
+                                                     SubTierAgencyFactory, ZipsFactory)
+
+
+@pytest.fixture
+def reference_cache(database):
+    clear_reference_data()
+    yield database.session
+    clear_reference_data()
+
+
+def test_get_reference_data(reference_cache):
+    """ Reference data is kept until one of its tables is bumped """
+    sess = reference_cache
+    sess.add(StatesFactory(state_code='NY', state_name='New York'))
+    sess.commit()
+
+    reference_data = get_reference_data(sess)
+    assert reference_data.states == {'NY': 'New York'}
+
+    sess.add(StatesFactory(state_code='VA', state_name='Virginia'))
+    sess.commit()
+    assert get_reference_data(sess) is reference_data
+
+    bump_reference_version(sess, States)
+    bump_reference_version(sess, States, Zips)
+    sess.commit()
+    assert reference_versions(sess) == {'states': 2, 'zips': 1}
+    reference_data = get_reference_data(sess)
+    assert reference_data.states == {'NY': 'New York', 'VA': 'Virginia'}
+    assert get_reference_data(sess) is reference_data
+
+
+def test_reference_data_lookups(database):
+    sess = database.session
+    cgac = CGACFactory(cgac_code='097', agency_name='CGAC Agency')
+    frec = FRECFactory(frec_code='1137', agency_name='FREC Agency', cgac=cgac)
+    sess.add_all([cgac, frec])
+    sess.commit()
+    sess.add_all([SubTierAgencyFactory(sub_tier_agency_code='1234', sub_tier_agency_name='CGAC Sub Tier', cgac=cgac,
+                                       frec=frec, is_frec=False),
+                  SubTierAgencyFactory(sub_tier_agency_code='4321', sub_tier_agency_name='FREC Sub Tier', cgac=cgac,
+                                       frec=frec, is_frec=True),
+                  SubTierAgencyFactory(sub_tier_agency_code='5678', sub_tier_agency_name='No FREC Sub Tier', cgac=cgac,
+                                       frec=None, is_frec=True),
+                  CityCodeFactory(feature_name='Test City', city_code='00001', state_code='NY')])
+    sess.commit()
+
+    reference_data = ReferenceData(sess)
+    assert reference_data.sub_tiers['1234'] == ('CGAC Sub Tier', '097', 'CGAC Agency')
+    assert reference_data.sub_tiers['4321'] == ('FREC Sub Tier', '1137', 'FREC Agency')
+    assert reference_data.sub_tiers['5678'] == ('No FREC Sub Tier', None, None)
+    assert reference_data.city_code(' test CITY', 'ny ') == '00001'
+    assert reference_data.city_code('Other City', 'NY') is None
+
+
+def test_zip_info(database):
+    """ Zip codes are looked up once and kept, including those that don't exist """
+    sess = database.session
+    sess.add_all([ZipsFactory(zip5='12345', zip_last4='6789', state_abbreviation='NY', county_number='001',
+                              congressional_district_no='01'),
+                  ZipsFactory(zip5='12345', zip_last4='4321', state_abbreviation='NY', county_number='001',
+                              congressional_district_no='02'),
+                  ZipsFactory(zip5='12345', zip_last4='1111', state_abbreviation='NY', county_number='001',
+                              congressional_district_no=None)])
+    sess.commit()
+
+    reference_data = ReferenceData(sess)
+    assert reference_data.zip9_info(sess, '12345', '4321') == ZipInfo('NY', '001', '02')
+    assert reference_data.zip9_info(sess, '12345', '0000') is None
+    assert reference_data.zip5_info(sess, '12345') == (ZipInfo('NY', '001', '01'), 3)
+    assert reference_data.zip5_info(sess, '54321') == (None, 0)
+
+    sess.query(Zips).delete()
+    sess.commit()
+    assert reference_data.zip9_info(sess, '12345', '4321') == ZipInfo('NY', '001', '02')
+    assert reference_data.zip5_info(sess, '12345') == (ZipInfo('NY', '001', '01'), 3)
+
+    # the cache is emptied when it's full
+    reference_data.zip_cache_size = 2
+    assert reference_data.zip5_info(sess, '99999') == (None, 0)
+    assert reference_data.zip5_info(sess, '12345') == (None, 0)
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+from dataactcore.interfaces import stagingPartitions
+from dataactcore.models.stagingModels import Appropriation, FlexField
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+@pytest.fixture
+def partitioned(database):
+    if not stagingPartitions.is_partitioned(database.session, 'appropriation'):
+        pytest.skip('staging tables are only partitioned on Postgres 11 and later')
+    return database.session
+
+
+def partitions_of(sess, submission_id):
+    """The partitions holding a submission's appropriation rows"""
+    return {row[0] for row in sess.execute(text('SELECT tableoid::regclass::text FROM appropriation '
+                                                'WHERE submission_id = :submission_id'),
+                                           {'submission_id': submission_id})}
+
+
+def test_is_staging_partition():
+    assert stagingPartitions.is_staging_partition('appropriation_12')
+    assert stagingPartitions.is_staging_partition('award_financial_assistance_default')
+    assert stagingPartitions.is_staging_partition('flex_field_legacy')
+    assert not stagingPartitions.is_staging_partition('award_financial_assistance')
+    assert not stagingPartitions.is_staging_partition('detached_award_financial_assistance')
+    assert not stagingPartitions.is_staging_partition('submission_12')
+
+
+def test_clear_submission_rows(partitioned):
+    """Rows in the default partition are deleted and the submission given its own partition, which is truncated the
+    next time it's cleared"""
+    sess = partitioned
+    sub, other_sub = SubmissionFactory(), SubmissionFactory()
+    sess.add_all([sub, other_sub])
+    sess.flush()
+    sess.add_all([AppropriationFactory(submission_id=sub.submission_id),
+                  AppropriationFactory(submission_id=other_sub.submission_id)])
+    sess.commit()
+    assert partitions_of(sess, sub.submission_id) == {'appropriation_default'}
+
+    stagingPartitions.clear_submission_rows(sess, Appropriation, sub.submission_id)
+    sess.commit()
+    assert partitions_of(sess, sub.submission_id) == set()
+
+    sess.add_all([AppropriationFactory(submission_id=sub.submission_id) for _ in range(3)])
+    sess.commit()
+    partition = 'appropriation_{}'.format(sub.submission_id)
+    assert partitions_of(sess, sub.submission_id) == {partition}
+    assert sess.query(Appropriation).filter_by(submission_id=sub.submission_id).count() == 3
+
+    stagingPartitions.clear_submission_rows(sess, Appropriation, sub.submission_id)
+    sess.commit()
+    assert stagingPartitions.table_exists(sess, partition)
+    assert sess.query(Appropriation).filter_by(submission_id=sub.submission_id).count() == 0
+    assert sess.query(Appropriation).filter_by(submission_id=other_sub.submission_id).count() == 1
+
+    stagingPartitions.drop_submission_partitions(sess, sub.submission_id)
+    sess.commit()
+    assert not stagingPartitions.table_exists(sess, partition)
+
+
+def test_prepare_submission_partition(partitioned):
+    """Submissions that still have rows in the default partition don't get their own"""
+    sess = partitioned
+    sub = SubmissionFactory()
+    sess.add(sub)
+    sess.flush()
+    sess.add(FlexField(submission_id=sub.submission_id, job_id=1, row_number=2))
+    sess.commit()
+
+    assert not stagingPartitions.prepare_submission_partition(sess, FlexField, sub.submission_id)
+    sess.query(FlexField).filter_by(submission_id=sub.submission_id).delete()
+    assert stagingPartitions.prepare_submission_partition(sess, FlexField, sub.submission_id)
+    assert stagingPartitions.prepare_submission_partition(sess, FlexField, sub.submission_id)
+    sess.commit()
+    assert stagingPartitions.table_exists(sess, 'flex_field_{}'.format(sub.submission_id))
+
+    # submissions from before the tables were partitioned stay in the legacy partition
+    legacy_bound = stagingPartitions.legacy_bound(sess, 'flex_field')
+    assert legacy_bound >= 1
+    assert not stagingPartitions.prepare_submission_partition(sess, FlexField, legacy_bound - 1)
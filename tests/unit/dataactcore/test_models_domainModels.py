@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+import random
+
+import sqlalchemy as sa
+
+from dataactcore.models.domainModels import (TAS_COMPONENTS, TASLookup, is_not_distinct_from, tas_key,
+                                             tas_key_expression, update_matching_tas_ids)
+from dataactcore.models.stagingModels import Appropriation
+from tests.unit.dataactcore.factories.domain import TASFactory
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+def correlated_tas_id(sess, model_class, start_date, end_date):
+    """The CARS history entry of each record, looked up one record at a time"""
+    subquery = sess.query(sa.func.min(TASLookup.account_num))
+    for field_name in TAS_COMPONENTS:
+        subquery = subquery.filter(is_not_distinct_from(getattr(TASLookup, field_name),
+                                                        getattr(model_class, field_name)))
+    tas_dates = sa.tuple_(TASLookup.internal_start_date,
+                          sa.func.coalesce(TASLookup.internal_end_date, end_date + timedelta(days=1)))
+    subquery = subquery.filter(sa.tuple_(start_date, end_date).op('OVERLAPS')(tas_dates))
+    return subquery.as_scalar()
+
+
+def test_tas_key(database):
+    """Keys built in Python and SQL agree, with NULLs as empty strings"""
+    sess = database.session
+    components = dict.fromkeys(TAS_COMPONENTS, None)
+    components.update(agency_identifier='097', main_account_code='0100', availability_type_code='')
+    assert tas_key(components) == '|097||||0100|'
+
+    sess.add_all([TASFactory(**components), TASFactory()])
+    sess.commit()
+    key = tas_key_expression({field_name: getattr(TASLookup, field_name) for field_name in TAS_COMPONENTS})
+    assert sess.query(TASLookup.tas_key, key).count() == 2
+    assert all(stored == built for stored, built in sess.query(TASLookup.tas_key, key))
+
+
+def test_update_matching_tas_ids(database):
+    """Resolving the distinct TAS of a submission at once matches looking up each record in turn, NULLs, empty
+    strings, overlapping and expired history entries included"""
+    sess = database.session
+    rand = random.Random(20)
+    values = (None, '', '000', '097')
+    start_date, end_date = date(2017, 10, 1), date(2017, 12, 31)
+
+    def components():
+        return {field_name: rand.choice(values) for field_name in TAS_COMPONENTS[:3]}
+
+    tas_entries = []
+    for account_num in range(1, 60):
+        start = date(2017, rand.randint(1, 12), 1)
+        end = rand.choice((None, start + timedelta(days=rand.randint(1, 200))))
+        tas_entries.append(TASFactory(account_num=account_num, internal_start_date=start, internal_end_date=end,
+                                      **dict.fromkeys(TAS_COMPONENTS[3:]), **components()))
+    sub, other_sub = SubmissionFactory(), SubmissionFactory()
+    sess.add_all(tas_entries + [sub, other_sub])
+    sess.flush()
+    records = [AppropriationFactory(submission_id=sub.submission_id, tas_id=rand.choice((None, 1000)),
+                                    **dict.fromkeys(TAS_COMPONENTS[3:]), **components()) for _ in range(80)]
+    other_record = AppropriationFactory(submission_id=other_sub.submission_id, tas_id=1000)
+    sess.add_all(records + [other_record])
+    sess.commit()
+
+    expected = dict(sess.query(Appropriation.appropriation_id,
+                               correlated_tas_id(sess, Appropriation, start_date, end_date)).
+                    filter(Appropriation.submission_id == sub.submission_id))
+    assert any(expected.values()) and not all(expected.values())
+
+    update_matching_tas_ids(sess, Appropriation, start_date, end_date, Appropriation.submission_id == sub.submission_id)
+    sess.commit()
+    assert dict(sess.query(Appropriation.appropriation_id, Appropriation.tas_id).
+                filter(Appropriation.submission_id == sub.submission_id)) == expected
+    assert sess.query(Appropriation.tas_id).filter_by(appropriation_id=other_record.appropriation_id).scalar() == 1000
@@ -2,6 +2,8 @@ import csv
 
 from unittest.mock import Mock
 
+import pytest
+
 from dataactvalidator.filestreaming import csvReader
 
 
@@ -47,3 +49,35 @@ def test_normalize_headers():
     ]
     result = csvReader.normalize_headers(headers, True, mapping)
     assert list(result) == ['ata', 'boa', 'flex_mycol', 'flex_another']
+
+
+def test_row_count(tmpdir):
+    """Verify that raw rows, including blank and multi-line ones, are counted as the file is read"""
+    csv_file = tmpdir.join('file.csv')
+    csv_file.write('a,b\n1,2\n\n"3\n",4\n5,6\n\n')
+    reader = csvReader.CsvReader()
+    reader.open_file(None, None, str(csv_file), [Mock(name_short='a'), Mock(name_short='b')], None, None, {},
+                     is_local=True)
+    assert reader.row_count == 1
+
+    records = []
+    while not reader.is_finished:
+        records.append(reader._get_line())
+    reader.close()
+    assert records == [['1', '2'], ['3\n', '4'], ['5', '6'], '']
+    with open(str(csv_file)) as f:
+        assert reader.row_count == len(list(csv.reader(f)))
+
+
+def test_non_utf8_file(tmpdir):
+    """Verify that invalid characters are found while the file is being read"""
+    csv_file = tmpdir.join('file.csv')
+    csv_file.write_binary(b'a,b\n' + b'1,2\n' * 5000 + b'3,\xff\n')
+    reader = csvReader.CsvReader()
+    reader.open_file(None, None, str(csv_file), [Mock(name_short='a'), Mock(name_short='b')], None, None, {},
+                     is_local=True)
+    with pytest.raises(UnicodeDecodeError):
+        while not reader.is_finished:
+            reader.get_next_record()
+    reader.close()
+    assert reader.row_count > 1
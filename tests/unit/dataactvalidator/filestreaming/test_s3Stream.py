@@ -0,0 +1,116 @@
+from io import BytesIO
+from unittest.mock import Mock
+
+from dataactvalidator.filestreaming import s3Stream
+
+
+class FlakyBody:
+    """Response body which fails once after returning the given number of bytes"""
+    def __init__(self, data, fail_after=None):
+        self.stream = BytesIO(data)
+        self.fail_after = fail_after
+
+    def read(self, size):
+        if self.fail_after is not None and self.stream.tell() >= self.fail_after:
+            raise ConnectionError('connection reset')
+        return self.stream.read(size)
+
+    def close(self):
+        pass
+
+
+def mock_client(monkeypatch, data, fail_after=None):
+    """Replace the boto3 S3 client with one serving data, honoring range requests"""
+    def get_object(Bucket, Key, Range=None):
+        start = int(Range[len('bytes='):-1]) if Range else 0
+        return {'Body': FlakyBody(data[start:], fail_after if not Range else None)}
+    client = Mock()
+    client.get_object.side_effect = get_object
+    monkeypatch.setattr(s3Stream.boto3, 'client', Mock(return_value=client))
+    return client
+
+
+def test_read_ahead_stream(monkeypatch):
+    """Verify that the whole object is read through a read-ahead buffer smaller than the object"""
+    data = b'a,b\n' + b'1,2\n' * 1000
+    mock_client(monkeypatch, data)
+    stream = s3Stream.S3ReadAheadStream('region', 'bucket', 'key', chunk_size=64, read_ahead_chunks=2)
+    assert stream.read() == data
+    stream.close()
+
+
+def test_read_ahead_stream_resumes(monkeypatch):
+    """Verify that an interrupted download picks up from the last byte received"""
+    data = bytes(range(256)) * 10
+    client = mock_client(monkeypatch, data, fail_after=1000)
+    stream = s3Stream.S3ReadAheadStream('region', 'bucket', 'key', chunk_size=100)
+    assert stream.read() == data
+    stream.close()
+    assert client.get_object.call_args[1]['Range'] == 'bytes=1000-'
+
+
+def test_read_ahead_stream_close_early(monkeypatch):
+    """Verify that closing the stream before the download completes stops the download"""
+    mock_client(monkeypatch, b'x' * 10000)
+    stream = s3Stream.S3ReadAheadStream('region', 'bucket', 'key', chunk_size=10, read_ahead_chunks=1)
+    assert stream.read(10) == b'x' * 10
+    stream.close()
+    assert not stream._thread.is_alive()
+
+
+def test_open_s3_text_stream(monkeypatch):
+    """Verify that the text stream decodes the object as it is read"""
+    mock_client(monkeypatch, 'a,b\r\né,2\n'.encode('utf-8'))
+    with s3Stream.open_s3_text_stream('region', 'bucket', 'key') as stream:
+        assert stream.readlines() == ['a,b\n', 'é,2\n']
+
+
+def mock_upload_client(monkeypatch):
+    """Replace the boto3 S3 client with one recording uploaded parts"""
+    client = Mock()
+    client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+    client.upload_part.side_effect = lambda PartNumber, Body, **kwargs: {'ETag': 'etag{}'.format(PartNumber)}
+    monkeypatch.setattr(s3Stream.boto3, 'client', Mock(return_value=client))
+    return client
+
+
+def test_multipart_write_stream(monkeypatch):
+    """Verify that a large object is uploaded in parts, in order"""
+    client = mock_upload_client(monkeypatch)
+    monkeypatch.setattr(s3Stream.S3MultipartWriteStream, 'MIN_PART_SIZE', 1)
+    stream = s3Stream.S3MultipartWriteStream('region', 'bucket', 'key', part_size=100, upload_threads=2)
+    data = b'1,2\n' * 1000
+    for start in range(0, len(data), 30):
+        stream.write(data[start:start + 30])
+    stream.close()
+
+    parts = sorted(client.upload_part.call_args_list, key=lambda call: call[1]['PartNumber'])
+    assert b''.join(call[1]['Body'] for call in parts) == data
+    assert all(len(call[1]['Body']) >= 100 for call in parts[:-1])
+    completed = client.complete_multipart_upload.call_args[1]['MultipartUpload']['Parts']
+    assert completed == [{'ETag': 'etag{}'.format(number), 'PartNumber': number}
+                         for number in range(1, len(parts) + 1)]
+    assert not client.put_object.called
+
+
+def test_multipart_write_stream_small(monkeypatch):
+    """Verify that an object smaller than a part is uploaded in one request"""
+    client = mock_upload_client(monkeypatch)
+    with s3Stream.open_s3_text_writer('region', 'bucket', 'key') as stream:
+        stream.write('a,b\n1,2\n')
+    client.put_object.assert_called_once_with(Bucket='bucket', Key='key', Body=b'a,b\n1,2\n')
+    assert not client.create_multipart_upload.called
+
+
+def test_multipart_write_stream_abort(monkeypatch):
+    """Verify that an aborted upload discards its parts and never completes"""
+    client = mock_upload_client(monkeypatch)
+    monkeypatch.setattr(s3Stream.S3MultipartWriteStream, 'MIN_PART_SIZE', 1)
+    stream = s3Stream.open_s3_text_writer('region', 'bucket', 'key', part_size=10)
+    stream.write('x' * 5000)
+    stream.flush()
+    stream.buffer.raw.abort()
+    stream.close()
+    client.abort_multipart_upload.assert_called_once_with(Bucket='bucket', Key='key', UploadId='upload')
+    assert not client.complete_multipart_upload.called
+    assert not client.put_object.called
@@ -0,0 +1,113 @@
+import time
+
+from dataactcore.models.jobModels import FileType, JobStatus, JobType
+from dataactcore.models.lookups import FILE_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactcore.models.validationModels import RuleSql
+from dataactcore.scripts import setupValidationDB
+from dataactvalidator.jobScheduler import BULK, INTERACTIVE, JobEstimate, JobScheduler, PUBLISH_ROW_COST, estimate_job
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def add_jobs(scheduler, *jobs):
+    for job_id, lane, cost in jobs:
+        scheduler.add(job_id, JobEstimate(job_id, lane, cost, cost, 0))
+
+
+def take(scheduler):
+    job = scheduler.next()
+    return job and job.message
+
+
+def test_lanes():
+    """Interactive jobs go first, cheapest first within a lane, and bulk jobs leave a worker for interactive ones"""
+    scheduler = JobScheduler(3, interactive_workers=1, max_wait=60)
+    add_jobs(scheduler, (1, BULK, 500), (2, BULK, 100), (3, BULK, 300), (4, INTERACTIVE, 50), (5, INTERACTIVE, 10))
+    assert len(scheduler) == 5
+
+    assert [take(scheduler) for _ in range(4)] == [5, 4, 2, 3]
+    # the last worker is kept for interactive jobs
+    assert take(scheduler) is None
+
+    add_jobs(scheduler, (6, INTERACTIVE, 1000))
+    assert take(scheduler) == 6
+    assert scheduler.depth()[BULK] == {'waiting': 1, 'waiting_cost': 500, 'oldest_wait': 0, 'running': 2}
+    assert scheduler.depth()[INTERACTIVE]['running'] == 3
+
+
+def test_done():
+    """Finished bulk jobs make room for the next"""
+    scheduler = JobScheduler(2, interactive_workers=1, max_wait=60)
+    add_jobs(scheduler, (1, BULK, 1), (2, BULK, 2))
+    first = scheduler.next()
+    assert take(scheduler) is None
+    scheduler.done(first)
+    assert take(scheduler) == 2
+    assert scheduler.depth()[BULK]['running'] == 1
+
+
+def test_single_worker():
+    """A lone worker runs bulk jobs too"""
+    scheduler = JobScheduler(1, interactive_workers=1, max_wait=60)
+    add_jobs(scheduler, (1, BULK, 1))
+    assert take(scheduler) == 1
+
+
+def test_starvation():
+    """Jobs that waited too long go first, whatever their lane and however busy the bulk workers are"""
+    scheduler = JobScheduler(2, interactive_workers=1, max_wait=0.1)
+    add_jobs(scheduler, (1, BULK, 1), (2, BULK, 1000))
+    assert take(scheduler) == 1
+    time.sleep(0.15)
+    add_jobs(scheduler, (3, INTERACTIVE, 1))
+    assert take(scheduler) == 2
+    assert take(scheduler) == 3
+
+    add_jobs(scheduler, (4, BULK, 1))
+    assert [job.message for job in scheduler.drain()] == [4]
+    assert len(scheduler) == 0
+
+
+def test_estimate_job(database, job_constants, tmpdir):
+    """Jobs are costed by file size and rule count, FABS jobs run in the interactive lane, while FABS publishes are
+    costed by their rows and run in the bulk lane"""
+    sess = database.session
+    setupValidationDB.insert_codes(sess)
+    file_types = {file_type.name: file_type for file_type in sess.query(FileType)}
+    job_types = {job_type.name: job_type for job_type in sess.query(JobType)}
+    waiting = sess.query(JobStatus).filter_by(name='waiting').one()
+
+    appropriations, fabs = tmpdir.join('a.csv'), tmpdir.join('fabs.csv')
+    appropriations.write('x' * 100)
+    fabs.write('x' * 10)
+    sub = SubmissionFactory()
+    sess.add(sub)
+    sess.flush()
+    jobs = [
+        JobFactory(submission_id=sub.submission_id, file_type=file_types['appropriations'],
+                   filename=str(appropriations), job_type=job_types['csv_record_validation'], job_status=waiting,
+                   file_size=100),
+        JobFactory(submission_id=sub.submission_id, file_type=None, job_type=job_types['validation'],
+                   job_status=waiting),
+        JobFactory(file_type=file_types['detached_award'], filename=str(fabs),
+                   job_type=job_types['csv_record_validation'], job_status=waiting, file_size=None),
+        JobFactory(file_type=file_types['program_activity'], filename=str(tmpdir.join('missing.csv')),
+                   job_type=job_types['csv_record_validation'], job_status=waiting),
+        JobFactory(file_type=file_types['detached_award'], filename=None, job_type=job_types['fabs_publish'],
+                   job_status=waiting, number_of_rows=30)
+    ]
+    sess.add_all(jobs)
+    for file_type, cross_file in (('appropriations', False), ('appropriations', False), ('appropriations', True),
+                                  ('detached_award', False)):
+        sess.add(RuleSql(rule_sql='', rule_label='', rule_description='', rule_error_message='',
+                         rule_cross_file_flag=cross_file, file_id=FILE_TYPE_DICT[file_type],
+                         rule_severity_id=RULE_SEVERITY_DICT['fatal']))
+    sess.commit()
+
+    assert [estimate_job(job.job_id) for job in jobs] == [
+        JobEstimate(jobs[0].job_id, BULK, 300, 100, 2),
+        JobEstimate(jobs[1].job_id, BULK, 200, 100, 1),
+        JobEstimate(jobs[2].job_id, INTERACTIVE, 20, 10, 1),
+        JobEstimate(jobs[3].job_id, BULK, 0, 0, 0),
+        JobEstimate(jobs[4].job_id, BULK, 30 * PUBLISH_ROW_COST, 0, 0)
+    ]
+    assert estimate_job(0) == JobEstimate(0, INTERACTIVE, 0, 0, 0)
@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+import pytest
+
+from dataactcore.interfaces.db import db_connection
+from dataactvalidator.supervisor import JobConsumer, ValidatorSupervisor, VisibilityHeartbeat, WorkerStats
+
+
+class Message:
+    def __init__(self, body, fail=False):
+        self.body = body
+        self.timeouts = []
+        self.deleted = False
+        self.fail = fail
+
+    def change_visibility(self, VisibilityTimeout):    # noqa
+        self.timeouts.append(VisibilityTimeout)
+        if self.fail:
+            raise ValueError('Receipt handle is invalid')
+
+    def delete(self):
+        self.deleted = True
+
+
+class Queue:
+    """Queue handing out its messages once each, stopping the consumer when they're all finished"""
+    def __init__(self, bodies, stop):
+        self.messages = [Message(body) for body in bodies]
+        self.unsent = list(self.messages)
+        self.stop = stop
+        self.requests = []
+
+    def receive_messages(self, MaxNumberOfMessages, WaitTimeSeconds, VisibilityTimeout=None):  # noqa
+        self.requests.append((MaxNumberOfMessages, VisibilityTimeout))
+        if all(message.deleted or 0 in message.timeouts for message in self.messages):
+            self.stop.set()
+        messages, self.unsent = self.unsent[:MaxNumberOfMessages], self.unsent[MaxNumberOfMessages:]
+        if not messages:
+            time.sleep(0.05)
+        return messages
+
+
+def run_job(job_id):
+    """Jobs with even IDs are done, odd ones are retried, and negative ones crash their worker"""
+    if job_id < 0:
+        os._exit(1)
+    if job_id == 3:
+        raise ValueError('Job failed')
+    return job_id % 2 == 0
+
+
+@contextmanager
+def worker_context():
+    yield
+
+
+def outcomes(queue):
+    return {message.body: 'deleted' if message.deleted else 'released' if 0 in message.timeouts else None
+            for message in queue.messages}
+
+
+@pytest.mark.parametrize('fail', (False, True))
+def test_heartbeat(fail):
+    """Tracked messages are hidden again every half timeout until they're untracked, even if an extension fails"""
+    message, other = Message(1, fail), Message(2)
+    with VisibilityHeartbeat(timeout=0.4) as heartbeat:
+        heartbeat.track(message)
+        heartbeat.track(other)
+        time.sleep(0.3)
+        heartbeat.untrack(other)
+        time.sleep(0.2)
+    assert message.timeouts == [0.4, 0.4]
+    assert other.timeouts == [0.4]
+
+    time.sleep(0.3)
+    assert len(message.timeouts) == 2
+
+
+def test_heartbeat_without_timeout(monkeypatch):
+    monkeypatch.setattr('dataactvalidator.supervisor.CONFIG_SERVICES', {})
+    message = Message(1)
+    with VisibilityHeartbeat() as heartbeat:
+        heartbeat.track(message)
+        assert heartbeat.thread is None
+    assert message.timeouts == []
+
+
+def test_consumer():
+    """Messages are received one at a time, deleted once their jobs are done and only released if they failed"""
+    stop = threading.Event()
+    queue = Queue([2, 1, 3, 4], stop)
+    JobConsumer(queue, run_job, wait_time=0, visibility_timeout=60).run(stop)
+
+    assert outcomes(queue) == {2: 'deleted', 1: 'released', 3: 'released', 4: 'deleted'}
+    assert set(queue.requests) == {(1, 60)}
+    assert all(message.timeouts in ([], [0]) for message in queue.messages)
+
+
+def test_worker_stats():
+    stats = WorkerStats()
+    stats.finish_job()
+    assert stats.snapshot() == (0, 0)
+
+    stats.start_job()
+    time.sleep(0.1)
+    jobs, busy = stats.snapshot()
+    assert jobs == 0 and busy >= 0.1
+
+    stats.finish_job()
+    jobs, finished_busy = stats.snapshot()
+    assert jobs == 1 and finished_busy >= busy
+    time.sleep(0.05)
+    assert stats.snapshot() == (1, finished_busy)
+
+
+def test_supervisor():
+    """Jobs are handed out to idle workers, a batch at a time, and workers that crash are replaced with their job
+    retried"""
+    stop = threading.Event()
+    queue = Queue(list(range(12)) + [-1], stop)
+    supervisor = ValidatorSupervisor(queue, run_job, worker_context, workers=3, wait_time=0, visibility_timeout=60)
+    supervisor.CHECK_INTERVAL = 0.1
+    supervisor.run(stop)
+
+    expected = {job_id: 'deleted' if job_id % 2 == 0 else 'released' for job_id in range(12)}
+    expected[-1] = 'released'
+    assert outcomes(queue) == expected
+    assert queue.requests[0] == (3, 60)
+    assert all(max_messages <= 3 for max_messages, _ in queue.requests)
+    assert all(process.exitcode == 0 for process in supervisor.processes)
+
+    workers = supervisor.report()
+    # the job of the worker that crashed counts too
+    assert sum(worker['total_jobs'] for worker in workers) == 13
+    assert all(0 <= worker['utilization'] <= 1 for worker in workers)
+
+
+def test_supervisor_shutdown():
+    """Workers are killed if they don't stop in time, and their jobs released"""
+    stop = threading.Event()
+    queue = Queue([5], stop)
+    supervisor = ValidatorSupervisor(queue, sleep, worker_context, workers=1, wait_time=0)
+    supervisor.SHUTDOWN_TIMEOUT = 0.2
+    supervisor.check_workers()
+    message, = supervisor.receive(1)
+    supervisor.scheduler.add(message, supervisor.estimate(message))
+    supervisor.dispatch()
+    while not supervisor.stats[0].snapshot()[1]:
+        time.sleep(0.01)
+    supervisor.shutdown()
+
+    assert supervisor.processes[0].exitcode < 0
+    assert outcomes(queue) == {5: 'released'}
+    assert supervisor.assignments == [None]
+
+
+def sleep(job_id):
+    time.sleep(job_id)
+    return True
+
+
+def test_release_keeps_engine(database):
+    """Releasing the database after a job keeps the engine, handing out a fresh connection"""
+    db = db_connection()
+    released = db.release()
+    try:
+        assert released.engine is db.engine
+        assert released.connection is not db.connection
+        assert db.connection.closed
+        assert released.connection.execute('SELECT 1').scalar() == 1
+        assert released.session.execute('SELECT 1').scalar() == 1
+    finally:
+        released.close()
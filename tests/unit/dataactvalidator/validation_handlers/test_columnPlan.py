@@ -0,0 +1,62 @@
+import pickle
+
+import pytest
+
+from dataactcore.models.jobModels import FileType
+from dataactcore.models.lookups import FIELD_TYPE_DICT, FILE_TYPE_DICT
+from dataactcore.models.validationModels import FileColumn
+from dataactcore.scripts import setupValidationDB
+from dataactvalidator.filestreaming.schemaLoader import SchemaLoader
+from dataactvalidator.validation_handlers import columnPlan
+
+
+def test_bind_plan():
+    """Bound plans line up with the record's columns, skipping the ones that aren't validated"""
+    plan = columnPlan.compile_plan([
+        FileColumn(name='Amount', name_short='amount', field_types_id=FIELD_TYPE_DICT['DECIMAL'], required=True,
+                   padded_flag=False),
+        FileColumn(name='Code', name_short='code', field_types_id=FIELD_TYPE_DICT['STRING'], required=False,
+                   padded_flag=True, length=3)
+    ])
+    bound = columnPlan.bind_plan(plan, ('code', 'row_number', 'amount'))
+    assert [(column.index, column.name_short) for column in bound if column] == [(0, 'code'), (2, 'amount')]
+    assert bound[1] is None
+    assert bound[0].pad_length == 3 and bound[0].check_type is None and not bound[0].numeric
+    assert bound[2].numeric and bound[2].required and bound[2].check_type('1.5')
+
+    # Bound plans are copies, so every layout of record gets its own
+    assert [column.index for column in plan] == [0, 1]
+    assert pickle.loads(pickle.dumps(bound))[2].name_short == 'amount'
+
+    with pytest.raises(KeyError):
+        columnPlan.bind_plan(plan, ('code', 'row_number'))
+    with pytest.raises(KeyError):
+        columnPlan.bind_plan(plan, ('code', 'amount', 'other'))
+
+
+def test_get_column_plan(database, job_constants):
+    """Plans are cached until the schema for the file type is reloaded"""
+    sess = database.session
+    setupValidationDB.insert_codes(sess)
+    file_type_id = FILE_TYPE_DICT['appropriations']
+
+    def load(*columns):
+        file_type = sess.query(FileType).filter_by(file_type_id=file_type_id).one()
+        SchemaLoader.remove_columns_by_file_type(sess, file_type)
+        for name, field_type in columns:
+            SchemaLoader.add_column_by_file_type(sess, FIELD_TYPE_DICT, file_type, name, name, 'false', field_type)
+        sess.commit()
+
+    load(('amount', 'DECIMAL'), ('code', 'STRING'))
+    fields, plan = columnPlan.get_column_plan(sess, file_type_id)
+    assert [column.name_short for column in plan] == [field.name_short for field in fields] == ['amount', 'code']
+    assert columnPlan.get_column_plan(sess, file_type_id)[1] is plan
+
+    # Reloading the same columns still replaces the rows, so the plan is compiled again
+    load(('amount', 'INT'), ('code', 'STRING'))
+    _, reloaded = columnPlan.get_column_plan(sess, file_type_id)
+    assert reloaded is not plan
+    assert reloaded[0].field_type == 'INT'
+
+    columnPlan.clear_column_plans()
+    assert columnPlan.get_column_plan(sess, file_type_id)[1] is not reloaded
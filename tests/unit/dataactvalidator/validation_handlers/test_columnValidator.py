@@ -0,0 +1,91 @@
+import copy
+import random
+
+import pytest
+
+from dataactcore.models.lookups import FIELD_TYPE_DICT
+from dataactcore.models.validationModels import FileColumn
+from dataactvalidator.validation_handlers.columnPlan import compile_plan
+from dataactvalidator.validation_handlers.columnValidator import ColumnValidator
+from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.validation_handlers.rowValidator import RowValidator
+from dataactvalidator.validation_handlers.validator import Validator
+
+VALUES = [
+    None, '', ' ', '1', ' 1,000 ', '1,000.50', '"12"', '" 1,234 "', '"', '""', '1e5', 'nan', 'inf', '1_000', '+.5',
+    '-1', '-07', '1.', '.', 'abc', 'TRUE', 'yes', ' no ', 'N', 'x' * 30, '٣', '１２', '1,2,3', ',', '12,',
+    '\t7\n', '0', '00012345678901234567890', 'a b'
+]
+
+COLUMNS = [
+    ('number', 'DECIMAL', True, False, 8),
+    ('count', 'INT', False, False, None),
+    ('big', 'LONG', False, True, 5),
+    ('flag', 'BOOLEAN', False, False, None),
+    ('code', 'STRING', False, True, 3),
+    ('name', 'STRING', True, False, 10),
+    ('award_modification_amendme', 'STRING', False, False, None),
+    ('awarding_sub_tier_agency_c', 'STRING', False, True, 4),
+    ('fain', 'STRING', False, False, None),
+    ('uri', 'STRING', False, False, None)
+]
+
+
+def schema():
+    return [FileColumn(name=name + '_long', name_short=name, field_types_id=FIELD_TYPE_DICT[field_type],
+                       required=required, padded_flag=padded, length=length)
+            for name, field_type, required, padded, length in COLUMNS]
+
+
+def validators(file_type):
+    plan = compile_plan(schema())
+    return RowValidator(plan, file_type), ColumnValidator(plan, file_type)
+
+
+def validate_by_schema(record, file_type):
+    """Clean and validate a record with the schema rather than a column plan"""
+    fields = schema()
+    record = FieldCleaner.clean_row(record, {field.name: field.name_short for field in fields}, fields)
+    if file_type == 'award':
+        return record, True, [], True
+    if file_type == 'detached_award':
+        record['afa_generated_unique'] = '_'.join(record[key] or '-none-' for key in [
+            'award_modification_amendme', 'awarding_sub_tier_agency_c', 'fain', 'uri'])
+    return (record,) + Validator.validate(record, {field.name_short: field for field in fields},
+                                          file_type == 'detached_award')
+
+
+@pytest.mark.parametrize('file_type', ('appropriations', 'detached_award', 'award'))
+def test_engines_match(file_type):
+    """Both engines should clean records and report failures exactly as validating with the schema does"""
+    rand = random.Random(file_type)
+    chunk = []
+    for row_number in range(2, 502):
+        if row_number % 97 == 0:
+            chunk.append((row_number, None, None))
+            continue
+        record = {name: rand.choice(VALUES) for name, _, _, _, _ in COLUMNS}
+        if row_number % 50 == 0:
+            record = {name: None for name in record}
+        record['row_number'] = row_number
+        chunk.append((row_number, record, None))
+
+    expected = [validate_by_schema(record, file_type) if record is not None else None
+                for _, record, _ in copy.deepcopy(chunk)]
+    for validator in validators(file_type):
+        actual = validator.validate_chunk(copy.deepcopy(chunk))
+        assert len(actual) == len(expected)
+        for expected_result, result in zip(expected, actual):
+            assert result == expected_result
+            if expected_result is not None:
+                assert list(result[0]) == list(expected_result[0])
+
+
+def test_engines_match_mixed_keys():
+    """Records with different columns are validated row by row"""
+    row_validator, column_validator = validators('appropriations')
+    chunk = [(2, {name: '1' for name, _, _, _, _ in COLUMNS}, None),
+             (3, dict(reversed([(name, 'abc') for name, _, _, _, _ in COLUMNS])), None)]
+    for _, record, _ in chunk:
+        record['row_number'] = 1
+    assert column_validator.validate_chunk(copy.deepcopy(chunk)) == row_validator.validate_chunk(copy.deepcopy(chunk))
@@ -0,0 +1,61 @@
+from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.lookups import ERROR_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactcore.scripts import setupErrorDB, setupValidationDB
+from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
+from dataactvalidator.validation_handlers.validationError import ValidationError
+from tests.unit.dataactcore.factories.job import JobFactory
+
+
+def test_write_all_row_errors(database):
+    """Errors are counted per job, field and type, and only the job's own are written"""
+    sess = database.session
+    setupErrorDB.insert_codes(sess)
+    setupValidationDB.insert_codes(sess)
+    jobs = [JobFactory(), JobFactory()]
+    sess.add_all(jobs)
+    sess.commit()
+    fatal = RULE_SEVERITY_DICT['fatal']
+    source, target = jobs[0].file_type_id, jobs[1].file_type_id
+
+    error_list = ErrorInterface()
+    for row in (5, 3, 8):
+        error_list.record_row_error(jobs[0].job_id, 'a.csv', 'amount', ValidationError.typeError, row,
+                                    severity_id=fatal)
+    error_list.record_row_error(jobs[0].job_id, 'a.csv', 'code', 'Field must be no longer than specified limit (3)',
+                                4, 'A1', source, target, fatal)
+    error_list.record_row_error(jobs[0].job_id, 'a.csv', 'code', 'Code must be valid', 6, 'A2', source, target,
+                                fatal)
+    error_list.record_row_error(jobs[1].job_id, 'b.csv', 'amount', ValidationError.typeError, 2, severity_id=fatal)
+
+    first = list(error_list.rowErrors.values())[0]
+    assert (first['fieldName'], first['firstRow'], first['numErrors'], first['filename']) == ('amount', 5, 3, 'a.csv')
+
+    error_list.write_all_row_errors(jobs[0].job_id)
+    errors = sess.query(ErrorMetadata).order_by(ErrorMetadata.error_metadata_id).all()
+    assert [(error.job_id, error.field_name, error.error_type_id, error.rule_failed, error.occurrences,
+             error.first_row, error.original_rule_label, error.target_file_type_id) for error in errors] == [
+        (jobs[0].job_id, 'amount', ERROR_TYPE_DICT['type_error'],
+         ValidationError.get_error_message(ValidationError.typeError), 3, 5, None, None),
+        (jobs[0].job_id, 'code', ERROR_TYPE_DICT['length_error'], 'Field must be no longer than specified limit (3)',
+         1, 4, 'A1', target),
+        (jobs[0].job_id, 'code', ERROR_TYPE_DICT['rule_failed'], 'Code must be valid', 1, 6, 'A2', target)
+    ]
+    assert all(error.created_at is not None for error in errors)
+    assert error_list.rowErrors == {}
+
+
+def test_merge():
+    """Merging the errors of several interfaces in order matches recording them all in one"""
+    recorded = [(1, 'appropriations', 'Rule failed', 4), (1, 'award_financial', 'Rule failed', 2),
+                (1, 'appropriations', 'Rule failed', 7), (1, 'appropriations', 'Other rule failed', 1)]
+    together, first, second = ErrorInterface(), ErrorInterface(), ErrorInterface()
+    for index, (job_id, field_name, error_type, row) in enumerate(recorded):
+        together.record_row_error(job_id, 'cross_file', field_name, error_type, row)
+        (first if index < 2 else second).record_row_error(job_id, 'cross_file', field_name, error_type, row)
+
+    merged = ErrorInterface()
+    merged.merge(first)
+    merged.merge(second)
+    assert merged.rowErrors == together.rowErrors
+    assert merged.rowErrors[(1, 'appropriations', 'Rule failed')]['numErrors'] == 2
+    assert merged.rowErrors[(1, 'appropriations', 'Rule failed')]['firstRow'] == 4
@@ -0,0 +1,51 @@
+import pytest
+
+from dataactcore.models.lookups import FIELD_TYPE_DICT
+from dataactcore.models.validationModels import FileColumn
+from dataactvalidator.validation_handlers.columnPlan import compile_plan
+from dataactvalidator.validation_handlers.rowValidator import RowValidator, ValidationPool
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+
+def row_validator():
+    fields = [
+        FileColumn(name='Amount', name_short='amount', field_types_id=FIELD_TYPE_DICT['DECIMAL'], required=True,
+                   padded_flag=False),
+        FileColumn(name='Code', name_short='code', field_types_id=FIELD_TYPE_DICT['STRING'], required=False,
+                   padded_flag=True, length=3)
+    ]
+    return RowValidator(compile_plan(fields), 'appropriations')
+
+
+def test_validate_record():
+    """Records should be cleaned before they are validated"""
+    validator = row_validator()
+    record, passed, failures, valid = validator.validate_record({'amount': ' 1,000.5 ', 'code': '7',
+                                                                 'row_number': 2})
+    assert record == {'amount': '1000.5', 'code': '007', 'row_number': 2}
+    assert (passed, failures, valid) == (True, [], True)
+
+    record, passed, failures, valid = validator.validate_record({'amount': 'abc', 'code': None, 'row_number': 3})
+    assert (passed, valid) == (False, False)
+    assert [(failure.field, failure.description) for failure in failures] == [('amount', ValidationError.typeError)]
+
+
+@pytest.mark.parametrize('processes', (1, 2))
+def test_validation_pool_order(processes):
+    """Results should come back in the order rows were read, whatever the number of processes"""
+    chunks = [[(row, {'amount': str(row) if row % 3 else 'bad', 'code': None, 'row_number': row}, None)
+               for row in range(start, start + 10)] for start in range(2, 102, 10)]
+    chunks[3][4] = (chunks[3][4][0], None, None)
+
+    pool = ValidationPool(row_validator(), processes)
+    try:
+        results = list(pool.validate(iter(chunks)))
+    finally:
+        pool.close()
+
+    assert [chunk for chunk, _ in results] == chunks
+    flat = [(row, result) for chunk, chunk_results in results for (row, _, _), result in zip(chunk, chunk_results)]
+    assert [row for row, _ in flat] == list(range(2, 102))
+    assert flat[34][1] is None
+    assert [row for row, result in flat if result is not None and not result[1]] == \
+        [row for row in range(2, 102) if row % 3 == 0 and row != 36]
@@ -0,0 +1,64 @@
+import glob
+import os
+
+import pytest
+
+from dataactcore.config import CONFIG_BROKER
+from dataactvalidator.validation_handlers.ruleCompiler import (compile_rule_sql, execute_statement, ORDERED_FAILURES,
+                                                               prepare_rule)
+
+
+def test_compile_rule_sql():
+    """The submission ID becomes a parameter, except where it only makes an identifier unique"""
+    compiled = compile_rule_sql('WITH rows_{0} AS (SELECT * FROM t WHERE submission_id = {0}) '
+                                "SELECT * FROM rows_{0} AS r WHERE r.a LIKE '%%A%%' AND r.submission_id={0}")
+    assert compiled.statement == ORDERED_FAILURES.format(
+        'WITH rows_ AS (SELECT * FROM t WHERE submission_id = $1) '
+        "SELECT * FROM rows_ AS r WHERE r.a LIKE '%%A%%' AND r.submission_id=$1")
+    assert compiled.name.startswith('rule_')
+    assert compile_rule_sql('SELECT {{}} <> {0}').statement == ORDERED_FAILURES.format('SELECT {} <> $1')
+
+    # Rules that aren't prepared have the submission ID written in
+    assert compile_rule_sql('SELECT a_{0} FROM t WHERE b = {0}', 12).statement == ORDERED_FAILURES.format(
+        'SELECT a_ FROM t WHERE b = 12')
+
+    # Names follow the statement, so changed rules don't reuse a stale prepared statement
+    assert compile_rule_sql('SELECT {0}').name == compile_rule_sql('SELECT {}').name
+    assert compile_rule_sql('SELECT {0}').name != compiled.name
+
+    with pytest.raises(ValueError):
+        compile_rule_sql('SELECT {1}')
+
+
+def test_split_statements():
+    """Statements are split on semicolons outside of quotes and comments"""
+    compiled = compile_rule_sql("CREATE FUNCTION pg_temp.f() RETURNS text AS $$ BEGIN RETURN ';'; END; $$ "
+                                "LANGUAGE plpgsql;\n-- checks; things\nSELECT ';' FROM t WHERE id = {0}; /* ; */\n")
+    assert compiled.setup == ("CREATE FUNCTION pg_temp.f() RETURNS text AS $$ BEGIN RETURN ';'; END; $$ "
+                              "LANGUAGE plpgsql",)
+    assert compiled.statement == ORDERED_FAILURES.format("-- checks; things\nSELECT ';' FROM t WHERE id = $1")
+
+
+def test_prepare_rule(database):
+    """Rules are prepared once per connection"""
+    connection = database.session.connection()
+    compiled = compile_rule_sql('SELECT {0} + 1 AS next_id, {0} AS row_number')
+    prepare_rule(connection, compiled)
+    prepare_rule(connection, compiled)
+    assert compiled.name in connection.info['prepared_rules']
+    assert connection.execute(execute_statement(compiled), submission_id=4).first()['next_id'] == 5
+
+
+def test_rules_prepare(database):
+    """Every rule shipped with the validator compiles to a statement Postgres can prepare"""
+    connection = database.session.connection()
+    rules_path = os.path.join(CONFIG_BROKER['path'], 'dataactvalidator', 'config', 'sqlrules', '*.sql')
+    rule_files = glob.glob(rules_path)
+    assert rule_files
+    for rule_file in rule_files:
+        with open(rule_file) as f:
+            compiled = compile_rule_sql(f.read())
+        for statement in compiled.setup:
+            connection.execute(statement)
+        prepare_rule(connection, compiled)
+        assert connection.execute(execute_statement(compiled), submission_id=1).fetchall() == []
@@ -0,0 +1,66 @@
+from collections import namedtuple
+
+import pytest
+
+from dataactvalidator.validation_handlers.ruleExecutor import SqlRuleExecutor
+
+Rule = namedtuple('Rule', ['query_name', 'rule_sql'])
+
+
+def rules():
+    """Rules whose results come back in the reverse of row number order, the slowest first"""
+    return [Rule('rule_{}'.format(index), 'SELECT pg_sleep({}), {{}} AS submission_id, row_number FROM '
+                                          'generate_series({}, 1, -1) AS row_number'.format(0.3 - index * 0.1, index))
+            for index in range(3)]
+
+
+def failures(result):
+    return [[row['row_number'] for row in batch] for batch in result.batches]
+
+
+@pytest.mark.parametrize('connections', (1, 3))
+@pytest.mark.parametrize('prepare', (False, True))
+def test_run_in_rule_order(database, connections, prepare):
+    """Failures come back in rule order and row order, however many rules run at once"""
+    executor = SqlRuleExecutor(connections, prepare=prepare, explain=False)
+    results = []
+    for result in executor.run(rules(), 7, database.session.connection()):
+        results.append((result, [[(row['row_number'], row['submission_id']) for row in batch]
+                                 for batch in result.batches]))
+
+    assert [result.rule.query_name for result, _ in results] == ['rule_0', 'rule_1', 'rule_2']
+    assert [batches for _, batches in results] == [[], [[(1, 7)]], [[(1, 7), (2, 7)]]]
+    assert 'row_number' in results[2][0].columns
+    assert [name for name, _ in executor.timings] == ['rule_0', 'rule_1', 'rule_2']
+    assert all(duration > 0 for _, duration in executor.timings)
+    assert all(result.plan is None for result, _ in results)
+
+
+@pytest.mark.parametrize('connections', (1, 3))
+@pytest.mark.parametrize('prepare', (False, True))
+def test_run_in_batches(database, connections, prepare):
+    """Failures are read a batch at a time, and dropped if they're not read before the next rule"""
+    rule = Rule('rule', 'SELECT row_number, {} AS submission_id FROM generate_series(7, 1, -1) AS row_number')
+    executor = SqlRuleExecutor(connections, prepare=prepare, explain=False, fetch_size=3)
+    results = executor.run([rule, rule, rule], 1, database.session.connection())
+
+    first = next(results)
+    if connections == 1:
+        # rules that aren't prepared are read through a server-side cursor
+        cursors = database.session.connection().execute('SELECT COUNT(*) FROM pg_cursors').scalar()
+        assert cursors == (0 if prepare else 1)
+    assert failures(first) == [[1, 2, 3], [4, 5, 6], [7]]
+    skipped = next(results)
+    assert failures(next(results)) == [[1, 2, 3], [4, 5, 6], [7]]
+    assert failures(skipped) == []
+
+
+@pytest.mark.parametrize('prepare', (False, True))
+def test_explain(database, prepare):
+    """Explaining rules captures the plan of each without changing the failures"""
+    executor = SqlRuleExecutor(1, prepare=prepare, explain=True)
+    results = [(result, failures(result)) for result in executor.run(rules(), 7, database.session.connection())]
+
+    assert [batches for _, batches in results] == [[], [[1]], [[1, 2]]]
+    assert all('Function Scan on generate_series' in result.plan for result, _ in results)
+    assert all('actual time=' in result.plan for result, _ in results)
@@ -0,0 +1,124 @@
+from functools import partial
+from unittest.mock import Mock
+
+import pytest
+
+from dataactcore.models.stagingModels import Appropriation, FlexField
+from dataactvalidator.filestreaming.csvReader import FlexCell
+from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
+from dataactvalidator.validation_handlers.stagingLoader import StagingLoader
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+@pytest.mark.parametrize('method', ('copy', 'insert'))
+def test_staging_loader_isolates_failures(database, method):
+    """Rows which can't be written should be reported without losing the rest of the batch, and queued callbacks
+    should be replayed in row order"""
+    sess = database.session
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    job = JobFactory(submission_id=submission.submission_id)
+    sess.add(job)
+    sess.commit()
+
+    writer = Mock()
+    error_list = ErrorInterface()
+    calls = []
+    loader = StagingLoader(Appropriation, job, writer, error_list, batch_size=100, method=method)
+    base_record = {'submission_id': submission.submission_id, 'job_id': job.job_id, 'agency_identifier': '097'}
+    loader.add(2, dict(base_record, adjustments_to_unobligated_cpe='1.5'), partial(calls.append, 2))
+    loader.defer(partial(calls.append, 'deferred'))
+    loader.add(3, dict(base_record, adjustments_to_unobligated_cpe='shoulda-been-a-number'), partial(calls.append, 3))
+    loader.add(4, dict(base_record, not_a_column='ignored'), partial(calls.append, 4))
+
+    assert loader.flush() == [3]
+    assert calls == [2, 'deferred', 4]
+    assert writer.writerow.call_args[0] == (
+        ['Formatting Error', 'Could not write this record into the staging table.', 3, ''],
+    )
+    error = list(error_list.rowErrors.values())[0]
+    assert error['firstRow'] == 3
+
+    rows = sess.query(Appropriation).order_by(Appropriation.row_number).all()
+    assert [row.row_number for row in rows] == [2, 4]
+    # python-side defaults are still applied
+    assert rows[0].tas == '00009700000000 0000000'
+    assert rows[0].created_at is not None
+
+
+def test_staging_loader_failure(database):
+    """A record that can't be written is reported as a formatting error, and only in the flush that wrote it"""
+    sess = database.session
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    job = JobFactory(submission_id=submission.submission_id)
+    sess.add(job)
+    sess.commit()
+
+    writer = Mock()
+    error_list = ErrorInterface()
+    loader = StagingLoader(Appropriation, job, writer, error_list, batch_size=2)
+    record = {'submission_id': submission.submission_id, 'job_id': job.job_id}
+    loader.add(1233, record)
+    loader.add(1234, dict(record, adjustments_to_unobligated_cpe='shoulda-been-a-number'))
+    assert writer.writerow.call_args[0] == (
+        ['Formatting Error', 'Could not write this record into the staging table.', 1234, ''],
+    )
+    assert len(error_list.rowErrors) == 1
+    error = list(error_list.rowErrors.values())[0]
+    assert error['firstRow'] == 1234
+    assert error['fieldName'] == 'Formatting Error'
+    assert error['filename'] == job.filename
+
+    loader.add(1235, record)
+    assert loader.flush() == []
+    assert loader.failed_rows == [1234]
+
+
+def test_staging_loader_flushes_at_batch_size(database):
+    """Queued records should be written once the batch is full"""
+    sess = database.session
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    job = JobFactory(submission_id=submission.submission_id)
+    sess.add(job)
+    sess.commit()
+
+    loader = StagingLoader(Appropriation, job, Mock(), ErrorInterface(), batch_size=2)
+    record = {'submission_id': submission.submission_id, 'job_id': job.job_id}
+    loader.add(2, record)
+    assert sess.query(Appropriation).count() == 0
+    loader.add(3, record)
+    assert sess.query(Appropriation).count() == 2
+    assert loader.pending == []
+
+
+@pytest.mark.parametrize('method', ('copy', 'insert'))
+def test_staging_loader_flex_fields(database, method):
+    """Flex fields should be written for the job along with the staging records"""
+    sess = database.session
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    job = JobFactory(submission_id=submission.submission_id)
+    sess.add(job)
+    sess.commit()
+
+    loader = StagingLoader(Appropriation, job, Mock(), ErrorInterface(), method=method)
+    record = {'submission_id': submission.submission_id, 'job_id': job.job_id}
+    loader.add(2, record)
+    loader.add_flex(2, [FlexCell('flex_a', 'a'), FlexCell('flex_b', None)])
+    loader.add(3, record)
+    loader.add_flex(3, [FlexCell('flex_a', 'c, "quoted"'), FlexCell('flex_b', 'd')])
+    loader.flush()
+
+    flex_fields = sess.query(FlexField).order_by(FlexField.row_number, FlexField.header).all()
+    assert [(flex.row_number, flex.header, flex.cell) for flex in flex_fields] == [
+        (2, 'flex_a', 'a'), (2, 'flex_b', None), (3, 'flex_a', 'c, "quoted"'), (3, 'flex_b', 'd')
+    ]
+    assert {(flex.submission_id, flex.job_id, flex.file_type_id) for flex in flex_fields} == {
+        (submission.submission_id, job.job_id, job.file_type_id)
+    }
@@ -0,0 +1,104 @@
+import hashlib
+
+from dataactcore.interfaces.referenceCache import bump_reference_version
+from dataactcore.models.domainModels import TASLookup
+from dataactcore.models.lookups import FIELD_TYPE_DICT, FILE_TYPE_DICT, RULE_SEVERITY_DICT, PUBLISH_STATUS_DICT
+from dataactcore.models.validationModels import FileColumn, RuleSql
+from dataactcore.scripts import setupValidationDB
+from dataactvalidator.validation_handlers.validationFingerprint import hash_file, validation_fingerprint
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import PublishedAwardFinancialAssistanceFactory
+
+
+def test_hash_file(tmpdir, monkeypatch):
+    """Files are hashed a chunk at a time"""
+    monkeypatch.setattr('dataactvalidator.validation_handlers.validationFingerprint.HASH_CHUNK_SIZE', 3)
+    csv = tmpdir.join('file.csv')
+    csv.write('a,b\n1,2\n')
+    assert hash_file(str(csv)) == hashlib.sha256(b'a,b\n1,2\n').hexdigest()
+
+
+def test_validation_fingerprint(database, job_constants):
+    """The fingerprint changes with the file, its columns and its single-file rules, but not cross-file rules"""
+    sess = database.session
+    setupValidationDB.insert_codes(sess)
+    file_id = FILE_TYPE_DICT['appropriations']
+    sub = SubmissionFactory(cgac_code='097', reporting_fiscal_year=2017, reporting_fiscal_period=3)
+    column = FileColumn(file_id=file_id, field_types_id=FIELD_TYPE_DICT['STRING'], name='column',
+                        name_short='col', required=False, length=10)
+    rule = RuleSql(rule_sql='SELECT 1', rule_label='A1', rule_description='', rule_error_message='',
+                   rule_cross_file_flag=False, file_id=file_id, rule_severity_id=RULE_SEVERITY_DICT['fatal'],
+                   query_name='a1_appropriations')
+    sess.add_all([sub, column, rule])
+    sess.commit()
+
+    fingerprint = validation_fingerprint(sess, sub, file_id, 'hash')
+    assert validation_fingerprint(sess, sub, file_id, 'hash') == fingerprint
+    assert validation_fingerprint(sess, sub, file_id, 'other hash') != fingerprint
+    assert validation_fingerprint(sess, sub, FILE_TYPE_DICT['award_financial'], 'hash') != fingerprint
+
+    sess.add(RuleSql(rule_sql='SELECT 2', rule_label='A2', rule_description='', rule_error_message='',
+                     rule_cross_file_flag=True, file_id=file_id, rule_severity_id=RULE_SEVERITY_DICT['fatal'],
+                     query_name='a2_cross_file'))
+    sess.commit()
+    assert validation_fingerprint(sess, sub, file_id, 'hash') == fingerprint
+
+    column.length = 20
+    sess.commit()
+    changed_column = validation_fingerprint(sess, sub, file_id, 'hash')
+    assert changed_column != fingerprint
+
+    rule.rule_sql = 'SELECT 3'
+    sess.commit()
+    assert validation_fingerprint(sess, sub, file_id, 'hash') not in (fingerprint, changed_column)
+
+
+def test_validation_fingerprint_outside_file(database, job_constants):
+    """The fingerprint changes with what the rules look up outside the file: the submission's agency and reporting
+    period, reference tables, the agency's other submissions for the year and, for FABS, the published awards"""
+    sess = database.session
+    file_id = FILE_TYPE_DICT['appropriations']
+    sub = SubmissionFactory(cgac_code='097', frec_code=None, reporting_fiscal_year=2017, reporting_fiscal_period=3)
+    sess.add(sub)
+    sess.commit()
+
+    fingerprints = [validation_fingerprint(sess, sub, file_id, 'hash')]
+
+    def changed():
+        fingerprint = validation_fingerprint(sess, sub, file_id, 'hash')
+        assert fingerprint not in fingerprints
+        fingerprints.append(fingerprint)
+
+    sub.reporting_fiscal_period = 6
+    sess.commit()
+    changed()
+
+    sub.reporting_fiscal_year = 2018
+    sess.commit()
+    changed()
+
+    sub.cgac_code = '020'
+    sess.commit()
+    changed()
+
+    bump_reference_version(sess, TASLookup)
+    sess.commit()
+    changed()
+
+    other_sub = SubmissionFactory(cgac_code='020', reporting_fiscal_year=2018,
+                                  publish_status_id=PUBLISH_STATUS_DICT['unpublished'])
+    sess.add(other_sub)
+    sess.commit()
+    changed()
+
+    # another agency's submissions don't count
+    sess.add(SubmissionFactory(cgac_code='097', reporting_fiscal_year=2018))
+    sess.commit()
+    assert validation_fingerprint(sess, sub, file_id, 'hash') == fingerprints[-1]
+
+    fabs_id = FILE_TYPE_DICT['detached_award']
+    fabs_fingerprint = validation_fingerprint(sess, sub, fabs_id, 'hash')
+    sess.add(PublishedAwardFinancialAssistanceFactory())
+    sess.commit()
+    assert validation_fingerprint(sess, sub, fabs_id, 'hash') != fabs_fingerprint
+    assert validation_fingerprint(sess, sub, file_id, 'hash') == fingerprints[-1]
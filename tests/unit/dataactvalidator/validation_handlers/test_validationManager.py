@@ -3,6 +3,7 @@ from unittest.mock import Mock
 
 import pytest
 
+from dataactvalidator.filestreaming import s3Stream
 from dataactvalidator.validation_handlers import validationManager
 from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
 from tests.unit.dataactcore.factories.domain import TASFactory
@@ -97,17 +98,51 @@ def test_update_tas_ids_bad_dates(database, factory):
 
 
 @pytest.mark.usefixtures('database')
-def test_insert_staging_model_failure():
-    writer = Mock()
-    error_list = ErrorInterface()
-    model = AppropriationFactory(row_number=1234, adjustments_to_unobligated_cpe='shoulda-been-a-number')
+def test_open_report_s3(monkeypatch):
+    """Reports are uploaded to S3 as they're written, and not at all if validation fails part way through"""
+    client = Mock()
+    monkeypatch.setattr(s3Stream.boto3, 'client', Mock(return_value=client))
+    monkeypatch.setitem(validationManager.CONFIG_BROKER, 'aws_bucket', 'bucket')
+    monkeypatch.setitem(validationManager.CONFIG_BROKER, 'aws_region', 'region')
+    manager = validationManager.ValidationManager(is_local=False)
+
+    with manager.open_report('report.csv', ['A', 'B']) as report:
+        report.writerow(['1', 'two, three'])
+    client.put_object.assert_called_once_with(Bucket='bucket', Key='errors/report.csv',
+                                              Body=b'A,B\n1,"two, three"\n')
+
+    client.reset_mock()
+    with pytest.raises(ValueError):
+        with manager.open_report('report.csv', ['A', 'B']) as report:
+            report.writerow(['1', '2'])
+            raise ValueError('validation failed')
+    assert not client.put_object.called
+
+
+def test_run_cross_file_pairs(database, monkeypatch):
+    """Pairs run at once each have a database connection of their own, and their errors come back in pair order"""
+    sess = database.session
     job = JobFactory()
-    assert not validationManager.insert_staging_model(model, job, writer, error_list)
-    assert writer.writerow.call_args[0] == (
-        ['Formatting Error', 'Could not write this record into the staging table.', 1234, ''],
-    )
-    assert len(error_list.rowErrors) == 1
-    error = list(error_list.rowErrors.values())[0]
-    assert error['firstRow'] == 1234
-    assert error['fieldName'] == 'Formatting Error'
-    assert error['filename'] == job.filename
+    sess.add(job)
+    sess.commit()
+    main_connection = validationManager.GlobalDB.db().connection
+    connections = []
+
+    def run_pair(self, pair_job, first_file, second_file):
+        connections.append(validationManager.GlobalDB.db().connection)
+        assert pair_job.job_id == job.job_id
+        error_list = ErrorInterface()
+        error_list.record_row_error(pair_job.job_id, 'cross_file', first_file, 'Rule failed', second_file)
+        return error_list
+
+    monkeypatch.setattr(validationManager.ValidationManager, 'run_cross_file_pair', run_pair)
+    monkeypatch.setitem(validationManager.CONFIG_SERVICES, 'cross_file_workers', 3)
+    manager = validationManager.ValidationManager()
+    pairs = [('a', 1), ('b', 2), ('c', 3), ('d', 4)]
+    results = manager.run_cross_file_pairs(job, pairs)
+
+    assert [list(errors.error_counts) for errors in results] == [[(job.job_id, name, 'Rule failed')]
+                                                                 for name, _ in pairs]
+    assert len(connections) == 4
+    assert main_connection not in connections
+    assert all(connection.closed for connection in connections)
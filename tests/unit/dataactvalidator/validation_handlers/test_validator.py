@@ -5,9 +5,8 @@ from dataactvalidator.validation_handlers import validator
 from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
 
 
-def test_relevant_flex_data(database):
-    """Verify that we can retrieve multiple flex fields from our data"""
-    sess = database.session
+def add_flex_fields(sess):
+    """Set up three submissions of three jobs, each with ten rows of three flex fields"""
     subs = [SubmissionFactory() for _ in range(3)]
     sess.add_all(subs)
     sess.commit()
@@ -22,9 +21,15 @@ def test_relevant_flex_data(database):
         for job in jobs for idx in range(3) for row_number in range(1, 11)
     ])
     sess.commit()
+    return jobs
+
+
+def test_flex_field_cache(database):
+    """Verify that we can retrieve multiple flex fields from our data"""
+    jobs = add_flex_fields(database.session)
 
-    failures = [{'row_number': 3}, {'row_number': 7}]
-    result = validator.relevant_flex_data(failures, jobs[0].job_id)
+    failures = [{'row_number': 3}, {'row_number': 7}, {'row_number': None}]
+    result = validator.FlexFieldCache.for_job(jobs[0].job_id).fetch(failures)
     assert {3, 7} == set(result.keys())
     assert len(result[3]) == 3
     # spot check some of the values
@@ -33,6 +38,52 @@ def test_relevant_flex_data(database):
     assert result[3][2].job_id == jobs[0].job_id
     assert result[7][1].header == '1'
     assert result[7][0].cell == 'cell' * 7
+    assert result[None] == []
+
+
+def test_flex_field_cache_fetches_rows_once(database):
+    """Rows already looked up for one rule aren't fetched again for the next"""
+    jobs = add_flex_fields(database.session)
+    cache = validator.FlexFieldCache.for_job(jobs[0].job_id)
+
+    assert set(cache.fetch([{'row_number': 3}, {'row_number': 12}])) == {3}
+    database.session.query(FlexField).filter_by(job_id=jobs[0].job_id, row_number=3).delete()
+    result = cache.fetch([{'row_number': 3}, {'row_number': 4}])
+    assert [field.header for field in result[3]] == ['0', '1', '2']
+    assert len(result[4]) == 3
+    # rows without flex fields aren't kept
+    assert list(cache.flex_data) == [3, 4]
+
+    # Jobs without flex fields don't look up rows at all
+    empty = validator.FlexFieldCache.for_job(jobs[-1].job_id + 1)
+    assert empty.fetch([{'row_number': 3}]) == {}
+    assert empty.flex_data == {}
+
+
+def test_flex_field_cache_bounded(database):
+    """Only the most recently used rows are kept once the cache is full"""
+    jobs = add_flex_fields(database.session)
+    cache = validator.FlexFieldCache.for_job(jobs[0].job_id, max_rows=2)
+
+    assert set(cache.fetch([{'row_number': 3}, {'row_number': 4}, {'row_number': 5}])) == {3, 4, 5}
+    assert len(cache.flex_data) == 2
+    cache.fetch([{'row_number': 6}])
+    cache.fetch([{'row_number': 5}])
+    cache.fetch([{'row_number': 7}])
+    assert list(cache.flex_data) == [5, 7]
+
+
+def test_flex_field_cache_for_files(database):
+    """Cross-file caches gather the flex fields of both files of a submission"""
+    jobs = add_flex_fields(database.session)
+    sess = database.session
+    for job, file_type_id in zip(jobs[:3], (1, 2, 3)):
+        sess.query(FlexField).filter_by(job_id=job.job_id).update({'file_type_id': file_type_id})
+    sess.commit()
+
+    result = validator.FlexFieldCache.for_files(jobs[0].submission_id, [1, 3]).fetch([{'row_number': 5}])
+    headers = [(field.file_type_id, field.header) for field in result[5]]
+    assert headers == [(1, '0'), (1, '1'), (1, '2'), (3, '0'), (3, '1'), (3, '2')]
 
 
 def test_failure_row_to_tuple_flex():